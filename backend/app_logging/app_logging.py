@@ -1,11 +1,105 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 import sys
-from typing import Any, Optional, List
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, List, Union
+from config.secrets import Secrets
+
+
+@dataclass
+class Config:
+    level: str = Secrets.get("LOG_LEVEL", "DEBUG").upper()
+    file: str = Secrets.get("LOG_FILE", "app.log")
+    file_level: str = Secrets.get("LOG_FILE_LEVEL", "INFO").upper()
+    # "text" or "json" (one object per line)
+    format: str = Secrets.get("LOG_FORMAT", "text").lower()
+    # app.log is rotated to app.log.1 .. app.log.<backups> past this size
+    max_bytes: int = int(Secrets.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    backups: int = int(Secrets.get("LOG_BACKUP_COUNT", "5"))
+    # Write from a background thread, so logging never blocks the caller on I/O
+    use_queue: bool = Secrets.get("LOG_QUEUE", "true").lower() == "true"
+
+
+# Set per request by RequestIdMiddleware, and attached to every record logged while handling it
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+Message = Union[str, Callable[[], str]]
+
+
+def _exception_text(formatter: logging.Formatter, record: logging.LogRecord) -> Optional[str]:
+    # Records from the queue carry the traceback already rendered in exc_text
+    if record.exc_info:
+        return formatter.formatException(record.exc_info)
+    return record.exc_text
+
+
+class ColorFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        color = Logger.COLORS.get(record.levelname, Logger.COLORS["RESET"])
+        levelname = f"{color}{record.levelname}{Logger.COLORS['RESET']}:{' ' * (8 - len(record.levelname))}"
+        # Gray caller name in square brackets
+        caller = f"{Logger.COLORS['GRAY']}[{getattr(record, 'caller', record.name)}]{Logger.COLORS['RESET']}"
+        line = f"{levelname} {caller} {record.getMessage()}"
+        exception = _exception_text(self, record)
+        return f"{line}\n{exception}" if exception else line
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)-9s [%(caller)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "caller"):
+            record.caller = record.name
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "caller": getattr(record, "caller", record.name),
+            "message": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid is not None:
+            entry["request_id"] = rid
+        exception = _exception_text(self, record)
+        if exception:
+            entry["exception"] = exception
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message here, as the arguments may change once the caller
+        # moves on, but leave timestamps, colors and JSON to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
 
 class Logger:
+    """App logging: `Logger.info(caller, message, *args)`.
+
+    Messages are %-formatted with `args`, or may be a callable returning the
+    message; either way the work is only done if the level is enabled, so
+    debug calls are cheap in production. Records go through a queue to a
+    background thread that writes stdout and a size-rotated log file.
+    """
+
     _instance: Optional["Logger"] = None
     _logger: Optional[logging.Logger] = None
+    _listener: Optional[logging.handlers.QueueListener] = None
     handlers: List[logging.Handler] = []
 
     COLORS = {
@@ -20,52 +114,51 @@ class Logger:
 
     @classmethod
     def _setup_logging(cls):
-        # Clear the log file
-        open("app.log", "w").close()
-
-        # Create formatter for file logging (with timestamp)
-        file_formatter = logging.Formatter("%(asctime)s - %(levelname)-9s %(message)s")
-
-        class ColorFormatter(logging.Formatter):
-            def format(self, record: logging.LogRecord) -> str:
-                original_levelname = record.levelname
-                color = Logger.COLORS.get(record.levelname, Logger.COLORS["RESET"])
-                record.levelname = f"{color}{original_levelname}{Logger.COLORS['RESET']}:{' ' * (8 - len(original_levelname))}"
-                # Add gray coloring to text within square brackets
-                message = record.msg
-                if "[" in message and "]" in message:
-                    message = message.replace("[", f"{Logger.COLORS['GRAY']}[").replace(
-                        "]", f"]{Logger.COLORS['RESET']}"
-                    )
-                record.msg = message
-                return super().format(record)
-
-        # Create formatter for stream logging (without timestamp)
-        stream_formatter = ColorFormatter(
-            "%(levelname)s %(message)s"
-        )  # Removed -8s since padding is handled in formatter
-
-        # Create file handler (INFO and above)
-        file_handler = logging.FileHandler("app.log")
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(file_formatter)
-
-        # Create stream handler (all levels)
+        json_lines = Config.format == "json"
+
+        # File handler (LOG_FILE_LEVEL and above), rotated by size instead of cleared on start
+        file_handler = logging.handlers.RotatingFileHandler(
+            Config.file, maxBytes=Config.max_bytes, backupCount=Config.backups
+        )
+        file_handler.setLevel(Config.file_level)
+        file_handler.setFormatter(JsonFormatter() if json_lines else TextFormatter())
+
+        # Stream handler (all levels)
         stream_handler = logging.StreamHandler(sys.stdout)
         stream_handler.setLevel(logging.DEBUG)
-        stream_handler.setFormatter(stream_formatter)
+        stream_handler.setFormatter(JsonFormatter() if json_lines else ColorFormatter())
 
         # Setup main logger
-        cls._logger = logging.getLogger("app")
-        cls._logger.setLevel(logging.DEBUG)
-        cls._logger.propagate = False
+        logger = logging.getLogger("app")
+        logger.setLevel(Config.level)
+        logger.propagate = False
 
         # Clear existing handlers and add new ones
         cls.handlers = [file_handler, stream_handler]
-        for handler in cls._logger.handlers[:]:
-            cls._logger.removeHandler(handler)
-        for handler in cls.handlers:
-            cls._logger.addHandler(handler)
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+        if Config.use_queue:
+            log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+            logger.addHandler(_QueueHandler(log_queue))
+            cls._listener = logging.handlers.QueueListener(log_queue, *cls.handlers, respect_handler_level=True)
+            cls._listener.start()
+            atexit.register(cls.shutdown)
+        else:
+            for handler in cls.handlers:
+                logger.addHandler(handler)
+        cls._logger = logger
+
+    @classmethod
+    def shutdown(cls):
+        """Flush queued records and stop the writer thread."""
+        if cls._listener is not None:
+            cls._listener.stop()
+            cls._listener = None
+            logger = cls.get_logger()
+            for handler in logger.handlers[:]:
+                logger.removeHandler(handler)
+            for handler in cls.handlers:
+                logger.addHandler(handler)
 
     @staticmethod
     def _get_caller_name(caller: Any) -> str:
@@ -79,15 +172,11 @@ class Logger:
             return caller.__name__
         return str(caller)
 
-    @staticmethod
-    def _format_message(caller: Any, message: str) -> str:
-        caller_name = Logger._get_caller_name(caller)
-        return f"[{caller_name}] {message}"
-
     @classmethod
-    def _ensure_logger(cls):
+    def _ensure_logger(cls) -> logging.Logger:
         if cls._logger is None:
             cls._setup_logging()
+        return cls._logger  # type: ignore
 
     @classmethod
     def get_logger(cls):
@@ -96,26 +185,35 @@ class Logger:
         return cls._logger
 
     @classmethod
-    def debug(cls, caller: Any, message: str):
-        cls._ensure_logger()
-        cls.get_logger().debug(Logger._format_message(caller, message))
+    def is_enabled(cls, level: int) -> bool:
+        return cls._ensure_logger().isEnabledFor(level)
+
+    @classmethod
+    def _log(cls, level: int, caller: Any, message: Message, args: Any, exc_info: Any = None):
+        logger = cls._ensure_logger()
+        if not logger.isEnabledFor(level):
+            return
+        if callable(message):
+            message = message()
+        extra = {"caller": cls._get_caller_name(caller), "request_id": request_id.get()}
+        logger.log(level, message, *args, exc_info=exc_info, extra=extra, stacklevel=3)
+
+    @classmethod
+    def debug(cls, caller: Any, message: Message, *args: Any):
+        cls._log(logging.DEBUG, caller, message, args)
 
     @classmethod
-    def info(cls, caller: Any, message: str):
-        cls._ensure_logger()
-        cls.get_logger().info(Logger._format_message(caller, message))
+    def info(cls, caller: Any, message: Message, *args: Any):
+        cls._log(logging.INFO, caller, message, args)
 
     @classmethod
-    def warning(cls, caller: Any, message: str):
-        cls._ensure_logger()
-        cls.get_logger().warning(Logger._format_message(caller, message))
+    def warning(cls, caller: Any, message: Message, *args: Any):
+        cls._log(logging.WARNING, caller, message, args)
 
     @classmethod
-    def error(cls, caller: Any, message: str):
-        cls._ensure_logger()
-        cls.get_logger().error(Logger._format_message(caller, message))
+    def error(cls, caller: Any, message: Message, *args: Any, exc_info: Any = None):
+        cls._log(logging.ERROR, caller, message, args, exc_info)
 
     @classmethod
-    def critical(cls, caller: Any, message: str):
-        cls._ensure_logger()
-        cls.get_logger().critical(Logger._format_message(caller, message))
+    def critical(cls, caller: Any, message: Message, *args: Any, exc_info: Any = None):
+        cls._log(logging.CRITICAL, caller, message, args, exc_info)
@@ -1,15 +1,19 @@
+import asyncio
+import os
 import jwt
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Annotated, Any
+from typing import Annotated, Any, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 from pydantic import BaseModel
 from config.secrets import Secrets
-from database.database import DatabaseSessionManager
+from core.principal import Principal, PrincipalCache
+from database.database import AsyncDatabaseSessionManager
 from database.schema.schema import User
 
 # to get a string like this run:
@@ -18,6 +22,13 @@ SECRET_KEY = Secrets.get("SECRET_KEY")
 ALGORITHM = Secrets.get("ALGORITHM")
 
 
+@dataclass
+class Config:
+    # Changing this re-hashes each user's password at their next login
+    bcrypt_rounds: int = int(Secrets.get("BCRYPT_ROUNDS", "12"))
+    hash_workers: int = int(Secrets.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -31,9 +42,28 @@ class SolveBugBcryptWarning:
     __version__: str = getattr(bcrypt, "__version__")
     
 setattr(bcrypt, "__about__", SolveBugBcryptWarning())
-pwd_context = CryptContext(schemes=["bcrypt"])
+pwd_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=Config.bcrypt_rounds)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt releases the GIL, so a thread pool sized to the cores runs hashes in parallel
+_hash_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=Config.hash_workers, thread_name_prefix="password-hash"
+        )
+    return _hash_executor
+
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -43,16 +73,32 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def get_user(name: str) -> User | None:
-    with DatabaseSessionManager() as dsm:
-        return dsm.utils.user.get(name)
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verify on the hash pool. Also returns a new hash if the stored one uses outdated settings."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_hash_executor(), pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
 
-def authenticate_user(name: str, password: str):
-    user = get_user(name)
+async def get_user(name: str) -> User | None:
+    async with AsyncDatabaseSessionManager() as dsm:
+        return await dsm.utils.user.get(name)
+
+async def authenticate_user(name: str, password: str):
+    user = await get_user(name)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # No session is open here: bcrypt takes 100-300 ms and must not hold a pooled connection
+    verified, new_hash = await verify_password_async(password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash:
+        async with AsyncDatabaseSessionManager() as dsm:
+            await dsm.utils.user.set_password_hash(user, new_hash)
+    PrincipalCache.put(Principal.from_user(user))
     return user
 
 
@@ -67,7 +113,15 @@ def create_access_token(data: dict[str, Any], expires_delta: timedelta | None =
     return encoded_jwt # type: ignore
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> Principal:
+    return await get_user_from_token(token)
+
+
+async def get_user_from_token(token: str) -> Principal:
+    """Decode a bearer token and resolve its user. Shared by HTTP and WebSocket auth.
+
+    The user is read from PrincipalCache when possible, so most requests skip the database.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -82,15 +136,21 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     except InvalidTokenError:
         raise credentials_exception
     
-    user = get_user(token_data.username) # type: ignore
+    principal = PrincipalCache.get(token_data.username) # type: ignore
+    if principal is not None:
+        return principal
+
+    user = await get_user(token_data.username) # type: ignore
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal.from_user(user)
+    PrincipalCache.put(principal)
+    return principal
 
 
 async def get_current_active_user(
-    current_user: Annotated[User, Depends(get_current_user)],
-):
+    current_user: Annotated[Principal, Depends(get_current_user)],
+) -> Principal:
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
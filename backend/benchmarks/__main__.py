@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List
+from benchmarks.compare import compare
+from benchmarks.fake_ollama import FakeOllamaConfig
+from benchmarks.harness import Client, Harness
+from benchmarks.recorder import Recorder
+from benchmarks.scenarios import SCENARIOS, ScenarioOptions
+
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def _run_scenarios(base_url: str, names: List[str], options: ScenarioOptions) -> Dict[str, Any]:
+    from core.query_budget import QueryStats
+
+    client = Client(base_url)
+    results: Dict[str, Any] = {}
+    try:
+        for name in names:
+            print(f"Running {name}...", file=sys.stderr)
+            QueryStats.reset()
+            client.recorder = Recorder()
+            await SCENARIOS[name](client, options)
+            client.recorder.finish()
+            results[name] = client.recorder.results(QueryStats.stats())
+    finally:
+        await client.close()
+    return results
+
+
+def run(args: argparse.Namespace) -> int:
+    ollama = FakeOllamaConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    options = ScenarioOptions(
+        model=args.model,
+        logins=args.logins,
+        concurrency=args.concurrency,
+        history=args.history,
+        turns=args.turns,
+        users=args.users,
+        chats_per_user=args.chats_per_user,
+    )
+    names = args.scenario or list(SCENARIOS)
+
+    harness = Harness(args.database_url, ollama, args.ollama_nodes)
+    base_url = harness.start()
+    try:
+        scenarios = asyncio.run(_run_scenarios(base_url, names, options))
+    finally:
+        harness.stop()
+
+    results = {
+        "meta": {
+            "commit": _commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "database": harness.database_url.split(":", 1)[0],
+            "fake_ollama": asdict(ollama),
+            "options": asdict(options),
+            "ollama_nodes": args.ollama_nodes,
+            "ollama_requests": harness.ollama_requests(),
+        },
+        "scenarios": scenarios,
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    for name, scenario in scenarios.items():
+        print(f"\n{name}: {scenario['requests']} requests in {scenario['duration_s']}s", file=sys.stderr)
+        for route, summary in scenario["routes"].items():
+            print(
+                f"  {route}: p50 {summary['p50_ms']}ms  p95 {summary['p95_ms']}ms  "
+                f"p99 {summary['p99_ms']}ms  {summary['throughput_rps']} req/s  "
+                f"errors {summary['errors']}  queries {summary.get('db_queries_mean', '-')}",
+                file=sys.stderr,
+            )
+    print(f"\nResults written to {args.output}", file=sys.stderr)
+    return 0
+
+
+def compare_files(args: argparse.Namespace) -> int:
+    with open(args.base) as base, open(args.head) as head:
+        regressions = compare(json.load(base), json.load(head), args.threshold)
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run scenarios and write results as JSON")
+    run_parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Repeatable; default all")
+    run_parser.add_argument("--database-url", help="Default: a temporary SQLite file. The database is reset!")
+    run_parser.add_argument("--output", default="benchmark-results.json")
+    run_parser.add_argument("--model", default=ScenarioOptions.model)
+    run_parser.add_argument("--ttft-ms", type=float, default=FakeOllamaConfig.ttft_ms)
+    run_parser.add_argument("--tokens-per-second", type=float, default=FakeOllamaConfig.tokens_per_second)
+    run_parser.add_argument("--response-tokens", type=int, default=FakeOllamaConfig.response_tokens)
+    run_parser.add_argument("--failure-rate", type=float, default=FakeOllamaConfig.failure_rate)
+    run_parser.add_argument("--seed", type=int, default=None)
+    run_parser.add_argument("--ollama-nodes", type=int, default=1, help="Fake Ollama servers to balance across")
+    run_parser.add_argument("--logins", type=int, default=ScenarioOptions.logins)
+    run_parser.add_argument("--concurrency", type=int, default=ScenarioOptions.concurrency)
+    run_parser.add_argument("--history", type=int, default=ScenarioOptions.history)
+    run_parser.add_argument("--turns", type=int, default=ScenarioOptions.turns)
+    run_parser.add_argument("--users", type=int, default=ScenarioOptions.users)
+    run_parser.add_argument("--chats-per-user", type=int, default=ScenarioOptions.chats_per_user)
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=None, help="Exit 1 if p95 or throughput regress by more than this %%"
+    )
+    compare_parser.set_defaults(handler=compare_files)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+from typing import Any, Dict, List, Optional
+
+# Metrics compared between runs; for throughput higher is better, for the rest lower is
+METRICS = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "db_queries_mean"]
+HIGHER_IS_BETTER = {"throughput_rps"}
+
+
+def _change(base: Optional[float], head: Optional[float]) -> Optional[float]:
+    if base is None or head is None or base == 0:
+        return None
+    return (head - base) / base * 100
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: Optional[float] = None) -> List[str]:
+    """Print a per-route comparison of two result files and return the regressions past `threshold` %.
+
+    Only p95 latency and throughput count as regressions; the other metrics are informational.
+    """
+    regressions: List[str] = []
+    print(f"base {base['meta'].get('commit')}  ->  head {head['meta'].get('commit')}")
+    for scenario, head_results in head["scenarios"].items():
+        base_results = base["scenarios"].get(scenario)
+        if base_results is None:
+            print(f"\n{scenario}: not in base")
+            continue
+        print(f"\n{scenario}")
+        for route, head_route in head_results["routes"].items():
+            base_route = base_results["routes"].get(route, {})
+            cells = []
+            for metric in METRICS:
+                change = _change(base_route.get(metric), head_route.get(metric))
+                value = head_route.get(metric)
+                if value is None:
+                    continue
+                cells.append(f"{metric}={value}" + (f" ({change:+.1f}%)" if change is not None else ""))
+                if threshold is None or change is None or metric not in ("p95_ms", "throughput_rps"):
+                    continue
+                worse = -change if metric in HIGHER_IS_BETTER else change
+                if worse > threshold:
+                    regressions.append(f"{scenario} {route} {metric} {change:+.1f}%")
+            print(f"  {route}: " + "  ".join(cells))
+
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+    return regressions
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional, Set
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeOllamaConfig:
+    ttft_ms: float = 200
+    tokens_per_second: float = 50
+    response_tokens: int = 32
+    # Fraction of requests answered with a 500 and an Ollama style {"error": ...} body
+    failure_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeOllamaStats:
+    requests: Dict[str, int] = field(default_factory=dict)
+    failures: int = 0
+    # Models that have been asked for, reported as loaded by /api/ps
+    loaded: Set[str] = field(default_factory=set)
+
+
+class FakeOllama:
+    """Stand-in for the Ollama HTTP API with a configurable latency profile.
+
+    Serves /api/chat and /api/generate, streaming (NDJSON) and not, plus
+    /api/tags and /api/ps. Replies are `response_tokens` words, the first
+    after `ttft_ms` and the rest at `tokens_per_second`. Runs on its own
+    thread and event loop, so it does not compete with the app's loop.
+    """
+
+    def __init__(self, config: FakeOllamaConfig):
+        self.config = config
+        self.stats = FakeOllamaStats()
+        self.random = random.Random(config.seed)
+        self.server: Optional[uvicorn.Server] = None
+        self.thread: Optional[threading.Thread] = None
+        self.app = self._create_app()
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/api/chat")
+        async def chat(request: Request) -> Any:
+            body = await request.json()
+            return await self._reply(body, "/api/chat", lambda text: {"message": {"role": "assistant", "content": text}})
+
+        @app.post("/api/generate")
+        async def generate(request: Request) -> Any:
+            body = await request.json()
+            return await self._reply(body, "/api/generate", lambda text: {"response": text})
+
+        @app.get("/api/tags")
+        async def tags() -> Any:
+            return {"models": []}
+
+        @app.get("/api/ps")
+        async def ps() -> Any:
+            return {"models": [{"name": model, "model": model} for model in sorted(self.stats.loaded)]}
+
+        return app
+
+    async def _reply(self, body: Dict[str, Any], path: str, shape: Any) -> Any:
+        self.stats.requests[path] = self.stats.requests.get(path, 0) + 1
+        model = body.get("model", "")
+        self.stats.loaded.add(model)
+        if self.random.random() < self.config.failure_rate:
+            self.stats.failures += 1
+            return JSONResponse({"error": "simulated failure"}, status_code=500)
+
+        # Mirrors the fields the backend reads from a final chunk
+        final = {
+            "model": model,
+            "done": True,
+            "prompt_eval_count": 8,
+            "eval_count": self.config.response_tokens,
+            "eval_duration": int(self.config.response_tokens / self.config.tokens_per_second * 1e9),
+            **({"context": [1, 2, 3]} if path == "/api/generate" else {}),
+        }
+        token_delay = 1 / self.config.tokens_per_second
+
+        if not body.get("stream", True):
+            await asyncio.sleep(self.config.ttft_ms / 1000 + token_delay * (self.config.response_tokens - 1))
+            return {**final, **shape(self._text())}
+
+        async def chunks() -> AsyncIterator[str]:
+            await asyncio.sleep(self.config.ttft_ms / 1000)
+            for i in range(self.config.response_tokens):
+                if i:
+                    await asyncio.sleep(token_delay)
+                yield json.dumps({"model": model, "done": False, **shape(f"tok{i} ")}) + "\n"
+            yield json.dumps({**final, **shape("")}) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    def _text(self) -> str:
+        return "".join(f"tok{i} " for i in range(self.config.response_tokens))
+
+    def start(self, port: int) -> str:
+        self.server = uvicorn.Server(
+            uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="error")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return f"http://127.0.0.1:{port}"
+
+    def stop(self) -> None:
+        if self.server is not None and self.thread is not None:
+            self.server.should_exit = True
+            self.thread.join()
@@ -0,0 +1,136 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import httpx
+import uvicorn
+from benchmarks.fake_ollama import FakeOllama, FakeOllamaConfig
+from benchmarks.recorder import Recorder
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Harness:
+    """Runs the FastAPI app and a fake Ollama on local ports for a benchmark run.
+
+    The app starts in development mode, so the database is reset and seeded
+    with the dev user on startup: point `database_url` at a throwaway
+    database. All servers run in this process, on their own threads and
+    event loops, which lets the run read the app's SQL statement counts.
+    With `ollama_nodes` > 1, that many fake Ollama servers are started on
+    their own ports, and the app balances across them.
+    """
+
+    def __init__(self, database_url: Optional[str], ollama: FakeOllamaConfig, ollama_nodes: int = 1):
+        self.database_url = database_url or f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+        self.ollama_nodes = [FakeOllama(ollama) for _ in range(max(ollama_nodes, 1))]
+        self.ollama_urls: List[str] = []
+        self.server: Optional[uvicorn.Server] = None
+        self.thread: Optional[threading.Thread] = None
+        self.base_url = ""
+
+    def _configure_environment(self, ollama_url: str) -> None:
+        # Must happen before the app is imported, as its config is read at import time
+        os.environ.update(
+            DATABASE_URL=self.database_url,
+            OLLAMA_URL=ollama_url,
+            ENVIRONMENT="development",
+            DATABASE_QUERY_BUDGET="true",
+        )
+        os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+        os.environ.setdefault("ALGORITHM", "HS256")
+        os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+        os.environ.setdefault("FRONTEND_URL", "http://127.0.0.1")
+
+    def start(self) -> str:
+        self.ollama_urls = [node.start(free_port()) for node in self.ollama_nodes]
+        self._configure_environment(",".join(self.ollama_urls))
+        from main import app
+
+        port = free_port()
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("The app failed to start")
+            time.sleep(0.05)
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    def stop(self) -> None:
+        if self.server is not None and self.thread is not None:
+            self.server.should_exit = True
+            self.thread.join()
+        for node in self.ollama_nodes:
+            node.stop()
+
+    def ollama_requests(self) -> Dict[str, Dict[str, int]]:
+        """Requests served per fake Ollama server and endpoint."""
+        return {url: node.stats.requests for url, node in zip(self.ollama_urls, self.ollama_nodes)}
+
+
+class Client:
+    """HTTP client for scenarios. Every request is timed into the current recorder under its route."""
+
+    def __init__(self, base_url: str):
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(600),
+            limits=httpx.Limits(max_connections=1000, max_keepalive_connections=1000),
+        )
+        self.recorder = Recorder()
+
+    async def close(self) -> None:
+        await self.http.aclose()
+
+    async def request(self, route: str, method: str, url: str, **kwargs: Any) -> Optional[httpx.Response]:
+        """Send a request and record it. Returns None if it failed."""
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(route, _elapsed_ms(started), type(e).__name__)
+            return None
+        error = None if response.is_success else str(response.status_code)
+        self.recorder.record(route, _elapsed_ms(started), error)
+        return response if error is None else None
+
+    async def stream(self, route: str, method: str, url: str, **kwargs: Any) -> Optional[str]:
+        """Send a request, read the streamed body to the end and record its time to first byte."""
+        started = time.perf_counter()
+        first_byte_ms: Optional[float] = None
+        body = []
+        try:
+            async with self.http.stream(method, url, **kwargs) as response:
+                async for chunk in response.aiter_text():
+                    if first_byte_ms is None:
+                        first_byte_ms = _elapsed_ms(started)
+                    body.append(chunk)
+        except httpx.HTTPError as e:
+            self.recorder.record(route, _elapsed_ms(started), type(e).__name__, first_byte_ms)
+            return None
+        error = None if response.is_success else str(response.status_code)
+        self.recorder.record(route, _elapsed_ms(started), error, first_byte_ms)
+        return "".join(body) if error is None else None
+
+    async def login(self, name: str, password: str) -> Dict[str, str]:
+        """Log in and return the auth header."""
+        response = await self.request(
+            "POST /auth/token", "POST", "/auth/token", data={"username": name, "password": password}
+        )
+        if response is None:
+            raise RuntimeError(f"Login failed for {name}")
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def _elapsed_ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
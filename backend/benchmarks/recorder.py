@@ -0,0 +1,87 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+@dataclass
+class RouteSamples:
+    latencies_ms: List[float] = field(default_factory=list)
+    # Time to the first body chunk, for streamed routes
+    first_byte_ms: List[float] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+
+
+class Recorder:
+    """Collects request latencies for one scenario, keyed by "METHOD /route/template"."""
+
+    def __init__(self):
+        self.routes: Dict[str, RouteSamples] = {}
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+
+    def record(
+        self,
+        route: str,
+        latency_ms: float,
+        error: Optional[str] = None,
+        first_byte_ms: Optional[float] = None,
+    ) -> None:
+        samples = self.routes.setdefault(route, RouteSamples())
+        samples.latencies_ms.append(latency_ms)
+        if first_byte_ms is not None:
+            samples.first_byte_ms.append(first_byte_ms)
+        if error is not None:
+            samples.errors[error] = samples.errors.get(error, 0) + 1
+
+    def finish(self) -> None:
+        self.finished_at = time.perf_counter()
+
+    @property
+    def duration_s(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    def results(self, db_queries: Dict[str, Any]) -> Dict[str, Any]:
+        """Summary of the scenario, with the server's per-route SQL statement counts merged in."""
+        duration = self.duration_s
+        routes: Dict[str, Any] = {}
+        for route, samples in sorted(self.routes.items()):
+            latencies = samples.latencies_ms
+            summary: Dict[str, Any] = {
+                "requests": len(latencies),
+                "errors": sum(samples.errors.values()),
+                "error_kinds": samples.errors,
+                "throughput_rps": round(len(latencies) / duration, 2) if duration else 0.0,
+                "mean_ms": round(sum(latencies) / len(latencies), 2),
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "max_ms": round(max(latencies), 2),
+            }
+            if samples.first_byte_ms:
+                summary["first_byte_p50_ms"] = round(percentile(samples.first_byte_ms, 50), 2)
+                summary["first_byte_p95_ms"] = round(percentile(samples.first_byte_ms, 95), 2)
+            queries = db_queries.get(route)
+            if queries is not None:
+                summary["db_queries_mean"] = queries["mean"]
+                summary["db_queries_max"] = queries["max"]
+            routes[route] = summary
+
+        total = sum(len(samples.latencies_ms) for samples in self.routes.values())
+        return {
+            "duration_s": round(duration, 3),
+            "requests": total,
+            "throughput_rps": round(total / duration, 2) if duration else 0.0,
+            "routes": routes,
+        }
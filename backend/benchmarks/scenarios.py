@@ -0,0 +1,140 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List
+from benchmarks.harness import Client
+
+# Seeded by the app's development startup
+DEV_USER = ("user", "password")
+DEV_ASSISTANT_ID = 1
+
+
+@dataclass
+class ScenarioOptions:
+    model: str = "llama3.2:1b"
+    # login_storm
+    logins: int = 100
+    concurrency: int = 20
+    # long_conversation
+    history: int = 2000
+    turns: int = 10
+    # concurrent_chats
+    users: int = 20
+    chats_per_user: int = 5
+
+
+def _seed_users(names: List[str], password: str) -> None:
+    from auth import get_password_hash
+    from database.database import DatabaseSessionManager
+    from database.schema.schema import User
+
+    # One hash for everyone, so seeding does not pay the bcrypt cost per user
+    hashed_password = get_password_hash(password)
+    with DatabaseSessionManager() as dsm:
+        dsm.session.add_all(
+            User(name=name, email=f"{name}@benchmark.local", hashed_password=hashed_password)
+            for name in names
+        )
+        dsm.session.commit()
+
+
+def _seed_history(conversation_id: int, count: int) -> None:
+    from database.database import DatabaseSessionManager
+    from database.schema.schema import Message as ChatMessage
+
+    with DatabaseSessionManager() as dsm:
+        dsm.session.add_all(
+            ChatMessage(
+                conversation_id=conversation_id,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"Seeded message {i} " + "lorem ipsum " * 20,
+            )
+            for i in range(count)
+        )
+        dsm.session.commit()
+
+
+async def _create_conversation(client: Client, headers: Dict[str, str], assistant_id: int) -> int:
+    response = await client.request(
+        "POST /conversation",
+        "POST",
+        "/conversation",
+        headers=headers,
+        json={"title": "Benchmark", "assistant_id": assistant_id},
+    )
+    if response is None:
+        raise RuntimeError("Could not create a conversation")
+    return response.json()["id"]
+
+
+async def login_storm(client: Client, options: ScenarioOptions) -> None:
+    """Many concurrent logins: bcrypt verification and the user lookup."""
+    semaphore = asyncio.Semaphore(options.concurrency)
+
+    async def login() -> None:
+        async with semaphore:
+            await client.request(
+                "POST /auth/token",
+                "POST",
+                "/auth/token",
+                data={"username": DEV_USER[0], "password": DEV_USER[1]},
+            )
+
+    await asyncio.gather(*(login() for _ in range(options.logins)))
+
+
+async def long_conversation(client: Client, options: ScenarioOptions) -> None:
+    """Sequential turns on a conversation with a long history, plus paged reads of it."""
+    headers = await client.login(*DEV_USER)
+    conversation_id = await _create_conversation(client, headers, DEV_ASSISTANT_ID)
+    await asyncio.to_thread(_seed_history, conversation_id, options.history)
+
+    for turn in range(options.turns):
+        request = {"model": options.model, "message": f"Turn {turn}", "conversation_id": conversation_id}
+        if turn % 2:
+            await client.stream("POST /chat/stream", "POST", "/chat/stream", headers=headers, json=request)
+        else:
+            await client.request("POST /chat", "POST", "/chat", headers=headers, json=request)
+        await client.request(
+            "GET /conversation/{conversation_id}/messages",
+            "GET",
+            f"/conversation/{conversation_id}/messages",
+            headers=headers,
+            params={"limit": 50},
+        )
+        await client.request(
+            "GET /conversations", "GET", "/conversations", headers=headers, params={"limit": 20}
+        )
+
+
+async def concurrent_chats(client: Client, options: ScenarioOptions) -> None:
+    """Many users chatting at once, each in their own conversation, half of the turns streamed."""
+    names = [f"bench{i}" for i in range(options.users)]
+    await asyncio.to_thread(_seed_users, names, "password")
+
+    async def user_session(name: str) -> None:
+        headers = await client.login(name, "password")
+        response = await client.request(
+            "POST /assistant",
+            "POST",
+            "/assistant",
+            headers=headers,
+            json={"name": "Benchmark", "model": options.model},
+        )
+        if response is None:
+            return
+        conversation_id = await _create_conversation(client, headers, response.json()["id"])
+        for turn in range(options.chats_per_user):
+            request = {"model": options.model, "message": f"Turn {turn}", "conversation_id": conversation_id}
+            if turn % 2:
+                await client.stream("POST /chat/stream", "POST", "/chat/stream", headers=headers, json=request)
+            else:
+                await client.request("POST /chat", "POST", "/chat", headers=headers, json=request)
+
+    await asyncio.gather(*(user_session(name) for name in names))
+
+
+SCENARIOS: Dict[str, Callable[[Client, ScenarioOptions], Awaitable[None]]] = {
+    "login_storm": login_storm,
+    "long_conversation": long_conversation,
+    "concurrent_chats": concurrent_chats,
+}
@@ -0,0 +1,94 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+from config.secrets import Secrets
+from core.exception import APIException
+
+
+@dataclass
+class Config:
+    # Time a request may spend waiting on Ollama, queueing included
+    default_seconds: float = float(Secrets.get("REQUEST_DEADLINE_SECONDS", "120"))
+    # Upper bound for a deadline asked for with X-Request-Timeout
+    max_seconds: float = float(Secrets.get("REQUEST_DEADLINE_MAX_SECONDS", "600"))
+
+
+# time.monotonic() by which the current request must be done, or None for no deadline
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class Deadline:
+    """The current request's deadline, read by the scheduler and the Ollama client.
+
+    Set per request by DeadlineMiddleware and per websocket turn. Tasks
+    started from a request inherit it, so work that outlives the request
+    (summaries, preloads) drops it with `Deadline.set(None)`.
+    """
+
+    @staticmethod
+    def remaining() -> Optional[float]:
+        """Seconds left, or None if there is no deadline."""
+        deadline = _deadline.get()
+        return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+    @staticmethod
+    def expired() -> bool:
+        deadline = _deadline.get()
+        return deadline is not None and time.monotonic() >= deadline
+
+    @staticmethod
+    def timeout(default: float) -> float:
+        """`default`, or less if the deadline is sooner."""
+        remaining = Deadline.remaining()
+        return default if remaining is None else min(default, remaining)
+
+    @staticmethod
+    def exceeded(detail: str = "Deadline exceeded waiting for the model") -> APIException:
+        return APIException(status_code=APIException.HTTP_504_GATEWAY_TIMEOUT, detail=detail)
+
+    @staticmethod
+    def check() -> None:
+        if Deadline.expired():
+            raise Deadline.exceeded()
+
+    @staticmethod
+    def set(seconds: Optional[float]) -> None:
+        """Set a deadline `seconds` from now (None for none) for the rest of the current task."""
+        _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+    @staticmethod
+    @contextmanager
+    def scope(seconds: Optional[float]) -> Iterator[None]:
+        """Set a deadline `seconds` from now (None for none) for the duration of the block."""
+        token = _deadline.set(None if seconds is None else time.monotonic() + seconds)
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+
+class DeadlineMiddleware:
+    """Gives each HTTP request a deadline: REQUEST_DEADLINE_SECONDS, or what the
+    client asks for in X-Request-Timeout (seconds), up to REQUEST_DEADLINE_MAX_SECONDS."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    @staticmethod
+    def seconds(scope: Any) -> float:
+        requested = dict(scope["headers"]).get(b"x-request-timeout")
+        if requested is not None:
+            try:
+                return min(max(float(requested), 0.0), Config.max_seconds)
+            except ValueError:
+                pass
+        return Config.default_seconds
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with Deadline.scope(self.seconds(scope)):
+            await self.app(scope, receive, send)
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Any, Awaitable, TypeVar
+from fastapi import Request
+from app_logging.app_logging import Logger
+from core.exception import APIException
+
+T = TypeVar("T")
+
+
+class Disconnect:
+    """Notices a client going away during a non-streaming request, so the work
+    it asked for can be stopped. Streaming responses get this from Starlette,
+    which cancels the stream when the client disconnects."""
+
+    @staticmethod
+    async def wait(request: Request) -> None:
+        """Return once the client has disconnected. Only for requests whose body has been read."""
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    def watch(request: Request, task: "asyncio.Task[Any]") -> "asyncio.Task[None]":
+        """Cancel `task` if the client disconnects first. Cancel the returned watcher when done."""
+
+        async def watcher() -> None:
+            await Disconnect.wait(request)
+            if not task.done():
+                Logger.debug(Disconnect, "Client left %s, cancelling its work", request.url.path)
+                task.cancel()
+
+        return asyncio.create_task(watcher())
+
+    @staticmethod
+    async def guard(request: Request, work: Awaitable[T]) -> T:
+        """Await `work`, cancelling it if the client disconnects first. Then a 499 is
+        raised, which the client never sees, but the logs and metrics do."""
+        task = asyncio.ensure_future(work)
+        watcher = Disconnect.watch(request, task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if watcher.done() and not watcher.cancelled():
+                raise APIException(
+                    status_code=APIException.HTTP_499_CLIENT_CLOSED_REQUEST, detail="Client closed request"
+                )
+            raise
+        finally:
+            watcher.cancel()
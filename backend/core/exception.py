@@ -19,6 +19,8 @@ class APIException(HTTPException):
     HTTP_415_UNSUPPORTED_MEDIA_TYPE = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
     HTTP_422_UNPROCESSABLE_ENTITY = status.HTTP_422_UNPROCESSABLE_ENTITY
     HTTP_429_TOO_MANY_REQUESTS = status.HTTP_429_TOO_MANY_REQUESTS
+    # Not a standard status; nginx's code for a client that went away before the reply
+    HTTP_499_CLIENT_CLOSED_REQUEST = 499
     HTTP_500_INTERNAL_SERVER_ERROR = status.HTTP_500_INTERNAL_SERVER_ERROR
     HTTP_501_NOT_IMPLEMENTED = status.HTTP_501_NOT_IMPLEMENTED
     HTTP_502_BAD_GATEWAY = status.HTTP_502_BAD_GATEWAY
@@ -0,0 +1,280 @@
+import bisect
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import Engine, event
+from starlette.requests import HTTPConnection
+from config.secrets import Secrets
+
+
+@dataclass
+class Config:
+    enabled: bool = Secrets.get("METRICS_ENABLED", "true").lower() == "true"
+
+
+# Seconds; covers a fast DB query up to a long generation
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric(ABC):
+    """A metric family. Samples are plain values keyed by a label tuple.
+
+    Updates take no lock: they happen on the event loop, and the few that
+    come from worker threads (sync database sessions) can at worst lose an
+    increment under the GIL, which is acceptable for monitoring.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]: ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}", *self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, labels: Labels, value: float) -> None:
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (the last is +Inf)..., sum]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket_labels} {_format_value(cumulative)}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(series[-1])}"
+            yield f"{self.name}_count{_format_labels(self.label_names, labels)} {_format_value(cumulative)}"
+
+
+class Metrics:
+    """Process-wide metrics, rendered in the Prometheus text format by /metrics."""
+
+    registry: List[Metric] = []
+    # Called at scrape time, for values that are cheaper to read than to track (pool sizes, queues)
+    collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    @classmethod
+    def register(cls, metric: Any) -> Any:
+        cls.registry.append(metric)
+        return metric
+
+    @classmethod
+    def add_collector(cls, collector: Callable[[], Iterable[Metric]]) -> None:
+        cls.collectors.append(collector)
+
+    @classmethod
+    def render(cls) -> str:
+        families = list(cls.registry)
+        for collector in cls.collectors:
+            families.extend(collector())
+        return "\n".join(family.render() for family in families) + "\n"
+
+
+HTTP_REQUESTS = Metrics.register(
+    Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+)
+HTTP_DURATION = Metrics.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency, until the body is sent", ["method", "route"])
+)
+HTTP_IN_FLIGHT = Metrics.register(
+    Gauge("http_requests_in_flight", "HTTP requests being served", ["method", "route"])
+)
+DB_QUERIES = Metrics.register(Counter("db_queries_total", "SQL statements executed", ["operation"]))
+DB_DURATION = Metrics.register(
+    Histogram("db_query_duration_seconds", "SQL statement execution time", ["operation"])
+)
+OLLAMA_REQUESTS = Metrics.register(
+    Counter("ollama_requests_total", "Ollama requests by outcome", ["model", "endpoint", "outcome"])
+)
+OLLAMA_FIRST_TOKEN = Metrics.register(
+    Histogram("ollama_time_to_first_token_seconds", "Time to the first streamed chunk", ["model", "endpoint"])
+)
+OLLAMA_DURATION = Metrics.register(
+    Histogram("ollama_request_duration_seconds", "Total Ollama request time", ["model", "endpoint"])
+)
+OLLAMA_TOKENS_PER_SECOND = Metrics.register(
+    Histogram(
+        "ollama_tokens_per_second",
+        "Generation speed, eval_count over eval_duration",
+        ["model"],
+        TOKENS_PER_SECOND_BUCKETS,
+    )
+)
+OLLAMA_PROMPT_TOKENS = Metrics.register(
+    Counter("ollama_prompt_tokens_total", "Prompt tokens evaluated (prompt_eval_count)", ["model"])
+)
+OLLAMA_EVAL_TOKENS = Metrics.register(
+    Counter("ollama_eval_tokens_total", "Tokens generated (eval_count)", ["model"])
+)
+
+
+def record_ollama(
+    model: str,
+    endpoint: str,
+    started: float,
+    body: Optional[Dict[str, Any]],
+    first_token_at: Optional[float] = None,
+    cancelled: bool = False,
+) -> None:
+    """Record one Ollama call. `body` is the response, or the final chunk of a stream; None if it failed."""
+    if not Config.enabled:
+        return
+    labels = (model, endpoint)
+    OLLAMA_DURATION.observe(labels, time.perf_counter() - started)
+    if first_token_at is not None:
+        OLLAMA_FIRST_TOKEN.observe(labels, first_token_at - started)
+    if cancelled:
+        OLLAMA_REQUESTS.inc((model, endpoint, "cancelled"))
+        return
+    if body is None or "error" in body:
+        OLLAMA_REQUESTS.inc((model, endpoint, "error"))
+        return
+
+    OLLAMA_REQUESTS.inc((model, endpoint, "ok"))
+    eval_count = body.get("eval_count") or 0
+    OLLAMA_PROMPT_TOKENS.inc((model,), body.get("prompt_eval_count") or 0)
+    OLLAMA_EVAL_TOKENS.inc((model,), eval_count)
+    eval_duration = body.get("eval_duration")  # nanoseconds
+    if eval_count and eval_duration:
+        OLLAMA_TOKENS_PER_SECOND.observe((model,), eval_count / (eval_duration / 1e9))
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+    if not Config.enabled:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    DB_QUERIES.inc((operation,))
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        DB_DURATION.observe((operation,), time.perf_counter() - started)
+
+
+async def track_in_flight(connection: HTTPConnection) -> AsyncIterator[None]:
+    """App dependency counting the requests in flight per route.
+
+    The route template is only known once the router has run, so this is a
+    dependency rather than part of MetricsMiddleware. Its exit waits for
+    streamed bodies, like the middleware's latency does.
+    """
+    if connection.scope["type"] != "http":
+        yield
+        return
+    labels = (connection.scope["method"], connection.scope["route"].path)
+    HTTP_IN_FLIGHT.inc(labels)
+    try:
+        yield
+    finally:
+        HTTP_IN_FLIGHT.dec(labels)
+
+
+class MetricsMiddleware:
+    """Per-route request counts and latency.
+
+    Requests are labelled with the route template the router matched, so ids
+    in paths do not create new series. Requests in flight are counted by the
+    track_in_flight dependency.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+
+        async def send_with_status(message: Any) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route on the scope
+            labels = (method, getattr(scope.get("route"), "path", "unmatched"))
+            HTTP_DURATION.observe(labels, time.perf_counter() - started)
+            HTTP_REQUESTS.inc((*labels, status))
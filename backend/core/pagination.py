@@ -0,0 +1,139 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar
+from sqlalchemy import tuple_
+from core.exception import APIException
+
+
+T = TypeVar("T")
+
+MAX_PAGE_SIZE = 100
+
+
+def _pack(values: List[Any]) -> str:
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _unpack(cursor: str) -> Any:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise _invalid_cursor()
+
+
+def _invalid_cursor() -> APIException:
+    return APIException(status_code=APIException.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+class Cursor:
+    """Opaque keyset cursor: the (timestamp, id) of the row a page starts after."""
+
+    @staticmethod
+    def encode(at: datetime, id: int) -> str:
+        return _pack([at.isoformat(), id])
+
+    @staticmethod
+    def decode(cursor: str) -> Tuple[datetime, int]:
+        try:
+            at, id = _unpack(cursor)
+            return datetime.fromisoformat(at), int(id)
+        except (ValueError, TypeError):
+            raise _invalid_cursor()
+
+
+class ScoreCursor:
+    """Opaque cursor for ranked results: the (score, id) of the row a page starts after."""
+
+    @staticmethod
+    def encode(score: float, id: int) -> str:
+        return _pack([score, id])
+
+    @staticmethod
+    def decode(cursor: str) -> Tuple[float, int]:
+        try:
+            score, id = _unpack(cursor)
+            return float(score), int(id)
+        except (ValueError, TypeError):
+            raise _invalid_cursor()
+
+
+@dataclass
+class Page(Generic[T]):
+    items: List[T]
+    # Pass as `before` to get older rows, or as `after` to get newer rows
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+    def headers(self) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if self.next_cursor:
+            headers["X-Next-Cursor"] = self.next_cursor
+        if self.prev_cursor:
+            headers["X-Prev-Cursor"] = self.prev_cursor
+        return headers
+
+
+class Keyset:
+    """Keyset pagination over a (timestamp, id) pair, newest rows first.
+
+    Without a cursor the newest `limit` rows are returned; `before` pages
+    towards older rows and `after` towards newer ones. Without a limit or
+    cursor, every row is returned. Pages never skip or repeat rows when rows
+    are inserted concurrently, and each page is a single index range scan.
+    """
+
+    def __init__(
+        self,
+        at_column: Any,
+        id_column: Any,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ):
+        self.at_column = at_column
+        self.id_column = id_column
+        self.limit = limit
+        self.before = Cursor.decode(before) if before else None
+        self.after = Cursor.decode(after) if after else None
+        if self.before and self.after:
+            raise APIException(
+                status_code=APIException.HTTP_400_BAD_REQUEST,
+                detail="Use either before or after, not both",
+            )
+
+    def apply(self, statement: Any) -> Any:
+        key = tuple_(self.at_column, self.id_column)
+        if self.after:
+            statement = statement.where(key > tuple_(*self.after)).order_by(
+                self.at_column, self.id_column
+            )
+        else:
+            if self.before:
+                statement = statement.where(key < tuple_(*self.before))
+            statement = statement.order_by(self.at_column.desc(), self.id_column.desc())
+        if self.limit is not None:
+            # One extra row tells whether another page exists
+            statement = statement.limit(self.limit + 1)
+        return statement
+
+    def page(self, rows: List[T], at_attr: str, newest_first: bool = True) -> Page[T]:
+        """Build the page from rows fetched with `apply`, in the requested order."""
+        has_more = self.limit is not None and len(rows) > self.limit
+        rows = rows[: self.limit] if self.limit is not None else rows
+        if self.after:
+            rows.reverse()
+
+        page: Page[T] = Page(items=rows)
+        if rows:
+            newest, oldest = rows[0], rows[-1]
+            if has_more or self.after:
+                page.next_cursor = Cursor.encode(getattr(oldest, at_attr), oldest.id)  # type: ignore
+            if (has_more and self.after) or self.before:
+                page.prev_cursor = Cursor.encode(getattr(newest, at_attr), newest.id)  # type: ignore
+        if not newest_first:
+            rows.reverse()
+        return page
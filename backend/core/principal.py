@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from pydantic import BaseModel, ConfigDict
+from config.secrets import Secrets
+
+
+@dataclass
+class Config:
+    ttl_seconds: float = float(Secrets.get("AUTH_CACHE_TTL_SECONDS", "60"))
+    max_entries: int = int(Secrets.get("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+
+class Principal(BaseModel):
+    """The authenticated user as seen by routes: a detached snapshot, not a live ORM object."""
+
+    model_config = ConfigDict(frozen=True)
+
+    id: int
+    name: str
+    disabled: bool
+
+    @classmethod
+    def from_user(cls, user: Any) -> "Principal":
+        return cls(id=user.id, name=user.name, disabled=user.disabled)
+
+
+class PrincipalCache:
+    """Bounded TTL cache from token subject (user name) to Principal.
+
+    Saves the user lookup on every authenticated request. Entries are dropped
+    when the user is disabled or deleted through the user utils; the TTL bounds
+    staleness for changes made any other way, or by another worker process.
+    """
+
+    _entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def get(cls, name: str) -> Optional[Principal]:
+        entry = cls._entries.get(name)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del cls._entries[name]
+            cls.misses += 1
+            return None
+        cls._entries.move_to_end(name)
+        cls.hits += 1
+        return entry[1]
+
+    @classmethod
+    def put(cls, principal: Principal) -> None:
+        cls._entries[principal.name] = (time.monotonic() + Config.ttl_seconds, principal)
+        cls._entries.move_to_end(principal.name)
+        while len(cls._entries) > Config.max_entries:
+            cls._entries.popitem(last=False)
+
+    @classmethod
+    def invalidate(cls, name: str) -> None:
+        cls._entries.pop(name, None)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {"entries": len(cls._entries), "hits": cls.hits, "misses": cls.misses}
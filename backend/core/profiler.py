@@ -0,0 +1,265 @@
+import asyncio
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from types import CodeType, FrameType
+from typing import Any, Dict, List, Optional
+from app_logging.app_logging import Logger
+from config.secrets import Secrets
+
+
+@dataclass
+class Config:
+    # Requests sending "X-Profile: <token>" are profiled; unset disables the header
+    token: str = Secrets.get("PROFILING_TOKEN", "")
+    # Fraction of requests profiled without asking, written to the output directory
+    sample_rate: float = float(Secrets.get("PROFILING_SAMPLE_RATE", "0"))
+    interval_ms: float = float(Secrets.get("PROFILING_INTERVAL_MS", "5"))
+    output_dir: str = Secrets.get("PROFILING_OUTPUT_DIR", "profiles")
+    # Profile imports and lifespan startup, written as startup-<timestamp>.folded
+    startup: bool = Secrets.get("PROFILING_STARTUP", "false").lower() == "true"
+    enabled: bool = bool(token) or sample_rate > 0
+
+
+_labels: Dict[CodeType, str] = {}
+_cwd = os.getcwd()
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        if "site-packages" in filename:
+            filename = filename.rsplit("site-packages" + os.sep, 1)[-1]
+        elif filename.startswith(_cwd):
+            filename = os.path.relpath(filename, _cwd)
+        # Semicolons separate frames in the folded format
+        label = _labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+    return label
+
+
+def _stack(frame: Optional[FrameType]) -> List[FrameType]:
+    """The frames of a thread, outermost first."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _awaiting(coro: Any) -> List[FrameType]:
+    """The frames of a suspended coroutine and everything it awaits, outermost first."""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames
+
+
+class Profile:
+    """Sampled stacks in the folded format ("outer;inner;leaf count"), which
+    flamegraph.pl, speedscope and most flamegraph viewers read directly."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def add(self, labels: List[str]) -> None:
+        if not labels:
+            return
+        stack = ";".join(labels)
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    @property
+    def wall_ms(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return (end - self.started) * 1000
+
+    def folded(self) -> str:
+        lines = [f"{stack} {count}" for stack, count in sorted(self.stacks.items())]
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> str:
+        os.makedirs(Config.output_dir, exist_ok=True)
+        path = os.path.join(Config.output_dir, f"{self.name}.folded")
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
+
+
+class Sampler(threading.Thread):
+    """Samples stacks on a background thread every `interval_ms`.
+
+    Given a task, only that task is sampled: its running stack when it holds
+    the event loop, and the chain of awaits it is suspended in otherwise, so
+    time spent waiting on the database or Ollama shows up too. Without a
+    task, every other thread is sampled, rooted at the thread's name.
+    """
+
+    def __init__(self, profile: Profile, task: Optional["asyncio.Task[Any]"] = None):
+        super().__init__(name=f"profiler-{profile.name}", daemon=True)
+        self.profile = profile
+        self.task = task
+        self.loop = task.get_loop() if task is not None else None
+        self.thread_id = threading.get_ident()
+        self.interval = Config.interval_ms / 1000
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                # Frames can change under us; a lost sample is fine
+                Logger.debug(Sampler, "Sample skipped: %r", e)
+
+    def stop(self) -> Profile:
+        self._stop_event.set()
+        self.join()
+        self.profile.finished = time.perf_counter()
+        return self.profile
+
+    def sample(self) -> None:
+        frames = sys._current_frames()
+        if self.task is None:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in frames.items():
+                if thread_id != self.ident:
+                    self.profile.add([names.get(thread_id, str(thread_id))] + [_label(f.f_code) for f in _stack(frame)])
+            return
+
+        if self.task.done():
+            return
+        root = self.task.get_coro()
+        if asyncio.current_task(self.loop) is self.task:
+            stack = _stack(frames.get(self.thread_id))
+            root_frame = getattr(root, "cr_frame", None)
+            # Drop the event loop frames above the task
+            for i, frame in enumerate(stack):
+                if frame is root_frame:
+                    stack = stack[i:]
+                    break
+            self.profile.add([_label(f.f_code) for f in stack])
+        else:
+            self.profile.add([_label(f.f_code) for f in _awaiting(root)] + ["<awaiting>"])
+
+
+def _profile_name(prefix: str) -> str:
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return f"{prefix}-{stamp}-{random.getrandbits(24):06x}"
+
+
+class StartupProfiler:
+    """Profiles imports and startup when PROFILING_STARTUP is set.
+
+    Started at the top of main.py, so everything main imports is covered
+    (but not what the server imported before it), and stopped by the
+    lifespan once startup is done.
+    """
+
+    sampler: Optional[Sampler] = None
+
+    @classmethod
+    def start(cls) -> None:
+        if Config.startup and cls.sampler is None:
+            cls.sampler = Sampler(Profile(_profile_name("startup")))
+            cls.sampler.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        if cls.sampler is None:
+            return
+        profile = cls.sampler.stop()
+        cls.sampler = None
+        path = profile.write()
+        Logger.info(StartupProfiler, f"Startup took {profile.wall_ms:.0f} ms, profile written to {path}")
+
+
+class ProfilerMiddleware:
+    """Profiles single requests, on demand or sampled.
+
+    "X-Profile: <PROFILING_TOKEN>" profiles a request and names the file in
+    the X-Profile response header. Adding "X-Profile-Output: inline" returns
+    the folded stacks as the response body instead, with the route's own
+    status in X-Profile-Status. PROFILING_SAMPLE_RATE profiles a fraction of
+    all requests to files. Background tasks and tasks the request spawns
+    are not sampled.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    @staticmethod
+    def requested(scope: Any) -> Optional[str]:
+        """"inline" or "file" if this request should be profiled, else None."""
+        if Config.token:
+            headers = dict(scope["headers"])
+            token = headers.get(b"x-profile")
+            if token is not None and hmac.compare_digest(token, Config.token.encode()):
+                return "inline" if headers.get(b"x-profile-output") == b"inline" else "file"
+        if Config.sample_rate > 0 and random.random() < Config.sample_rate:
+            return "file"
+        return None
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        mode = self.requested(scope) if scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        profile = Profile(_profile_name(f"{scope['method']}-{slug}"))
+        status = 500
+
+        async def send_with_header(message: Any) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if mode == "inline":
+                    return
+                headers = [*message.get("headers", []), (b"x-profile", profile.name.encode())]
+                message = {**message, "headers": headers}
+            elif mode == "inline":
+                return
+            await send(message)
+
+        sampler = Sampler(profile, asyncio.current_task())
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            Logger.info(
+                ProfilerMiddleware,
+                f"Profiled {scope['method']} {scope['path']}: {profile.wall_ms:.0f} ms, {profile.samples} samples",
+            )
+
+        if mode == "file":
+            await asyncio.to_thread(profile.write)
+            return
+        body = profile.folded().encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profile-status", str(status).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
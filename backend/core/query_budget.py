@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+from sqlalchemy import Engine, event
+from app_logging.app_logging import Logger
+from config.secrets import Secrets
+
+
+@dataclass
+class Config:
+    # Count SQL statements per request; costs one contextvar lookup per statement
+    enabled: bool = Secrets.get("DATABASE_QUERY_BUDGET", "false").lower() == "true"
+    # Raise instead of logging when a route goes over budget, so tests fail
+    strict: bool = Secrets.get("DATABASE_QUERY_BUDGET_STRICT", "false").lower() == "true"
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCount:
+    """Statements executed in one tracked block, with their SQL for the error message."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self.closed = False
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+_current: ContextVar[Optional[QueryCount]] = ContextVar("query_count", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+    # Async engines run statements through their sync engine, so this sees both.
+    # The counter is a mutable object because tasks get a copy of the context.
+    count = _current.get()
+    if count is not None and not count.closed:
+        count.statements.append(statement)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryCount]:
+    """Count the statements executed inside the block, including by tasks it starts."""
+    count = QueryCount()
+    token = _current.set(count)
+    try:
+        yield count
+    finally:
+        _current.reset(token)
+
+
+def query_budget(limit: int) -> Callable[[F], F]:
+    """Declare the most SQL statements a route may run. Put it below the route decorator."""
+
+    def decorator(endpoint: F) -> F:
+        endpoint.__query_budget__ = limit  # type: ignore
+        return endpoint
+
+    return decorator
+
+
+class QueryStats:
+    """SQL statements per request, aggregated by route template while counting is enabled."""
+
+    # route -> [requests, total statements, most statements in one request]
+    _routes: Dict[str, List[int]] = {}
+
+    @classmethod
+    def record(cls, route: str, count: int) -> None:
+        totals = cls._routes.setdefault(route, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += count
+        totals[2] = max(totals[2], count)
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._routes.clear()
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            route: {"requests": requests, "mean": round(total / requests, 2), "max": most}
+            for route, (requests, total, most) in cls._routes.items()
+        }
+
+
+def check_budget(endpoint: Any, path: str, count: QueryCount) -> None:
+    limit = getattr(endpoint, "__query_budget__", None)
+    if limit is None or count.count <= limit:
+        return
+    message = f"{path} ran {count.count} SQL statements, budget is {limit}"
+    if Config.strict:
+        raise QueryBudgetExceeded(message + ":\n" + "\n".join(count.statements))
+    Logger.warning(QueryBudgetMiddleware, message)
+
+
+class QueryBudgetMiddleware:
+    """Counts the SQL statements of each request and checks them against the route's budget.
+
+    The count covers the whole response, streamed bodies included, but not
+    background tasks run after it. Routes without a @query_budget are counted
+    but not checked, and websockets are not counted, as one connection serves
+    many turns.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_and_close(message: Any) -> None:
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                count.closed = True
+
+        with track_queries() as count:
+            await self.app(scope, receive, send_and_close)
+        # The router records the matched route and endpoint on the scope
+        route = getattr(scope.get("route"), "path", "unmatched")
+        QueryStats.record(f"{scope['method']} {route}", count.count)
+        check_budget(scope.get("endpoint"), scope["path"], count)
@@ -1,6 +1,8 @@
-from typing import Any
-from fastapi import status
-from fastapi.responses import JSONResponse, Response
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from enum import Enum
 
 from pydantic import BaseModel
@@ -34,3 +36,43 @@ class ResponseFactory:
         }
 
         return JSONResponse(status_code=status_code, content=content)
+
+    @staticmethod
+    def stream(
+        chunks: AsyncIterator[Dict[str, Any]],
+        sse: bool = False,
+        headers: Optional[Dict[str, str]] = None,
+        background: Optional[BackgroundTask] = None,
+    ) -> Response:
+        """
+        Create a streaming response that relays chunks as they are produced.
+
+        Args:
+            chunks: Async iterator of JSON-serializable chunks
+            sse: Emit Server-Sent Events instead of newline-delimited JSON
+            headers: Extra response headers
+            background: Task to run once the response has finished or the client has gone
+        """
+
+        async def body() -> AsyncIterator[str]:
+            try:
+                async for chunk in chunks:
+                    data = json.dumps(chunk)
+                    yield f"data: {data}\n\n" if sse else f"{data}\n"
+            except HTTPException as e:
+                # The status line is already sent, so errors become the last chunk
+                data = json.dumps({"error": e.detail, "status": e.status_code})
+                yield f"data: {data}\n\n" if sse else f"{data}\n"
+
+        media_type = "text/event-stream" if sse else "application/x-ndjson"
+        return StreamingResponse(
+            body(),
+            media_type=media_type,
+            headers={"Cache-Control": "no-cache", **(headers or {})},
+            background=background,
+        )
+
+    @staticmethod
+    def wants_sse(accept: str | None) -> bool:
+        """Whether the client asked for Server-Sent Events in its Accept header."""
+        return accept is not None and "text/event-stream" in accept
@@ -1,22 +1,34 @@
 from dataclasses import dataclass
-from typing import Any
-from sqlalchemy import create_engine
+from threading import Lock
+from typing import Any, Dict, Optional
+from sqlalchemy import Engine, create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from config.secrets import Secrets
-from database.utils.base import DatabaseSessionManagerUtils
+from database.utils.base import AsyncDatabaseSessionManagerUtils, DatabaseSessionManagerUtils
 
 
 @dataclass
 class Config:
     url: str = Secrets.get("DATABASE_URL")
+    pool_size: int = int(Secrets.get("DATABASE_POOL_SIZE", "5"))
+    max_overflow: int = int(Secrets.get("DATABASE_MAX_OVERFLOW", "10"))
+    pool_timeout: int = int(Secrets.get("DATABASE_POOL_TIMEOUT", "30"))
+    pool_recycle: int = int(Secrets.get("DATABASE_POOL_RECYCLE", "1800"))
+    pool_pre_ping: bool = Secrets.get("DATABASE_POOL_PRE_PING", "true").lower() == "true"
 
 
 class DatabaseSessionManager:
     """Database access layer providing CRUD operations for users, conversations, messages and assistants."""
 
+    _engine: Optional[Engine] = None
+    _engine_lock = Lock()
+
     def __init__(self):
-        """Initialize database connection engine."""
-        self.engine = create_engine(Config.url)
+        """Bind to the process-wide database engine."""
+        self.engine = DatabaseSessionManager.get_engine()
         self.session: Session = None # type: ignore
         self.utils = DatabaseSessionManagerUtils(self)
 
@@ -29,3 +41,116 @@ class DatabaseSessionManager:
         """Context manager exit point that ensures proper session cleanup."""
         if self.session:
             self.session.close()
+
+    @classmethod
+    def get_engine(cls) -> Engine:
+        """Return the shared engine, creating it and its connection pool on first use."""
+        if cls._engine is None:
+            with cls._engine_lock:
+                if cls._engine is None:
+                    cls._engine = create_engine(Config.url, **cls._engine_options())
+        return cls._engine
+
+    @staticmethod
+    def _engine_options() -> Dict[str, Any]:
+        """Pool settings for the engine. SQLite uses its own pool and ignores most of them."""
+        options: Dict[str, Any] = {"pool_pre_ping": Config.pool_pre_ping}
+        if not Config.url.startswith("sqlite"):
+            options.update(
+                pool_size=Config.pool_size,
+                max_overflow=Config.max_overflow,
+                pool_timeout=Config.pool_timeout,
+                pool_recycle=Config.pool_recycle,
+            )
+        return options
+
+    @classmethod
+    def dispose(cls) -> None:
+        """Close every pooled connection and drop the shared engine."""
+        with cls._engine_lock:
+            if cls._engine is not None:
+                cls._engine.dispose()
+                cls._engine = None
+
+    @classmethod
+    def pool_status(cls) -> Dict[str, Any]:
+        """Snapshot of the connection pool for monitoring."""
+        if cls._engine is None:
+            return {"initialized": False}
+        return _pool_status(cls._engine.pool)
+
+
+def _pool_status(pool: Any) -> Dict[str, Any]:
+    """Describe a sync or async engine's pool."""
+    status: Dict[str, Any] = {"initialized": True, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=Config.max_overflow,
+        )
+    return status
+
+
+class AsyncDatabaseSessionManager:
+    """Asyncio variant of DatabaseSessionManager. Queries are awaited instead of blocking the event loop."""
+
+    _engine: Optional[AsyncEngine] = None
+
+    # Async drivers used for each sync backend in DATABASE_URL
+    ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+    def __init__(self):
+        """Bind to the process-wide async database engine."""
+        self.engine = AsyncDatabaseSessionManager.get_engine()
+        self.session: AsyncSession = None # type: ignore
+        self.utils = AsyncDatabaseSessionManagerUtils(self)
+
+    async def __aenter__(self) -> "AsyncDatabaseSessionManager":
+        """Async context manager entry point that creates a new database session."""
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any):
+        """Async context manager exit point that ensures proper session cleanup."""
+        if self.session:
+            await self.session.close()
+
+    @classmethod
+    def get_engine(cls) -> AsyncEngine:
+        """Return the shared async engine, creating it on first use.
+
+        Engine creation does not touch the network, so no lock is needed on the event loop.
+        """
+        if cls._engine is None:
+            cls._engine = create_async_engine(
+                cls.async_url(Config.url), **DatabaseSessionManager._engine_options()
+            )
+        return cls._engine
+
+    @classmethod
+    def async_url(cls, url: str) -> str:
+        """Swap the driver of a database URL for its asyncio counterpart."""
+        parsed = make_url(url)
+        driver = cls.ASYNC_DRIVERS.get(parsed.get_backend_name())
+        if driver is None:
+            return url
+        return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(
+            hide_password=False
+        )
+
+    @classmethod
+    async def dispose(cls) -> None:
+        """Close every pooled connection and drop the shared async engine."""
+        if cls._engine is not None:
+            engine, cls._engine = cls._engine, None
+            await engine.dispose()
+
+    @classmethod
+    def pool_status(cls) -> Dict[str, Any]:
+        """Snapshot of the async connection pool for monitoring."""
+        if cls._engine is None:
+            return {"initialized": False}
+        return _pool_status(cls._engine.pool)
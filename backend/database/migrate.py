@@ -0,0 +1,100 @@
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+from app_logging.app_logging import Logger
+from config.secrets import Secrets
+from database.database import DatabaseSessionManager
+
+
+@dataclass
+class Config:
+    # Apply pending migrations at startup instead of only reporting them
+    auto_migrate: bool = Secrets.get("DATABASE_AUTO_MIGRATE", "false").lower() == "true"
+
+
+class Migrations:
+    """Versioned schema migrations (alembic), run against the shared engine.
+
+    The scripts live in database/migrations/versions. From the backend
+    directory, `alembic upgrade head` applies them, and `alembic revision
+    --autogenerate -m "..."` drafts a new one from changes to the schema.
+    """
+
+    script_location = os.path.join(os.path.dirname(__file__), "migrations")
+
+    @classmethod
+    def _config(cls, connection: Any = None) -> AlembicConfig:
+        config = AlembicConfig()
+        config.set_main_option("script_location", cls.script_location)
+        config.attributes["connection"] = connection
+        return config
+
+    @classmethod
+    def head(cls) -> str:
+        return ScriptDirectory.from_config(cls._config()).get_current_head()  # type: ignore
+
+    @classmethod
+    def current(cls) -> Optional[str]:
+        with DatabaseSessionManager.get_engine().connect() as connection:
+            return MigrationContext.configure(connection).get_current_revision()
+
+    @classmethod
+    def pending(cls) -> List[str]:
+        """Revisions not yet applied, oldest first."""
+        script = ScriptDirectory.from_config(cls._config())
+        current = cls.current()
+        revisions = script.iterate_revisions(script.get_current_head(), current)
+        return [revision.revision for revision in reversed(list(revisions))]
+
+    @classmethod
+    def upgrade(cls, revision: str = "head") -> None:
+        with DatabaseSessionManager.get_engine().begin() as connection:
+            command.upgrade(cls._config(connection), revision)
+
+    @classmethod
+    def stamp(cls, revision: str) -> None:
+        """Record a revision as applied without running it."""
+        with DatabaseSessionManager.get_engine().begin() as connection:
+            command.stamp(cls._config(connection), revision)
+
+    @classmethod
+    def is_unversioned(cls) -> bool:
+        """Tables exist, but were created by create_all and never stamped."""
+        if cls.current() is not None:
+            return False
+        return inspect(DatabaseSessionManager.get_engine()).has_table("user")
+
+    @classmethod
+    def check(cls) -> None:
+        """Report pending migrations at startup, applying them if DATABASE_AUTO_MIGRATE is set."""
+        if cls.is_unversioned():
+            Logger.warning(
+                Migrations,
+                "Database has no migration history. If it matches the original schema, "
+                "run `alembic stamp 0001_baseline` and then `alembic upgrade head`",
+            )
+            return
+
+        pending = cls.pending()
+        if not pending:
+            Logger.info(Migrations, f"Database schema is up to date at {cls.head()}")
+            return
+
+        if Config.auto_migrate:
+            Logger.info(Migrations, f"Applying migrations: {', '.join(pending)}")
+            cls.upgrade()
+            return
+
+        Logger.warning(
+            Migrations,
+            f"{len(pending)} pending migration(s): {', '.join(pending)}. Run `alembic upgrade head`",
+        )
+
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        return {"current": cls.current(), "head": cls.head()}
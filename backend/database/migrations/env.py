@@ -0,0 +1,60 @@
+from alembic import context
+from sqlmodel import SQLModel
+from database.database import DatabaseSessionManager
+import database.schema.schema  # noqa: F401  registers the tables on SQLModel.metadata
+
+
+target_metadata = SQLModel.metadata
+
+# Created by raw SQL in migration 0005 and absent from the models, so
+# autogenerate would otherwise draft their removal
+SEARCH_INDEX = {"search_vector", "ix_message_search_vector"}
+
+
+def include_object(object, name, type_, reflected, compare_to):  # type: ignore
+    """Leave the full-text search index out of autogenerate comparisons."""
+    if name in SEARCH_INDEX or (type_ == "table" and name and name.startswith("message_fts")):
+        return False
+    return True
+
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL instead of running it (alembic upgrade --sql)."""
+    engine = DatabaseSessionManager.get_engine()
+    context.configure(
+        url=engine.url,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        render_as_batch=engine.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    # Reuse a connection handed over by Migrations, otherwise open one from the shared engine
+    connection = context.config.attributes.get("connection")
+    if connection is None:
+        with DatabaseSessionManager.get_engine().connect() as connection:
+            _run(connection)
+    else:
+        _run(connection)
+
+
+def _run(connection) -> None:  # type: ignore
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite cannot alter tables in place; batch mode copies them instead
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,63 @@
+"""Context window columns and timezone-aware timestamps
+
+Revision ID: 0002_context_columns
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0002_context_columns"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TIMESTAMPS = {
+    "user": ["created_at", "last_login"],
+    "assistant": ["created_at"],
+    "conversation": ["created_at", "updated_at"],
+    "message": ["created_at"],
+}
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("assistant") as batch:
+        batch.add_column(sa.Column("context_tokens", sa.Integer(), nullable=True))
+    with op.batch_alter_table("conversation") as batch:
+        batch.add_column(sa.Column("summary", sa.String(), nullable=True))
+        batch.add_column(sa.Column("summary_until_id", sa.Integer(), nullable=True))
+    with op.batch_alter_table("message") as batch:
+        batch.add_column(sa.Column("token_count", sa.Integer(), nullable=True))
+
+    # Timestamps are now written as UTC from Python; SQLite has no timestamp types to change
+    if op.get_bind().dialect.name == "postgresql":
+        for table, columns in TIMESTAMPS.items():
+            for column in columns:
+                op.alter_column(
+                    table,
+                    column,
+                    type_=sa.DateTime(timezone=True),
+                    postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+                )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        for table, columns in TIMESTAMPS.items():
+            for column in columns:
+                op.alter_column(
+                    table,
+                    column,
+                    type_=sa.DateTime(),
+                    postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+                )
+
+    with op.batch_alter_table("message") as batch:
+        batch.drop_column("token_count")
+    with op.batch_alter_table("conversation") as batch:
+        batch.drop_column("summary_until_id")
+        batch.drop_column("summary")
+    with op.batch_alter_table("assistant") as batch:
+        batch.drop_column("context_tokens")
@@ -0,0 +1,37 @@
+"""Indexes for the hot query paths and a unique user name
+
+Revision ID: 0003_indexes
+Revises: 0002_context_columns
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+from alembic import op
+
+
+revision: str = "0003_indexes"
+down_revision: Union[str, None] = "0002_context_columns"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fails if two users already share a name; rename them before upgrading
+    op.create_index("ix_user_name", "user", ["name"], unique=True)
+    op.create_index("ix_assistant_user_id", "assistant", ["user_id"])
+    op.create_index(
+        "ix_conversation_user_id_updated_at", "conversation", ["user_id", "updated_at", "id"]
+    )
+    op.create_index(
+        "ix_message_conversation_id_created_at",
+        "message",
+        ["conversation_id", "created_at", "id"],
+    )
+    op.create_index("ix_message_conversation_id_id", "message", ["conversation_id", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_message_conversation_id_id", table_name="message")
+    op.drop_index("ix_message_conversation_id_created_at", table_name="message")
+    op.drop_index("ix_conversation_user_id_updated_at", table_name="conversation")
+    op.drop_index("ix_assistant_user_id", table_name="assistant")
+    op.drop_index("ix_user_name", table_name="user")
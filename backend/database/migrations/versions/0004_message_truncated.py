@@ -0,0 +1,25 @@
+"""Mark assistant replies that were cut short
+
+Revision ID: 0004_message_truncated
+Revises: 0003_indexes
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0004_message_truncated"
+down_revision: Union[str, None] = "0003_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("message") as batch:
+        batch.add_column(sa.Column("truncated", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("message") as batch:
+        batch.drop_column("truncated")
@@ -0,0 +1,72 @@
+"""Full-text search index over message content
+
+Revision ID: 0005_message_search
+Revises: 0004_message_truncated
+Create Date: 2026-10-18
+
+Postgres: a stored tsvector column generated from the content, with a GIN
+index. Adding it rewrites the message table. SQLite: an external content
+FTS5 table kept in step by triggers. A later SQLite migration that rebuilds
+the message table (batch mode "recreate") drops those triggers and must
+create them again.
+"""
+from typing import Sequence, Union
+from alembic import op
+
+
+revision: str = "0005_message_search"
+down_revision: Union[str, None] = "0004_message_truncated"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match POSTGRES_CONFIG in database/utils/search.py
+POSTGRES_CONFIG = "english"
+
+SQLITE_TRIGGERS = {
+    "message_fts_insert": """
+        CREATE TRIGGER message_fts_insert AFTER INSERT ON message BEGIN
+            INSERT INTO message_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    """,
+    "message_fts_delete": """
+        CREATE TRIGGER message_fts_delete AFTER DELETE ON message BEGIN
+            INSERT INTO message_fts (message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    """,
+    "message_fts_update": """
+        CREATE TRIGGER message_fts_update AFTER UPDATE OF content ON message BEGIN
+            INSERT INTO message_fts (message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO message_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    """,
+}
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute(
+            "ALTER TABLE message ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{POSTGRES_CONFIG}', content)) STORED"
+        )
+        op.create_index("ix_message_search_vector", "message", ["search_vector"], postgresql_using="gin")
+    elif dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE message_fts USING fts5("
+            "content, content='message', content_rowid='id', tokenize='porter unicode61')"
+        )
+        for trigger in SQLITE_TRIGGERS.values():
+            op.execute(trigger)
+        # Index the messages that already exist
+        op.execute("INSERT INTO message_fts (message_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.drop_index("ix_message_search_vector", table_name="message")
+        op.execute("ALTER TABLE message DROP COLUMN search_vector")
+    elif dialect == "sqlite":
+        for name in SQLITE_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE IF EXISTS message_fts")
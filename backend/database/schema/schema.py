@@ -1,44 +1,70 @@
-from datetime import datetime
-from sqlmodel import Field, Relationship, SQLModel, func # type: ignore
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, false
+from sqlmodel import Field, Index, Relationship, SQLModel # type: ignore
+
+
+def utcnow() -> datetime:
+    """UTC timestamp, set in Python so rows and keyset cursors share one precision."""
+    return datetime.now(timezone.utc)
+
+
+# Aware timestamps need timestamptz on Postgres, which migration 0002 converts the columns to
+TIMESTAMP = DateTime(timezone=True)
 
 
 class User(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
-    name: str
+    name: str = Field(unique=True, index=True)  # token subject, looked up on every login
     email: str = Field(unique=True)
     hashed_password: str = Field()
-    created_at: datetime = Field(default=func.now())
-    last_login: datetime = Field(default=func.now())
+    created_at: datetime = Field(default_factory=utcnow, sa_type=TIMESTAMP)
+    last_login: datetime = Field(default_factory=utcnow, sa_type=TIMESTAMP)
     disabled: bool = Field(default=False)
     # Relationships
     conversations: list["Conversation"] = Relationship(back_populates="user")
 
 class Assistant(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
     name: str
     model: str
-    created_at: datetime = Field(default=func.now())
+    context_tokens: int | None = Field(default=None)  # prompt budget, overrides the per-model default
+    created_at: datetime = Field(default_factory=utcnow, sa_type=TIMESTAMP)
     # Relationships
     conversations: list["Conversation"] = Relationship(back_populates="assistant")
 
 class Conversation(SQLModel, table=True):
+    # Listing a user's conversations, newest first, pages by (updated_at, id)
+    __table_args__ = (Index("ix_conversation_user_id_updated_at", "user_id", "updated_at", "id"),)
+
     id: int = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     assistant_id: int = Field(foreign_key="assistant.id")
     title: str
-    created_at: datetime = Field(default=func.now())
-    updated_at: datetime = Field(default=func.now())
+    summary: str | None = Field(default=None)  # rolling summary of turns dropped from the context
+    summary_until_id: int | None = Field(default=None)  # newest message id folded into the summary
+    created_at: datetime = Field(default_factory=utcnow, sa_type=TIMESTAMP)
+    updated_at: datetime = Field(default_factory=utcnow, sa_type=TIMESTAMP)
     # Relationships
     user: User = Relationship(back_populates="conversations")
     assistant: Assistant = Relationship(back_populates="conversations")
     messages: list["Message"] = Relationship(back_populates="conversation")
     
 class Message(SQLModel, table=True):
+    __table_args__ = (
+        # Paging through a conversation by (created_at, id)
+        Index("ix_message_conversation_id_created_at", "conversation_id", "created_at", "id"),
+        # Context window reads of the latest messages by id
+        Index("ix_message_conversation_id_id", "conversation_id", "id"),
+    )
+
     id: int = Field(default=None, primary_key=True)
     conversation_id: int = Field(foreign_key="conversation.id")
     role: str  # "user" or "assistant"
     content: str
-    created_at: datetime = Field(default=func.now())
+    token_count: int | None = Field(default=None)
+    # An assistant reply cut short by a cancel, a disconnect or an error
+    truncated: bool = Field(default=False, sa_column_kwargs={"server_default": false()})
+    created_at: datetime = Field(default_factory=utcnow, sa_type=TIMESTAMP)
     # Relationshipts
     conversation: Conversation = Relationship(back_populates="messages")
\ No newline at end of file
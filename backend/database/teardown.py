@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import List
+from app_logging.app_logging import Logger
+from config.secrets import Secrets
+from database.database import AsyncDatabaseSessionManager
+from database.schema.schema import Assistant, User
+
+
+@dataclass
+class Config:
+    chunk_size: int = int(Secrets.get("DATABASE_DELETE_CHUNK_SIZE", "1000"))
+
+
+class Teardown:
+    """Chunked deletes for large accounts, meant to run as background tasks.
+
+    Messages go first, each chunk in its own short transaction, so no single
+    transaction holds locks on the whole account. The parent rows are removed
+    last with the set-based deletes, so if a run fails part-way they are still
+    there and the delete can simply be repeated.
+    """
+
+    @staticmethod
+    async def _delete_messages(dsm: AsyncDatabaseSessionManager, conversation_ids: List[int]) -> int:
+        deleted = 0
+        while conversation_ids:
+            count = await dsm.utils.message.delete_chunk(conversation_ids, Config.chunk_size)
+            deleted += count
+            if count < Config.chunk_size:
+                break
+        return deleted
+
+    @staticmethod
+    async def conversations(conversation_ids: List[int]) -> None:
+        async with AsyncDatabaseSessionManager() as dsm:
+            deleted = await Teardown._delete_messages(dsm, conversation_ids)
+            await dsm.utils.conversation.delete_by_ids(conversation_ids)
+        Logger.info(Teardown, f"Deleted {len(conversation_ids)} conversations and {deleted} messages")
+
+    @staticmethod
+    async def assistant(assistant: Assistant) -> None:
+        async with AsyncDatabaseSessionManager() as dsm:
+            conversation_ids = await dsm.utils.conversation.get_ids_for_assistant(assistant.id)
+            deleted = await Teardown._delete_messages(dsm, conversation_ids)
+            await dsm.utils.assistant.delete(assistant)
+        Logger.info(Teardown, f"Deleted assistant {assistant.id} and {deleted} messages")
+
+    @staticmethod
+    async def user(user: User) -> None:
+        async with AsyncDatabaseSessionManager() as dsm:
+            conversation_ids = await dsm.utils.conversation.get_ids_for_user(user.id)
+            deleted = await Teardown._delete_messages(dsm, conversation_ids)
+            await dsm.utils.user.delete(user)
+        Logger.info(Teardown, f"Deleted user {user.id} and {deleted} messages")
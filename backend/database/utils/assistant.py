@@ -1,9 +1,26 @@
+from datetime import datetime
+from sqlalchemy import and_, func
 from sqlmodel import select
-from database.schema.schema import Assistant, User
-from typing import TYPE_CHECKING, List
+from database.schema.schema import Assistant, Conversation, Message, User
+from database.utils import cascade
+from typing import TYPE_CHECKING, List, Tuple
 
 if TYPE_CHECKING:
-    from database.database import DatabaseSessionManager
+    from core.principal import Principal
+    from database.database import AsyncDatabaseSessionManager, DatabaseSessionManager
+
+
+def model_usage_statement(since: datetime):
+    """Every assistant model with its message count since `since`, most used first."""
+    messages = func.count(Message.id)
+    return (
+        select(Assistant.model, messages)
+        .select_from(Assistant)
+        .outerjoin(Conversation, Conversation.assistant_id == Assistant.id)
+        .outerjoin(Message, and_(Message.conversation_id == Conversation.id, Message.created_at >= since))
+        .group_by(Assistant.model)
+        .order_by(messages.desc(), Assistant.model)
+    )
 
 
 class DatabaseSessionManagerAssistantUtils:
@@ -15,11 +32,15 @@ class DatabaseSessionManagerAssistantUtils:
         statement = select(Assistant).where(Assistant.id == assistant_id)
         return self.dsm.session.exec(statement).first()
 
-    def get_all(self, user: User) -> List[Assistant]:
+    def get_all(self, user: "User | Principal") -> List[Assistant]:
         """Retrieve all assistants for a given user."""
         statement = select(Assistant).where(Assistant.user_id == user.id)
         return list(self.dsm.session.exec(statement))
 
+    def get_model_usage(self, since: datetime) -> List[Tuple[str, int]]:
+        """Every assistant model with its message count since `since`, most used first."""
+        return [(model, count) for model, count in self.dsm.session.exec(model_usage_statement(since))]
+
     def create(self, assistant: Assistant) -> Assistant:
         """Create a new assistant record."""
         self.dsm.session.add(assistant)
@@ -28,6 +49,39 @@ class DatabaseSessionManagerAssistantUtils:
         return assistant
 
     def delete(self, assistant: Assistant) -> None:
-        """Delete an assistant record."""
-        self.dsm.session.delete(assistant)
+        """Delete an assistant with every conversation using it, in one transaction."""
+        for statement in cascade.delete_assistants(Assistant.id == assistant.id):
+            self.dsm.session.exec(statement)
         self.dsm.session.commit()
+
+
+class AsyncDatabaseSessionManagerAssistantUtils:
+    def __init__(self, dsm: "AsyncDatabaseSessionManager"):
+        self.dsm = dsm
+
+    async def get_by_id(self, assistant_id: int) -> Assistant | None:
+        """Retrieve a specific assistant by its ID."""
+        statement = select(Assistant).where(Assistant.id == assistant_id)
+        return (await self.dsm.session.exec(statement)).first()
+
+    async def get_all(self, user: "User | Principal") -> List[Assistant]:
+        """Retrieve all assistants for a given user."""
+        statement = select(Assistant).where(Assistant.user_id == user.id)
+        return list(await self.dsm.session.exec(statement))
+
+    async def get_model_usage(self, since: datetime) -> List[Tuple[str, int]]:
+        """Every assistant model with its message count since `since`, most used first."""
+        return [(model, count) for model, count in await self.dsm.session.exec(model_usage_statement(since))]
+
+    async def create(self, assistant: Assistant) -> Assistant:
+        """Create a new assistant record."""
+        self.dsm.session.add(assistant)
+        await self.dsm.session.commit()
+        await self.dsm.session.refresh(assistant)
+        return assistant
+
+    async def delete(self, assistant: Assistant) -> None:
+        """Delete an assistant with every conversation using it, in one transaction."""
+        for statement in cascade.delete_assistants(Assistant.id == assistant.id):
+            await self.dsm.session.exec(statement)
+        await self.dsm.session.commit()
@@ -1,11 +1,20 @@
 from typing import TYPE_CHECKING
-from database.utils.assistant import DatabaseSessionManagerAssistantUtils
-from database.utils.conversation import DatabaseSessionManagerConversationUtils
-from database.utils.message import DatabaseSessionManagerMessageUtils
-from database.utils.user import DatabaseSessionManagerUserUtils
+from database.utils.assistant import (
+    AsyncDatabaseSessionManagerAssistantUtils,
+    DatabaseSessionManagerAssistantUtils,
+)
+from database.utils.conversation import (
+    AsyncDatabaseSessionManagerConversationUtils,
+    DatabaseSessionManagerConversationUtils,
+)
+from database.utils.message import (
+    AsyncDatabaseSessionManagerMessageUtils,
+    DatabaseSessionManagerMessageUtils,
+)
+from database.utils.user import AsyncDatabaseSessionManagerUserUtils, DatabaseSessionManagerUserUtils
 
 if TYPE_CHECKING:
-    from database.database import DatabaseSessionManager
+    from database.database import AsyncDatabaseSessionManager, DatabaseSessionManager
 
 
 class DatabaseSessionManagerUtils:
@@ -14,3 +23,11 @@ class DatabaseSessionManagerUtils:
         self.conversation = DatabaseSessionManagerConversationUtils(dsm)
         self.message = DatabaseSessionManagerMessageUtils(dsm)
         self.assistant = DatabaseSessionManagerAssistantUtils(dsm)
+
+
+class AsyncDatabaseSessionManagerUtils:
+    def __init__(self, dsm: "AsyncDatabaseSessionManager"):
+        self.user = AsyncDatabaseSessionManagerUserUtils(dsm)
+        self.conversation = AsyncDatabaseSessionManagerConversationUtils(dsm)
+        self.message = AsyncDatabaseSessionManagerMessageUtils(dsm)
+        self.assistant = AsyncDatabaseSessionManagerAssistantUtils(dsm)
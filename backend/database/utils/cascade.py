@@ -0,0 +1,67 @@
+from typing import Any, List
+from sqlalchemy import delete, or_
+from sqlmodel import select
+from database.schema.schema import Assistant, Conversation, Message as ChatMessage, User
+
+
+# Set-based teardown: each level is removed with one DELETE ... WHERE over a
+# subquery, children first, instead of loading rows and deleting them one by
+# one. The session is not synchronised: callers commit and discard the objects.
+SET_BASED = {"synchronize_session": False}
+
+
+def delete_conversations(condition: Any) -> List[Any]:
+    """Statements deleting the conversations matching `condition` and their messages."""
+    conversation_ids = select(Conversation.id).where(condition)
+    return [
+        delete(ChatMessage)
+        .where(ChatMessage.conversation_id.in_(conversation_ids))  # type: ignore
+        .execution_options(**SET_BASED),
+        delete(Conversation).where(condition).execution_options(**SET_BASED),
+    ]
+
+
+def delete_assistants(condition: Any) -> List[Any]:
+    """Statements deleting the assistants matching `condition` and every conversation using them."""
+    assistant_ids = select(Assistant.id).where(condition)
+    return [
+        *delete_conversations(Conversation.assistant_id.in_(assistant_ids)),  # type: ignore
+        delete(Assistant).where(condition).execution_options(**SET_BASED),
+    ]
+
+
+def delete_user(user_id: int) -> List[Any]:
+    """Statements deleting a user with their assistants and conversations.
+
+    Includes other users' conversations with this user's assistants, which
+    would otherwise be left pointing at a deleted assistant.
+    """
+    assistant_ids = select(Assistant.id).where(Assistant.user_id == user_id)
+    return [
+        *delete_conversations(
+            or_(Conversation.user_id == user_id, Conversation.assistant_id.in_(assistant_ids))  # type: ignore
+        ),
+        delete(Assistant).where(Assistant.user_id == user_id).execution_options(**SET_BASED),
+        delete(User).where(User.id == user_id).execution_options(**SET_BASED),  # type: ignore
+    ]
+
+
+def conversation_ids_for_assistant(assistant_id: int) -> Any:
+    return select(Conversation.id).where(Conversation.assistant_id == assistant_id)
+
+
+def conversation_ids_for_user(user_id: int) -> Any:
+    assistant_ids = select(Assistant.id).where(Assistant.user_id == user_id)
+    return select(Conversation.id).where(
+        or_(Conversation.user_id == user_id, Conversation.assistant_id.in_(assistant_ids))  # type: ignore
+    )
+
+
+def delete_messages_chunk(conversation_ids: List[int], chunk_size: int) -> Any:
+    """Statement deleting at most `chunk_size` messages of the given conversations."""
+    chunk = (
+        select(ChatMessage.id)
+        .where(ChatMessage.conversation_id.in_(conversation_ids))  # type: ignore
+        .limit(chunk_size)
+    )
+    return delete(ChatMessage).where(ChatMessage.id.in_(chunk)).execution_options(**SET_BASED)  # type: ignore
@@ -1,9 +1,21 @@
-from sqlmodel import select
-from database.schema.schema import Conversation, User
+from datetime import datetime
 from typing import TYPE_CHECKING, List
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
+from core.pagination import Keyset, Page
+from database.schema.schema import Conversation, User, utcnow
+from database.utils import cascade
 
 if TYPE_CHECKING:
-    from database.database import DatabaseSessionManager
+    from core.principal import Principal
+    from database.database import AsyncDatabaseSessionManager, DatabaseSessionManager
+
+
+# Eager loading strategy: the single assistant is joined into the conversation
+# row. Use it rather than touching the relationship afterwards, which costs a
+# query per conversation (or fails outright on an async session).
+WITH_ASSISTANT = (joinedload(Conversation.assistant),)  # type: ignore
 
 
 class DatabaseSessionManagerConversationUtils:
@@ -15,7 +27,14 @@ class DatabaseSessionManagerConversationUtils:
         statement = select(Conversation).where(Conversation.id == conversation_id)
         return self.dsm.session.exec(statement).first()
 
-    def get_all(self, user: User) -> List[Conversation]:
+    def get_with_assistant(self, conversation_id: int) -> Conversation | None:
+        """Retrieve a conversation and its assistant in one query."""
+        statement = (
+            select(Conversation).where(Conversation.id == conversation_id).options(*WITH_ASSISTANT)
+        )
+        return self.dsm.session.exec(statement).first()
+
+    def get_all(self, user: "User | Principal") -> List[Conversation]:
         """Retrieve all conversations for a given user."""
         statement = select(Conversation).where(Conversation.user_id == user.id)
         return list(self.dsm.session.exec(statement))
@@ -28,11 +47,90 @@ class DatabaseSessionManagerConversationUtils:
         return conversation
 
     def delete_by_id(self, conversation_id: int) -> None:
-        """Delete a conversation record and all its messages by the conversation ID."""
+        """Delete a conversation and all its messages, one bulk DELETE each, in one transaction."""
+        for statement in cascade.delete_conversations(Conversation.id == conversation_id):
+            self.dsm.session.exec(statement)
+        self.dsm.session.commit()
+
+
+class AsyncDatabaseSessionManagerConversationUtils:
+    def __init__(self, dsm: "AsyncDatabaseSessionManager"):
+        self.dsm = dsm
+
+    async def get_by_id(self, conversation_id: int) -> Conversation | None:
+        """Retrieve a specific conversation by its ID."""
         statement = select(Conversation).where(Conversation.id == conversation_id)
-        conversation = self.dsm.session.exec(statement).first()
-        if conversation:
-            for message in conversation.messages:
-                self.dsm.session.delete(message)
-            self.dsm.session.delete(conversation)
-            self.dsm.session.commit()
+        return (await self.dsm.session.exec(statement)).first()
+
+    async def get_with_assistant(self, conversation_id: int) -> Conversation | None:
+        """Retrieve a conversation and its assistant in one query, without its messages."""
+        statement = (
+            select(Conversation).where(Conversation.id == conversation_id).options(*WITH_ASSISTANT)
+        )
+        return (await self.dsm.session.exec(statement)).first()
+
+    async def get_all(self, user: "User | Principal") -> List[Conversation]:
+        """Retrieve all conversations for a given user."""
+        statement = select(Conversation).where(Conversation.user_id == user.id)
+        return list(await self.dsm.session.exec(statement))
+
+    async def get_page(self, user: "User | Principal", keyset: Keyset) -> Page[Conversation]:
+        """Retrieve a page of a user's conversations, most recently updated first."""
+        statement = keyset.apply(select(Conversation).where(Conversation.user_id == user.id))
+        return keyset.page(list(await self.dsm.session.exec(statement)), "updated_at")
+
+    async def touch(self, conversation_id: int) -> datetime:
+        """Bump updated_at, without committing, so the conversation sorts as recently active.
+
+        Returns the new value, which also versions the conversation's cached history.
+        """
+        updated_at = utcnow()
+        await self.dsm.session.exec(
+            update(Conversation)  # type: ignore
+            .where(Conversation.id == conversation_id)  # type: ignore
+            .values(updated_at=updated_at)
+        )
+        return updated_at
+
+    async def set_summary(
+        self, conversation_id: int, summary: str, until_id: int, previous_until_id: int | None
+    ) -> bool:
+        """Store a summary and commit, unless the summary has moved on from `previous_until_id`
+        since it was read. Returns whether it was stored."""
+        expected = (
+            Conversation.summary_until_id.is_(None)  # type: ignore
+            if previous_until_id is None
+            else Conversation.summary_until_id == previous_until_id
+        )
+        result = await self.dsm.session.exec(
+            update(Conversation)  # type: ignore
+            .where(Conversation.id == conversation_id, expected)  # type: ignore
+            .values(summary=summary, summary_until_id=until_id)
+        )
+        await self.dsm.session.commit()
+        return result.rowcount > 0  # type: ignore
+
+    async def create(self, conversation: Conversation) -> Conversation:
+        """Create a new conversation record."""
+        self.dsm.session.add(conversation)
+        await self.dsm.session.commit()
+        await self.dsm.session.refresh(conversation)
+        return conversation
+
+    async def delete_by_id(self, conversation_id: int) -> None:
+        """Delete a conversation and all its messages, one bulk DELETE each, in one transaction."""
+        await self.delete_by_ids([conversation_id])
+
+    async def delete_by_ids(self, conversation_ids: List[int]) -> None:
+        """Delete conversations and whatever messages they still have, in one transaction."""
+        for statement in cascade.delete_conversations(Conversation.id.in_(conversation_ids)):  # type: ignore
+            await self.dsm.session.exec(statement)
+        await self.dsm.session.commit()
+
+    async def get_ids_for_assistant(self, assistant_id: int) -> List[int]:
+        """IDs of every conversation with an assistant, whoever owns the conversation."""
+        return list(await self.dsm.session.exec(cascade.conversation_ids_for_assistant(assistant_id)))
+
+    async def get_ids_for_user(self, user_id: int) -> List[int]:
+        """IDs of a user's conversations, and of others' conversations with the user's assistants."""
+        return list(await self.dsm.session.exec(cascade.conversation_ids_for_user(user_id)))
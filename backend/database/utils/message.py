@@ -1,9 +1,12 @@
 from sqlmodel import select
+from core.pagination import Keyset, Page, ScoreCursor
 from database.schema.schema import Conversation, Message as ChatMessage
-from typing import List, TYPE_CHECKING
+from database.utils import cascade
+from database.utils.search import search_statement
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from database.database import DatabaseSessionManager
+    from database.database import AsyncDatabaseSessionManager, DatabaseSessionManager
 
 
 class DatabaseSessionManagerMessageUtils:
@@ -24,4 +27,84 @@ class DatabaseSessionManagerMessageUtils:
         self.dsm.session.refresh(messages)
         return messages
 
-    
\ No newline at end of file
+
+class AsyncDatabaseSessionManagerMessageUtils:
+    def __init__(self, dsm: "AsyncDatabaseSessionManager"):
+        self.dsm = dsm
+
+    async def get_all(self, conversation: Conversation) -> List[ChatMessage]:
+        """Retrieve all messages for a given conversation."""
+        statement = select(ChatMessage).where(
+            ChatMessage.conversation_id == conversation.id
+        )
+        return list(await self.dsm.session.exec(statement))
+
+    async def create(self, messages: List[ChatMessage]) -> List[ChatMessage]:
+        """Create multiple message records in bulk."""
+        self.dsm.session.add_all(messages)
+        await self.dsm.session.commit()
+        for message in messages:
+            await self.dsm.session.refresh(message)
+        return messages
+
+    async def get_page(self, conversation_id: int, keyset: Keyset) -> Page[ChatMessage]:
+        """Retrieve a page of a conversation's messages, in chronological order."""
+        statement = keyset.apply(
+            select(ChatMessage).where(ChatMessage.conversation_id == conversation_id)
+        )
+        rows = list(await self.dsm.session.exec(statement))
+        return keyset.page(rows, "created_at", newest_first=False)
+
+    async def get_recent(
+        self, conversation_id: int, limit: int, before_id: Optional[int] = None
+    ) -> List[ChatMessage]:
+        """Retrieve up to `limit` messages older than `before_id`, newest first."""
+        statement = select(ChatMessage).where(ChatMessage.conversation_id == conversation_id)
+        if before_id is not None:
+            statement = statement.where(ChatMessage.id < before_id)
+        statement = statement.order_by(ChatMessage.id.desc()).limit(limit)  # type: ignore
+        return list(await self.dsm.session.exec(statement))
+
+    async def get_range(
+        self, conversation_id: int, after_id: int, until_id: int, limit: int
+    ) -> List[ChatMessage]:
+        """Retrieve up to `limit` messages with after_id < id <= until_id, oldest first."""
+        statement = (
+            select(ChatMessage)
+            .where(
+                ChatMessage.conversation_id == conversation_id,
+                ChatMessage.id > after_id,
+                ChatMessage.id <= until_id,
+            )
+            .order_by(ChatMessage.id)  # type: ignore
+            .limit(limit)
+        )
+        return list(await self.dsm.session.exec(statement))
+
+    async def search(
+        self, user_id: int, query: str, limit: int, before: Optional[str] = None
+    ) -> Page[Dict[str, Any]]:
+        """Full-text search over a user's messages, best match first, with snippets.
+
+        Uses the GIN index on message.search_vector on Postgres and the
+        message_fts table on SQLite. X-Next-Cursor pages to worse matches.
+        """
+        after = ScoreCursor.decode(before) if before else None
+        statement, params = search_statement(
+            self.dsm.engine.dialect.name, user_id, query, limit + 1, after
+        )
+        rows = [dict(row) for row in (await self.dsm.session.exec(statement, params=params)).mappings()]  # type: ignore
+        page: Page[Dict[str, Any]] = Page(items=rows[:limit])
+        if len(rows) > limit:
+            last = page.items[-1]
+            page.next_cursor = ScoreCursor.encode(last["score"], last["id"])
+        return page
+
+    async def delete_chunk(self, conversation_ids: List[int], chunk_size: int) -> int:
+        """Delete and commit up to `chunk_size` messages of the given conversations.
+
+        Returns how many were deleted; fewer than `chunk_size` means none are left.
+        """
+        result = await self.dsm.session.exec(cascade.delete_messages_chunk(conversation_ids, chunk_size))
+        await self.dsm.session.commit()
+        return result.rowcount  # type: ignore
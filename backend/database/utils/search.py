@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import DateTime, TextualSelect, text
+from config.secrets import Secrets
+from core.exception import APIException
+
+
+@dataclass
+class Config:
+    # Marks the matched words in snippets
+    highlight_start: str = Secrets.get("SEARCH_HIGHLIGHT_START", "**")
+    highlight_stop: str = Secrets.get("SEARCH_HIGHLIGHT_STOP", "**")
+    snippet_words: int = int(Secrets.get("SEARCH_SNIPPET_WORDS", "16"))
+
+
+# Must match the configuration of message.search_vector in migration 0005
+POSTGRES_CONFIG = "english"
+
+# Full-text search over a user's messages. Both return the page after an
+# optional (score, id) cursor, best match first. Scores are only comparable
+# within one query: ts_rank_cd on Postgres, the negated bm25 on SQLite.
+POSTGRES_SEARCH = """
+SELECT m.id, m.conversation_id, c.title AS conversation_title, m.role, m.created_at,
+       ts_rank_cd(m.search_vector, q) AS score,
+       ts_headline(CAST(:config AS regconfig), m.content, q, :headline) AS snippet
+FROM message m
+JOIN conversation c ON c.id = m.conversation_id
+CROSS JOIN websearch_to_tsquery(CAST(:config AS regconfig), :query) AS q
+WHERE c.user_id = :user_id AND m.search_vector @@ q {after}
+ORDER BY score DESC, m.id DESC
+LIMIT :limit
+"""
+POSTGRES_AFTER = (
+    "AND (ts_rank_cd(m.search_vector, q) < :score"
+    " OR (ts_rank_cd(m.search_vector, q) = :score AND m.id < :id))"
+)
+
+SQLITE_SEARCH = """
+SELECT m.id, m.conversation_id, c.title AS conversation_title, m.role, m.created_at,
+       -bm25(message_fts) AS score,
+       snippet(message_fts, 0, :start, :stop, '…', :words) AS snippet
+FROM message_fts
+JOIN message m ON m.id = message_fts.rowid
+JOIN conversation c ON c.id = m.conversation_id
+WHERE message_fts MATCH :query AND c.user_id = :user_id {after}
+ORDER BY score DESC, m.id DESC
+LIMIT :limit
+"""
+SQLITE_AFTER = "AND (-bm25(message_fts) < :score OR (-bm25(message_fts) = :score AND m.id < :id))"
+
+
+def fts5_query(query: str) -> str:
+    """User input as an FTS5 query where every word must match. Each word is quoted,
+    so FTS5 operators and syntax in the input are not interpreted."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def search_statement(
+    dialect: str, user_id: int, query: str, limit: int, after: Optional[Tuple[float, int]] = None
+) -> Tuple[TextualSelect, Dict[str, Any]]:
+    """The search statement for a database dialect, with its parameters."""
+    params: Dict[str, Any] = {"user_id": user_id, "limit": limit}
+    if after is not None:
+        params["score"], params["id"] = after
+    if dialect == "postgresql":
+        sql = POSTGRES_SEARCH.format(after=POSTGRES_AFTER if after else "")
+        params.update(
+            config=POSTGRES_CONFIG,
+            query=query,
+            headline=(
+                f'StartSel="{Config.highlight_start}", StopSel="{Config.highlight_stop}", '
+                f"MaxWords={Config.snippet_words}, MinWords={max(Config.snippet_words // 3, 1)}"
+            ),
+        )
+    elif dialect == "sqlite":
+        sql = SQLITE_SEARCH.format(after=SQLITE_AFTER if after else "")
+        params.update(
+            query=fts5_query(query),
+            start=Config.highlight_start,
+            stop=Config.highlight_stop,
+            words=Config.snippet_words,
+        )
+    else:
+        raise APIException(
+            status_code=APIException.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"Full-text search is not supported on {dialect}",
+        )
+    # Typed, so SQLite's text timestamps come back as datetimes like everywhere else
+    return text(sql).columns(created_at=DateTime(timezone=True)), params
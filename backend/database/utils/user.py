@@ -1,9 +1,12 @@
 from typing import TYPE_CHECKING
+from sqlalchemy import update
 from sqlmodel import select
+from core.principal import PrincipalCache
 from database.schema.schema import User
+from database.utils import cascade
 
 if TYPE_CHECKING:
-    from database.database import DatabaseSessionManager
+    from database.database import AsyncDatabaseSessionManager, DatabaseSessionManager
 
 
 class DatabaseSessionManagerUserUtils:
@@ -28,6 +31,59 @@ class DatabaseSessionManagerUserUtils:
         return user
     
     def delete(self, user: User) -> None:
-        """Delete a user record."""
-        self.dsm.session.delete(user)
-        self.dsm.session.commit()
\ No newline at end of file
+        """Delete a user with their assistants and conversations, in one transaction."""
+        name = user.name  # read before the commit expires the deleted row
+        for statement in cascade.delete_user(user.id):
+            self.dsm.session.exec(statement)
+        self.dsm.session.commit()
+        PrincipalCache.invalidate(name)
+
+
+class AsyncDatabaseSessionManagerUserUtils:
+    def __init__(self, dsm: "AsyncDatabaseSessionManager"):
+        self.dsm = dsm
+
+    async def get(self, name: str) -> User | None:
+        """Retrieve a user by their username."""
+        statement = select(User).where(User.name == name)
+        return (await self.dsm.session.exec(statement)).first()
+
+    async def get_by_email(self, email: str) -> User | None:
+        """Retrieve a user by their email address."""
+        statement = select(User).where(User.email == email)
+        return (await self.dsm.session.exec(statement)).first()
+
+    async def create(self, user: User) -> User:
+        """Create a new user record."""
+        self.dsm.session.add(user)
+        await self.dsm.session.commit()
+        await self.dsm.session.refresh(user)
+        return user
+
+    async def set_password_hash(self, user: User, hashed_password: str) -> User:
+        """Replace a user's password hash, e.g. after a bcrypt cost change.
+
+        Written by id, so `user` may come from a session that is already closed.
+        """
+        await self.dsm.session.exec(
+            update(User).where(User.id == user.id).values(hashed_password=hashed_password)  # type: ignore
+        )
+        await self.dsm.session.commit()
+        user.hashed_password = hashed_password
+        return user
+
+    async def set_disabled(self, user: User, disabled: bool) -> User:
+        """Disable or re-enable a user account."""
+        user.disabled = disabled
+        await self.dsm.session.commit()
+        PrincipalCache.invalidate(user.name)
+        await self.dsm.session.refresh(user)
+        return user
+
+    async def delete(self, user: User) -> None:
+        """Delete a user with their assistants and conversations, in one transaction."""
+        name = user.name  # read before the commit expires the deleted row
+        for statement in cascade.delete_user(user.id):
+            await self.dsm.session.exec(statement)
+        await self.dsm.session.commit()
+        PrincipalCache.invalidate(name)
@@ -1,24 +1,66 @@
+# Started before the other imports, so PROFILING_STARTUP covers them
+from core.profiler import StartupProfiler
+
+StartupProfiler.start()
+
+from contextlib import asynccontextmanager
 from typing import Any
+from starlette.concurrency import run_in_threadpool
 from app_logging.app_logging import Logger
+from auth import shutdown_hash_executor
 from config.secrets import Secrets
 from config.environment import Environment
-from startup import create_tables_for_dev
-from fastapi import FastAPI
+from core.deadline import DeadlineMiddleware
+from core.metrics import Config as MetricsConfig, Gauge, Metrics, MetricsMiddleware, track_in_flight
+from core.principal import PrincipalCache
+from core.profiler import Config as ProfilerConfig, ProfilerMiddleware
+from core.query_budget import Config as QueryBudgetConfig, QueryBudgetMiddleware
+from core.request_id import RequestIdMiddleware
+from startup import check_migrations, create_tables_for_dev
+from database.database import AsyncDatabaseSessionManager, DatabaseSessionManager
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routes.base import router as base_router
 from routes.auth import router as auth_router
 from routes.assistant import router as assistant_router
 from routes.conversation import router as conversation_router
+from routes.ws import router as ws_router
+from utils.active_turns import ActiveTurns
+from utils.circuit_breaker import CircuitBreaker
+from utils.context_cache import ContextCache
+from utils.history_cache import HistoryCache
+from utils.ollama import Ollama
+from utils.residency import ModelResidency
+from utils.response_cache import ResponseCache
+from utils.scheduler import Scheduler
 
 
-def lifespan(app: FastAPI) -> Any:
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> Any:
     Logger.info("main", "Starting up...")
-    create_tables_for_dev(app)
+    # Seeding hashes passwords, so keep it off the event loop
+    await run_in_threadpool(create_tables_for_dev, app)
+    await run_in_threadpool(check_migrations, app)
+    await Ollama.startup()
+    await ModelResidency.startup()
+    StartupProfiler.stop()
     yield
     Logger.info("main", "Shutting down...")
+    await ModelResidency.shutdown()
+    await Ollama.shutdown()
+    await AsyncDatabaseSessionManager.dispose()
+    DatabaseSessionManager.dispose()
+    shutdown_hash_executor()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(
+    lifespan=lifespan,
+    dependencies=[Depends(track_in_flight)] if MetricsConfig.enabled else [],
+)
+
+if QueryBudgetConfig.enabled:
+    app.add_middleware(QueryBudgetMiddleware)
 
 
 frontend_url = Secrets.get("FRONTEND_URL")
@@ -30,8 +72,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "Retry-After",
+        "X-Cache",
+        "X-Next-Cursor",
+        "X-Prev-Cursor",
+        "X-Profile",
+        "X-Profile-Status",
+        "X-Queue-Position",
+        "X-Queue-Wait-Ms",
+        "X-Request-ID",
+    ],
 )
 
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(RequestIdMiddleware)
+
+if ProfilerConfig.enabled:
+    app.add_middleware(ProfilerMiddleware)
+
+if MetricsConfig.enabled:
+    # Added last so it is outermost and its latency includes the other middleware
+    app.add_middleware(MetricsMiddleware)
+
 
 @app.get("/")
 async def read_root():
@@ -43,8 +106,75 @@ async def ping():
     return {"message": "pong"}
 
 
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "database": {
+            "sync": DatabaseSessionManager.pool_status(),
+            "async": AsyncDatabaseSessionManager.pool_status(),
+        },
+        "context_cache": ContextCache.stats(),
+        "history_cache": HistoryCache.stats(),
+        "ollama": Ollama.get_pool().stats(),
+        "scheduler": Scheduler.stats(),
+        "turns": ActiveTurns.stats(),
+        "models": ModelResidency.stats(),
+        "generate_cache": ResponseCache.stats(),
+        "principal_cache": PrincipalCache.stats(),
+    }
+
+
 app.include_router(base_router, tags=["Base"])
 app.include_router(auth_router, tags=["Auth"])
 app.include_router(assistant_router, tags=["Assistant"])
 app.include_router(conversation_router, tags=["Conversation"])
+app.include_router(ws_router, tags=["WebSocket"])
+
+
+def scrape_time_metrics():
+    """Pool and queue gauges, read from their owners when /metrics is scraped."""
+    pool = Gauge("db_pool_connections", "Pooled database connections by state", ["engine", "state"])
+    pool_size = Gauge("db_pool_size", "Configured pool size", ["engine"])
+    for engine, status in (
+        ("sync", DatabaseSessionManager.pool_status()),
+        ("async", AsyncDatabaseSessionManager.pool_status()),
+    ):
+        if "size" not in status:
+            continue
+        pool_size.set((engine,), status["size"])
+        for state in ("checked_in", "checked_out", "overflow"):
+            pool.set((engine, state), status[state])
+
+    active = Gauge("ollama_active_requests", "Ollama requests admitted by the scheduler", ["model"])
+    queued = Gauge("ollama_queued_requests", "Ollama requests waiting in the scheduler", ["model"])
+    for model, queue in Scheduler.stats().items():
+        active.set((model,), queue["active"])
+        queued.set((model,), queue["queued"])
+
+    loaded = Gauge("ollama_model_loaded", "1 if Ollama reported the model loaded at the last poll", ["model"])
+    for model in ModelResidency.loaded:
+        loaded.set((model,), 1)
+
+    up = Gauge("ollama_backend_up", "1 if the Ollama backend passed its last health check", ["backend"])
+    outstanding = Gauge("ollama_backend_outstanding_requests", "Requests in flight per Ollama backend", ["backend"])
+    for backend in Ollama.get_pool().backends:
+        up.set((backend.url,), int(backend.healthy))
+        outstanding.set((backend.url,), backend.outstanding)
+
+    circuit = Gauge(
+        "ollama_circuit_state", "Circuit breaker per backend and model: 0 closed, 1 half-open, 2 open", ["backend", "model"]
+    )
+    states = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+    for (url, model), breaker in Ollama.get_pool().breakers.items():
+        circuit.set((url, model), states[breaker.state])
+    return [pool, pool_size, active, queued, loaded, up, outstanding, circuit]
+
+
+Metrics.add_collector(scrape_time_metrics)
+
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(Metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,59 +1,72 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
 from pydantic import BaseModel
 from app_logging.app_logging import Logger
 from auth import get_current_active_user
-from database.database import DatabaseSessionManager
-from database.schema.schema import Assistant, User
+from database.database import AsyncDatabaseSessionManager
+from core.principal import Principal
+from core.query_budget import query_budget
+from database.schema.schema import Assistant
+from database.teardown import Teardown
+from utils.context_cache import ContextCache
+from utils.history_cache import HistoryCache
 
 
 router = APIRouter()
 
 
 @router.get("/assistants")
+@query_budget(2)
 async def get_assistants(
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
 ):
     """Get all assistants for the current user"""
-    with DatabaseSessionManager() as dsm:
-        assistants = dsm.utils.assistant.get_all(current_user)
+    async with AsyncDatabaseSessionManager() as dsm:
+        assistants = await dsm.utils.assistant.get_all(current_user)
         return assistants
 
 
 class CreateAssistantRequest(BaseModel):
     name: str
     model: str
+    context_tokens: int | None = None
 
 
 @router.post("/assistant")
+@query_budget(3)
 async def create_assistant(
     request: CreateAssistantRequest,
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
 ):
     """Create a new assistant"""
-    Logger.debug(
-        router, f"Create assistant request from user {current_user.name}: {request}"
-    )
-    with DatabaseSessionManager() as dsm:
+    Logger.debug(router, "Create assistant request from user %s: %s", current_user.name, request)
+    async with AsyncDatabaseSessionManager() as dsm:
         assistant = Assistant(
-            name=request.name, model=request.model, user_id=current_user.id
+            name=request.name,
+            model=request.model,
+            context_tokens=request.context_tokens,
+            user_id=current_user.id,
         )
-        assistant = dsm.utils.assistant.create(assistant)
+        assistant = await dsm.utils.assistant.create(assistant)
         return assistant
 
 
 @router.delete("/assistant/{assistant_id}")
+@query_budget(6)
 async def delete_assistant(
     assistant_id: int,
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    response: Response,
+    background_tasks: BackgroundTasks,
+    background: bool = False,
 ):
-    """Delete an assistant"""
-    Logger.debug(
-        router,
-        f"Delete assistant request from user {current_user.name}: {assistant_id}",
-    )
-    with DatabaseSessionManager() as dsm:
-        assistant = dsm.utils.assistant.get_by_id(assistant_id)
+    """Delete an assistant and every conversation with it.
+
+    With background=true, the conversations are deleted in chunks after responding.
+    """
+    Logger.debug(router, "Delete assistant request from user %s: %s", current_user.name, assistant_id)
+    async with AsyncDatabaseSessionManager() as dsm:
+        assistant = await dsm.utils.assistant.get_by_id(assistant_id)
         if not assistant:
             raise HTTPException(status_code=404, detail="Assistant not found")
 
@@ -62,27 +75,35 @@ async def delete_assistant(
                 status_code=403, detail="User does not have access to this assistant"
             )
 
-        dsm.utils.assistant.delete(assistant)
+        for conversation_id in await dsm.utils.conversation.get_ids_for_assistant(assistant_id):
+            ContextCache.invalidate(conversation_id)
+            HistoryCache.invalidate(conversation_id)
+        if background:
+            background_tasks.add_task(Teardown.assistant, assistant)
+            response.status_code = status.HTTP_202_ACCEPTED
+            return {"status": "accepted"}
+
+        await dsm.utils.assistant.delete(assistant)
         return {"status": "success"}
 
 
 class UpdateAssistantRequest(BaseModel):
     name: str
     model: str
+    context_tokens: int | None = None
 
 
 @router.put("/assistant/{assistant_id}")
+@query_budget(4)
 async def update_assistant(
     assistant_id: int,
     request: UpdateAssistantRequest,
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
 ):
     """Update an assistant"""
-    Logger.debug(
-        router, f"Update assistant request from user {current_user.name}: {request}"
-    )
-    with DatabaseSessionManager() as dsm:
-        assistant = dsm.utils.assistant.get_by_id(assistant_id)
+    Logger.debug(router, "Update assistant request from user %s: %s", current_user.name, request)
+    async with AsyncDatabaseSessionManager() as dsm:
+        assistant = await dsm.utils.assistant.get_by_id(assistant_id)
         if not assistant:
             raise HTTPException(status_code=404, detail="Assistant not found")
 
@@ -93,6 +114,7 @@ async def update_assistant(
 
         assistant.name = request.name
         assistant.model = request.model
-        dsm.session.commit()
-        dsm.session.refresh(assistant)
+        assistant.context_tokens = request.context_tokens
+        await dsm.session.commit()
+        await dsm.session.refresh(assistant)
         return assistant.model_dump()
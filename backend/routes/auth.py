@@ -4,6 +4,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from auth import Token, get_current_active_user, authenticate_user, create_access_token
 from config.secrets import Secrets
+from core.principal import Principal
+from core.query_budget import query_budget
+from database.database import AsyncDatabaseSessionManager
 from database.schema.schema import User
 
 ACCESS_TOKEN_EXPIRE_MINUTES = int(Secrets.get("ACCESS_TOKEN_EXPIRE_MINUTES"))
@@ -15,10 +18,11 @@ router = APIRouter(
 
 
 @router.post("/token")
+@query_budget(2)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Token:
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -33,14 +37,19 @@ async def login_for_access_token(
 
 
 @router.get("/users/me/", response_model=User)
+@query_budget(2)
 async def read_users_me(
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
 ):
-    return current_user.model_dump(exclude={"hashed_password"})
+    async with AsyncDatabaseSessionManager() as dsm:
+        user = await dsm.utils.user.get(current_user.name)
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        return user.model_dump(exclude={"hashed_password"})
 
 
 @router.get("/users/me/items/")
 async def read_own_items(
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
 ):
     return [{"item_id": "Foo", "owner": current_user.name}]
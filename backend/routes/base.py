@@ -1,11 +1,26 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Annotated, Any, AsyncIterator, Dict, List
+import anyio
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from app_logging.app_logging import Logger
 from auth import get_current_active_user
-from database.database import DatabaseSessionManager
-from database.schema.schema import User, Message as ChatMessage
+from core.disconnect import Disconnect
+from core.exception import APIException
+from core.response import ResponseFactory
+from database.database import AsyncDatabaseSessionManager
+from core.principal import Principal
+from core.query_budget import query_budget
+from database.schema.schema import Conversation, Message as ChatMessage
+from utils.active_turns import ActiveTurns
+from utils.context import ContextBuilder
+from utils.context_cache import ContextCache
+from utils.history_cache import HistoryCache
 from utils.ollama import Ollama, OllamaMessage
+from utils.response_cache import ResponseCache
+from utils.scheduler import Scheduler, Ticket
 
 
 router = APIRouter()
@@ -14,16 +29,69 @@ router = APIRouter()
 class GenerateRequest(BaseModel):
     model: str
     message: str
+    options: Dict[str, Any] | None = None  # Ollama generation options, e.g. temperature, seed
 
 
 @router.post("/generate")
+@query_budget(1)
 async def generate(
     request: GenerateRequest,
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    response: Response,
+    http_request: Request,
 ):
-    Logger.debug(router, f"Generate request from user {current_user.name}: {request}")
-    response = Ollama.generate(request.model, request.message)
-    return {"response": response, "status": "success"}
+    """Generate a reply. If the client disconnects first, the Ollama request is cancelled."""
+    Logger.debug(router, "Generate request from user %s: %s", current_user.name, request)
+    ticket: Ticket | None = None
+
+    async def produce() -> str:
+        nonlocal ticket
+        async with Scheduler.enqueue(request.model, current_user.id) as ticket:
+            return await Ollama.generate(request.model, request.message, request.options)
+
+    text, cache_status = await Disconnect.guard(
+        http_request,
+        ResponseCache.get_or_generate(request.model, request.message, request.options, produce),
+    )
+    response.headers["X-Cache"] = cache_status
+    if ticket is not None:
+        response.headers.update(ticket.headers())
+    return {"response": text, "status": "success"}
+
+
+@router.post("/generate/stream")
+@query_budget(1)
+async def generate_stream(
+    request: GenerateRequest,
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    accept: Annotated[str | None, Header()] = None,
+):
+    """Stream generated tokens as NDJSON, or as SSE when the client accepts text/event-stream"""
+    Logger.debug(router, "Generate stream request from user %s: %s", current_user.name, request)
+    ticket = Scheduler.enqueue(request.model, current_user.id)
+
+    async def chunks() -> AsyncIterator[Dict[str, Any]]:
+        async with ticket:
+            if ticket.position:
+                yield {"queue": ticket.info()}
+            async for chunk in Ollama.generate_stream(
+                request.model, request.message, request.options
+            ):
+                yield chunk
+
+    return stream_with_ticket(chunks(), ticket, accept)
+
+
+def stream_with_ticket(
+    chunks: AsyncIterator[Dict[str, Any]], ticket: Ticket, accept: str | None
+) -> Response:
+    """Stream chunks, making sure the scheduler slot is freed even if the body never starts."""
+    return ResponseFactory.stream(
+        chunks,
+        sse=ResponseFactory.wants_sse(accept),
+        headers=ticket.headers(),
+        background=BackgroundTask(ticket.release),
+    )
 
 
 class ChatRequest(BaseModel):
@@ -32,46 +100,178 @@ class ChatRequest(BaseModel):
     conversation_id: int
 
 
+async def get_owned_conversation(
+    dsm: AsyncDatabaseSessionManager, conversation_id: int, user: Principal
+) -> Conversation:
+    """Load a conversation and its assistant, checking that it belongs to the user."""
+    conversation = await dsm.utils.conversation.get_with_assistant(conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    if conversation.user_id != user.id:
+        raise HTTPException(
+            status_code=403, detail="User does not have access to this conversation"
+        )
+    return conversation
+
+
+@dataclass
+class ChatTurn:
+    # Not saved until the reply is done
+    user_message: ChatMessage
+    # What is sent to Ollama: the history that fits the context budget, then the user message
+    messages: List[OllamaMessage]
+    # conversation.updated_at when the history was read
+    history_version: datetime
+
+
+async def prepare_chat_turn(
+    dsm: AsyncDatabaseSessionManager, request: ChatRequest, user: Principal
+) -> ChatTurn:
+    """Check access and build the prompt for a turn."""
+    conversation = await get_owned_conversation(dsm, request.conversation_id, user)
+    window = await ContextBuilder.build(dsm, conversation, request.model, request.message)
+    user_message = ChatMessage(
+        role="user",
+        content=request.message,
+        conversation_id=conversation.id,
+        token_count=ContextBuilder.count_tokens(request.message),
+    )
+    return ChatTurn(user_message, window.messages, conversation.updated_at)
+
+
 @router.post("/chat")
+@query_budget(8)
 async def chat(
     request: ChatRequest,
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    response: Response,
+    http_request: Request,
 ):
-    Logger.debug(router, f"Chat request from user {current_user.name}: {request}")
-    with DatabaseSessionManager() as dsm:
-        conversation = dsm.utils.conversation.get_by_id(request.conversation_id)
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-
-        if conversation.user_id != current_user.id:
-            raise HTTPException(
-                status_code=403, detail="User does not have access to this conversation"
-            )
+    """Reply to a message.
 
-        conversation.messages.append(
-            ChatMessage(
-                role="user", content=request.message, conversation_id=conversation.id
-            )
-        )
+    The reply is streamed from Ollama, so if the turn is cancelled or the
+    client disconnects, generation stops and the partial reply is saved as
+    truncated.
+    """
+    Logger.debug(router, "Chat request from user %s: %s", current_user.name, request)
+    async with AsyncDatabaseSessionManager() as dsm:
+        turn = await prepare_chat_turn(dsm, request, current_user)
+    ticket = Scheduler.enqueue(request.model, current_user.id)
 
-        # Convert conversation messages to Ollama format
-        messages = [
-            OllamaMessage(
-                role="assistant" if msg.role == "assistant" else "user",
-                content=msg.content,
-            )
-            for msg in conversation.messages
-        ]
+    async def chunks() -> AsyncIterator[Dict[str, Any]]:
+        async with ticket:
+            async for chunk in ContextCache.chat_stream(
+                request.conversation_id, request.model, turn.messages
+            ):
+                yield chunk
+
+    parts: List[str] = []
+    done = False
+    try:
+        async for chunk in ActiveTurns.relay(request.conversation_id, chunks(), http_request):
+            if "error" in chunk:
+                raise APIException(
+                    status_code=APIException.HTTP_502_BAD_GATEWAY, detail=f"Ollama: {chunk['error']}"
+                )
+            parts.append(chunk.get("message", {}).get("content", ""))
+            done = bool(chunk.get("done"))
+    finally:
+        # The slot is never taken if the turn is cancelled before it starts
+        ticket.release()
+    text = "".join(parts)
+    await save_chat_turn(turn, text, truncated=not done)
+
+    response.headers.update(ticket.headers())
+    return {"response": text, "truncated": not done, "status": "success"}
+
+
+@router.post("/chat/stream")
+@query_budget(8)
+async def chat_stream(
+    request: ChatRequest,
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    accept: Annotated[str | None, Header()] = None,
+):
+    """Stream the assistant reply as it is generated.
 
-        messages.append(OllamaMessage(role="user", content=request.message))
-        response = Ollama.chat(request.model, messages)
+    The user and assistant messages are written in one commit once the stream
+    ends. If the stream is interrupted, the partial reply is kept and marked
+    as truncated. A turn stopped with POST /chat/{id}/cancel ends with a
+    `{"done": true, "truncated": true}` chunk.
+    """
+    Logger.debug(router, "Chat stream request from user %s: %s", current_user.name, request)
+    async with AsyncDatabaseSessionManager() as dsm:
+        turn = await prepare_chat_turn(dsm, request, current_user)
+    ticket = Scheduler.enqueue(request.model, current_user.id)
 
-        # Add response to conversation
-        conversation.messages.append(
+    async def chunks() -> AsyncIterator[Dict[str, Any]]:
+        async with ticket:
+            if ticket.position:
+                yield {"queue": ticket.info()}
+            async for chunk in ContextCache.chat_stream(
+                request.conversation_id, request.model, turn.messages
+            ):
+                yield chunk
+
+    async def reply() -> AsyncIterator[Dict[str, Any]]:
+        parts: List[str] = []
+        done = False
+        try:
+            async for chunk in ActiveTurns.relay(request.conversation_id, chunks()):
+                parts.append(chunk.get("message", {}).get("content", ""))
+                done = bool(chunk.get("done"))
+                yield chunk
+            if not done:
+                yield {"message": {"role": "assistant", "content": ""}, "done": True, "truncated": True}
+        finally:
+            # Shielded so the write still happens when the client disconnects
+            with anyio.CancelScope(shield=True):
+                await save_chat_turn(turn, "".join(parts), truncated=not done)
+
+    return stream_with_ticket(reply(), ticket, accept)
+
+
+@router.post("/chat/{conversation_id}/cancel")
+@query_budget(2)
+async def cancel_chat(
+    conversation_id: int,
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+):
+    """Stop the reply being generated for a conversation, over HTTP or the websocket.
+    What was generated so far is saved as truncated."""
+    Logger.debug(router, "Cancel request from user %s for conversation %s", current_user.name, conversation_id)
+    async with AsyncDatabaseSessionManager() as dsm:
+        await get_owned_conversation(dsm, conversation_id, current_user)
+    return {"cancelled": ActiveTurns.cancel(conversation_id), "status": "success"}
+
+
+async def save_chat_turn(turn: ChatTurn, response: str, truncated: bool = False) -> None:
+    """Persist a user message and the assistant reply in a single commit, then write them through
+    to the history cache.
+
+    The reply is skipped when nothing was generated, e.g. if Ollama failed before the first token.
+    `truncated` marks a reply that was cut short.
+    """
+    user_message = turn.user_message
+    saved = [user_message]
+    if response:
+        saved.append(
             ChatMessage(
-                role="assistant", content=response, conversation_id=conversation.id
+                role="assistant",
+                content=response,
+                conversation_id=user_message.conversation_id,
+                token_count=ContextBuilder.count_tokens(response),
+                truncated=truncated,
             )
         )
-        dsm.session.commit()
-
-        return {"response": response, "status": "success"}
\ No newline at end of file
+    async with AsyncDatabaseSessionManager() as dsm:
+        dsm.session.add_all(saved)
+        updated_at = await dsm.utils.conversation.touch(user_message.conversation_id)
+        await dsm.session.commit()
+    HistoryCache.append(
+        user_message.conversation_id,
+        turn.history_version,
+        [ContextBuilder.history_item(message) for message in saved],
+        updated_at,
+    )
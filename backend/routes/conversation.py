@@ -1,76 +1,161 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Response, status
 from pydantic import BaseModel
 from app_logging.app_logging import Logger
 from auth import get_current_active_user
-from core.exception import APIException
-from database.database import DatabaseSessionManager
-from database.schema.schema import Conversation, User
+from core.pagination import MAX_PAGE_SIZE, Keyset
+from database.database import AsyncDatabaseSessionManager
+from core.principal import Principal
+from core.query_budget import query_budget
+from database.schema.schema import Conversation, Message as ChatMessage
+from database.teardown import Teardown
+from routes.base import get_owned_conversation
+from utils.context_cache import ContextCache
+from utils.history_cache import HistoryCache
+from utils.residency import ModelResidency
 
 
 router = APIRouter()
 
+# Without limit/before/after the full list is returned, as before pagination existed
+PageLimit = Annotated[int | None, Query(ge=1, le=MAX_PAGE_SIZE)]
+
 
 @router.get("/conversations")
+@query_budget(2)
 async def conversations(
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    response: Response,
+    limit: PageLimit = None,
+    before: str | None = None,
+    after: str | None = None,
 ):
-    with DatabaseSessionManager() as dsm:
-        conversations = dsm.utils.conversation.get_all(current_user)
-        return conversations
+    """List conversations, most recently updated first.
+
+    Cursors for the neighbouring pages are returned in X-Next-Cursor (older,
+    pass as `before`) and X-Prev-Cursor (newer, pass as `after`).
+    """
+    keyset = Keyset(Conversation.updated_at, Conversation.id, limit, before, after)
+    async with AsyncDatabaseSessionManager() as dsm:
+        page = await dsm.utils.conversation.get_page(current_user, keyset)
+        response.headers.update(page.headers())
+        return page.items
+
+
+def _message_dump(message: ChatMessage):
+    return message.model_dump(exclude={"conversation_id"})
 
 
 @router.get("/conversation/{conversation_id}")
+@query_budget(3)
 async def get_conversation(
     conversation_id: int,
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    response: Response,
+    limit: PageLimit = None,
+    before: str | None = None,
+    after: str | None = None,
 ):
-    with DatabaseSessionManager() as dsm:
-        conversation = dsm.utils.conversation.get_by_id(conversation_id)
-        if not conversation:
-            raise APIException(
-                status_code=APIException.HTTP_404_NOT_FOUND,
-                detail="Conversation not found",
-            )
+    """Get a conversation with its messages. limit/before/after page the messages."""
+    keyset = Keyset(ChatMessage.created_at, ChatMessage.id, limit, before, after)
+    async with AsyncDatabaseSessionManager() as dsm:
+        conversation = await get_owned_conversation(dsm, conversation_id, current_user)
+        # The user is likely to send a message next, so have the model ready
+        ModelResidency.preload(conversation.assistant.model)
+        page = await dsm.utils.message.get_page(conversation_id, keyset)
+        response.headers.update(page.headers())
 
         return {
             **conversation.model_dump(exclude={"user_id", "assistant_id"}),
-            "messages": [
-                message.model_dump(exclude={"conversation_id"})
-                for message in conversation.messages
-            ],
+            "messages": [_message_dump(message) for message in page.items],
             "assistant": conversation.assistant.model_dump(),
         }
 
 
+@router.get("/search")
+@query_budget(1)
+async def search(
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    response: Response,
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = 20,
+    before: str | None = None,
+):
+    """Search the user's messages, best match first.
+
+    Each hit has the message and conversation ids, the conversation title
+    and a snippet with the matched words highlighted. The cursor for the
+    next page is returned in X-Next-Cursor (pass as `before`).
+    """
+    q = q.strip()
+    if not q:
+        # Nothing to match, and an empty FTS5 MATCH is a syntax error
+        return []
+    async with AsyncDatabaseSessionManager() as dsm:
+        page = await dsm.utils.message.search(current_user.id, q, limit, before)
+        response.headers.update(page.headers())
+        return page.items
+
+
+@router.get("/conversation/{conversation_id}/messages")
+@query_budget(3)
+async def get_messages(
+    conversation_id: int,
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    response: Response,
+    limit: PageLimit = None,
+    before: str | None = None,
+    after: str | None = None,
+):
+    """Page through a conversation's messages in chronological order, newest page first."""
+    keyset = Keyset(ChatMessage.created_at, ChatMessage.id, limit, before, after)
+    async with AsyncDatabaseSessionManager() as dsm:
+        await get_owned_conversation(dsm, conversation_id, current_user)
+        page = await dsm.utils.message.get_page(conversation_id, keyset)
+        response.headers.update(page.headers())
+        return [_message_dump(message) for message in page.items]
+
+
 class CreateConversationRequest(BaseModel):
     title: str
     assistant_id: int
 
 
 @router.post("/conversation")
+@query_budget(3)
 async def create_conversation(
     request: CreateConversationRequest,
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
 ):
-    Logger.debug(
-        router, f"Create conversation request from user {current_user.name}: {request}"
-    )
-    with DatabaseSessionManager() as dsm:
+    Logger.debug(router, "Create conversation request from user %s: %s", current_user.name, request)
+    async with AsyncDatabaseSessionManager() as dsm:
         conversation = Conversation(
             title=request.title,
             user_id=current_user.id,
             assistant_id=request.assistant_id,
         )
-        conversation = dsm.utils.conversation.create(conversation)
+        conversation = await dsm.utils.conversation.create(conversation)
         return conversation
 
 
 @router.delete("/conversation/{conversation_id}")
+@query_budget(4)
 async def delete_conversation(
     conversation_id: int,
-    current_user: Annotated[User, Depends(get_current_active_user)],
+    current_user: Annotated[Principal, Depends(get_current_active_user)],
+    response: Response,
+    background_tasks: BackgroundTasks,
+    background: bool = False,
 ):
-    with DatabaseSessionManager() as dsm:
-        dsm.utils.conversation.delete_by_id(conversation_id)
+    """Delete a conversation. With background=true, a long history is deleted in chunks after responding."""
+    async with AsyncDatabaseSessionManager() as dsm:
+        await get_owned_conversation(dsm, conversation_id, current_user)
+        ContextCache.invalidate(conversation_id)
+        HistoryCache.invalidate(conversation_id)
+        if background:
+            background_tasks.add_task(Teardown.conversations, [conversation_id])
+            response.status_code = status.HTTP_202_ACCEPTED
+            return {"status": "accepted"}
+
+        await dsm.utils.conversation.delete_by_id(conversation_id)
         return {"status": "success"}
\ No newline at end of file
@@ -0,0 +1,229 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List
+import anyio
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from app_logging.app_logging import Logger
+from auth import get_user_from_token
+from config.secrets import Secrets
+from database.database import AsyncDatabaseSessionManager
+from core.deadline import Config as DeadlineConfig, Deadline
+from core.exception import APIException
+from core.principal import Principal
+from routes.base import ChatRequest, prepare_chat_turn, save_chat_turn
+from utils.active_turns import ActiveTurns
+from utils.context_cache import ContextCache
+from utils.scheduler import Scheduler
+
+
+@dataclass
+class Config:
+    # Frames buffered per socket before chat turns stop reading from Ollama
+    send_queue_size: int = int(Secrets.get("WS_SEND_QUEUE_SIZE", "64"))
+
+
+router = APIRouter()
+
+# Sent for unexpected errors, whose text stays in the log
+FAILED_DETAIL = "The reply could not be generated"
+
+
+@router.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, token: str = ""):
+    """Chat over one authenticated socket for any number of conversations.
+
+    Client frames:
+        {"type": "chat", "conversation_id": 1, "model": "...", "message": "..."}
+        {"type": "cancel", "conversation_id": 1}
+
+    Server frames are tagged with the conversation id:
+        {"type": "delta", "conversation_id": 1, "content": "..."}
+        {"type": "queue", "conversation_id": 1, "position": 3, "wait_ms": 1200}
+        {"type": "done", "conversation_id": 1, "response": "...", ...}
+        {"type": "cancelled", "conversation_id": 1, "response": "..."}
+        {"type": "error", "conversation_id": 1, "detail": "..."}
+
+    A cancelled reply is saved as far as it got, marked as truncated. A reply
+    that fails, e.g. on an error from Ollama, is not saved.
+    """
+    try:
+        user = await get_user_from_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if user.disabled:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    await ChatSocket(websocket, user).run()
+
+
+class ChatSocket:
+    """One client connection. Each conversation runs its turn in its own task."""
+
+    def __init__(self, websocket: WebSocket, user: Principal):
+        self.websocket = websocket
+        self.user = user
+        # Bounded, so a slow reader makes turns wait instead of buffering without limit
+        self.outbox: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(
+            maxsize=Config.send_queue_size
+        )
+        self.turns: Dict[int, asyncio.Task[None]] = {}
+
+    async def run(self) -> None:
+        Logger.debug(ChatSocket, "Socket opened by user %s", self.user.name)
+        sender = asyncio.create_task(self._send_loop())
+        try:
+            while True:
+                await self._handle(await self.websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in self.turns.values():
+                task.cancel()
+            sender.cancel()
+            # Shielded, so partial replies are still saved if the handler itself is cancelled
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(sender, *self.turns.values(), return_exceptions=True)
+            Logger.debug(ChatSocket, "Socket closed by user %s", self.user.name)
+
+    async def send(self, frame: Dict[str, Any]) -> None:
+        await self.outbox.put(frame)
+
+    async def _send_loop(self) -> None:
+        while True:
+            frame = await self.outbox.get()
+            await self.websocket.send_json(frame)
+
+    async def _handle(self, text: str) -> None:
+        try:
+            data = json.loads(text)
+            kind = data.get("type")
+        except (json.JSONDecodeError, AttributeError):
+            await self.send({"type": "error", "detail": "Invalid frame"})
+            return
+
+        if kind == "cancel":
+            task = self.turns.get(data.get("conversation_id"))  # type: ignore
+            if task:
+                task.cancel()
+            return
+
+        if kind != "chat":
+            await self.send({"type": "error", "detail": f"Unknown frame type: {kind}"})
+            return
+
+        try:
+            request = ChatRequest.model_validate(data)
+        except ValidationError as e:
+            await self.send({"type": "error", "detail": e.errors(include_url=False)})
+            return
+
+        if request.conversation_id in self.turns:
+            await self.send(
+                {
+                    "type": "error",
+                    "conversation_id": request.conversation_id,
+                    "detail": "A reply is already being generated for this conversation",
+                }
+            )
+            return
+
+        task = asyncio.create_task(self._turn(request))
+        self.turns[request.conversation_id] = task
+        # So POST /chat/{id}/cancel stops it too
+        ActiveTurns.track(request.conversation_id, task)
+
+    async def _turn(self, request: ChatRequest) -> None:
+        conversation_id = request.conversation_id
+        Deadline.set(DeadlineConfig.default_seconds)
+        try:
+            async with AsyncDatabaseSessionManager() as dsm:
+                turn = await prepare_chat_turn(dsm, request, self.user)
+        except HTTPException as e:
+            self.turns.pop(conversation_id, None)
+            await self.send(
+                {"type": "error", "conversation_id": conversation_id, "detail": e.detail}
+            )
+            return
+        except Exception as e:
+            self.turns.pop(conversation_id, None)
+            Logger.error(
+                ChatSocket, "Chat turn failed for conversation %s: %r", conversation_id, e, exc_info=e
+            )
+            await self.send(
+                {"type": "error", "conversation_id": conversation_id, "detail": FAILED_DETAIL}
+            )
+            return
+        except asyncio.CancelledError:
+            self.turns.pop(conversation_id, None)
+            raise
+
+        parts: List[str] = []
+        done = False
+        # A failed reply is not kept, unlike a cancelled one
+        failed = False
+        try:
+            async with Scheduler.enqueue(request.model, self.user.id) as ticket:
+                if ticket.position:
+                    await self.send(
+                        {"type": "queue", "conversation_id": conversation_id, **ticket.info()}
+                    )
+                async for chunk in ContextCache.chat_stream(
+                    conversation_id, request.model, turn.messages
+                ):
+                    if "error" in chunk:
+                        raise APIException(
+                            status_code=APIException.HTTP_502_BAD_GATEWAY, detail=f"Ollama: {chunk['error']}"
+                        )
+                    content = chunk.get("message", {}).get("content", "")
+                    parts.append(content)
+                    done = bool(chunk.get("done"))
+                    if done:
+                        await self.send(
+                            {
+                                "type": "done",
+                                "conversation_id": conversation_id,
+                                "response": "".join(parts),
+                                "prompt_eval_count": chunk.get("prompt_eval_count"),
+                                "eval_count": chunk.get("eval_count"),
+                            }
+                        )
+                    elif content:
+                        await self.send(
+                            {"type": "delta", "conversation_id": conversation_id, "content": content}
+                        )
+        except HTTPException as e:
+            failed = True
+            await self.send(
+                {
+                    "type": "error",
+                    "conversation_id": conversation_id,
+                    "detail": e.detail,
+                    "retry_after": (e.headers or {}).get("Retry-After"),
+                }
+            )
+        except Exception as e:
+            failed = True
+            Logger.error(
+                ChatSocket, "Chat turn failed for conversation %s: %r", conversation_id, e, exc_info=e
+            )
+            await self.send(
+                {"type": "error", "conversation_id": conversation_id, "detail": FAILED_DETAIL}
+            )
+        except asyncio.CancelledError:
+            # Not awaited: if the socket is closing, nobody is reading the outbox
+            try:
+                self.outbox.put_nowait(
+                    {"type": "cancelled", "conversation_id": conversation_id, "response": "".join(parts)}
+                )
+            except asyncio.QueueFull:
+                pass
+            raise
+        finally:
+            self.turns.pop(conversation_id, None)
+            reply = "" if failed else "".join(parts)
+            await asyncio.shield(save_chat_turn(turn, reply, truncated=not done))
@@ -2,11 +2,20 @@ from fastapi import FastAPI
 from config.environment import Environment
 from app_logging.app_logging import Logger
 from database.database import DatabaseSessionManager
+from database.migrate import Migrations
 from database.schema.schema import Assistant, Message as ChatMessage, Conversation, User
 from auth import get_password_hash
+from sqlalchemy import text
 from sqlmodel import SQLModel
 
 
+def check_migrations(app: FastAPI):
+    """Outside dev mode the schema is never recreated, only migrated."""
+    if Environment.is_development():
+        return
+    Migrations.check()
+
+
 def create_tables_for_dev(app: FastAPI):
     if not Environment.is_development():
         return
@@ -15,8 +24,13 @@ def create_tables_for_dev(app: FastAPI):
     with DatabaseSessionManager() as dsm:
         # Drop all tables first to ensure clean state
         SQLModel.metadata.drop_all(dsm.engine)
-        # Create all tables fresh
-        SQLModel.metadata.create_all(dsm.engine)
+        with dsm.engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+            # Not in the models: the SQLite full-text index from migration 0005
+            if dsm.engine.dialect.name == "sqlite":
+                connection.execute(text("DROP TABLE IF EXISTS message_fts"))
+        # Build the schema through the migrations, so they are exercised on every dev start
+        Migrations.upgrade()
 
         # create user
         user = User(
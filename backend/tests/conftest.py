@@ -0,0 +1,50 @@
+import os
+import tempfile
+from typing import Dict, Iterator
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.fake_ollama import FakeOllama, FakeOllamaConfig
+from benchmarks.harness import free_port
+
+# Set before any test module imports the app, as its config is read at import time.
+# Development mode resets and seeds the throwaway database on startup, and query
+# budgets are strict, so a route that goes over its budget raises
+# QueryBudgetExceeded out of the request.
+OLLAMA_PORT = free_port()
+_directory = tempfile.mkdtemp()
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_directory}/test.db",
+    OLLAMA_URL=f"http://127.0.0.1:{OLLAMA_PORT}",
+    OLLAMA_RESIDENCY_ENABLED="false",
+    ENVIRONMENT="development",
+    DATABASE_QUERY_BUDGET="true",
+    DATABASE_QUERY_BUDGET_STRICT="true",
+    LOG_FILE=f"{_directory}/app.log",
+    LOG_LEVEL="WARNING",
+)
+os.environ.setdefault("SECRET_KEY", "test-secret-key-test-secret-key-test")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("FRONTEND_URL", "http://127.0.0.1")
+
+
+@pytest.fixture(scope="session")
+def client() -> Iterator[TestClient]:
+    """The app on a throwaway SQLite database and a fake Ollama."""
+    from main import app
+
+    ollama = FakeOllama(FakeOllamaConfig(ttft_ms=0, tokens_per_second=1000, response_tokens=8))
+    ollama.start(OLLAMA_PORT)
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        ollama.stop()
+
+
+@pytest.fixture(scope="session")
+def auth(client: TestClient) -> Dict[str, str]:
+    """Headers for the seeded dev user."""
+    response = client.post("/auth/token", data={"username": "user", "password": "password"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
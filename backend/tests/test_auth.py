@@ -0,0 +1,53 @@
+from typing import Dict
+from fastapi.testclient import TestClient
+from auth import get_password_hash
+from database.database import AsyncDatabaseSessionManager
+from database.schema.schema import User
+
+
+def login(client: TestClient, name: str, password: str) -> Dict[str, str]:
+    response = client.post("/auth/token", data={"username": name, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def create_user(name: str, password: str) -> None:
+    async with AsyncDatabaseSessionManager() as dsm:
+        await dsm.utils.user.create(
+            User(name=name, email=f"{name}@example.com", hashed_password=get_password_hash(password))
+        )
+
+
+async def set_disabled(name: str, disabled: bool) -> None:
+    async with AsyncDatabaseSessionManager() as dsm:
+        user = await dsm.utils.user.get(name)
+        assert user is not None
+        await dsm.utils.user.set_disabled(user, disabled)
+
+
+async def delete_user(name: str) -> None:
+    async with AsyncDatabaseSessionManager() as dsm:
+        user = await dsm.utils.user.get(name)
+        assert user is not None
+        await dsm.utils.user.delete(user)
+
+
+def test_disabling_a_user_drops_its_cached_principal(client: TestClient):
+    client.portal.call(create_user, "disabled", "secret")  # type: ignore
+    headers = login(client, "disabled", "secret")
+    # Caches the principal
+    assert client.get("/auth/users/me/", headers=headers).status_code == 200
+
+    client.portal.call(set_disabled, "disabled", True)  # type: ignore
+    assert client.get("/auth/users/me/", headers=headers).json() == {"detail": "Inactive user"}
+    client.portal.call(set_disabled, "disabled", False)  # type: ignore
+    assert client.get("/auth/users/me/", headers=headers).status_code == 200
+
+
+def test_deleting_a_user_drops_its_cached_principal(client: TestClient):
+    client.portal.call(create_user, "deleted", "secret")  # type: ignore
+    headers = login(client, "deleted", "secret")
+    assert client.get("/auth/users/me/", headers=headers).status_code == 200
+
+    client.portal.call(delete_user, "deleted")  # type: ignore
+    assert client.get("/auth/users/me/", headers=headers).status_code == 401
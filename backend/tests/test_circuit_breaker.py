@@ -0,0 +1,59 @@
+import pytest
+from utils import circuit_breaker
+from utils.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture
+def breaker(monkeypatch: pytest.MonkeyPatch) -> CircuitBreaker:
+    monkeypatch.setattr(circuit_breaker.Config, "failure_threshold", 3)
+    monkeypatch.setattr(circuit_breaker.Config, "reset_seconds", 30)
+    return CircuitBreaker()
+
+
+def wait_out(breaker: CircuitBreaker) -> None:
+    """Move the breaker's clock past reset_seconds."""
+    breaker.opened_at -= 30
+    breaker.probe_started_at -= 30
+
+
+def test_opens_after_consecutive_failures(breaker: CircuitBreaker):
+    breaker.failure()
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    assert 29 < breaker.retry_after() <= 30
+
+
+def test_half_open_lets_one_probe_through(breaker: CircuitBreaker):
+    for _ in range(3):
+        breaker.failure()
+    wait_out(breaker)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_failed_probe_opens_again(breaker: CircuitBreaker):
+    for _ in range(3):
+        breaker.failure()
+    wait_out(breaker)
+    assert breaker.allow()
+    # One failure is enough in half-open
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    assert breaker.opened == 2
+
+
+def test_lost_probe_is_replaced(breaker: CircuitBreaker):
+    for _ in range(3):
+        breaker.failure()
+    wait_out(breaker)
+    assert breaker.allow()
+    wait_out(breaker)
+    assert breaker.allow()
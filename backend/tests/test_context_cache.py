@@ -0,0 +1,32 @@
+from utils.context_cache import ContextCache
+from utils.ollama import OllamaMessage
+
+SYSTEM = OllamaMessage(role="system", content="Be brief.")
+
+
+def test_first_turn_is_templated_like_chat():
+    turn = [SYSTEM, OllamaMessage(role="user", content="Hi")]
+    assert ContextCache._prepare(101, "model", turn) == ("Hi", "Be brief.", None)
+
+
+def test_cached_context_sends_only_the_new_message():
+    history = [SYSTEM, OllamaMessage(role="user", content="Hi")]
+    ContextCache._store(102, "model", history, "Hello!", [1, 2, 3])
+    turn = [
+        *history,
+        OllamaMessage(role="assistant", content="Hello!"),
+        OllamaMessage(role="user", content="Bye"),
+    ]
+    assert ContextCache._prepare(102, "model", turn) == ("Bye", None, [1, 2, 3])
+
+
+def test_replay_flattens_earlier_turns():
+    turn = [
+        SYSTEM,
+        OllamaMessage(role="user", content="Hi"),
+        OllamaMessage(role="assistant", content="Hello!"),
+        OllamaMessage(role="user", content="Bye"),
+    ]
+    prompt, system, context = ContextCache._prepare(103, "model", turn)
+    assert prompt == "user: Hi\n\nassistant: Hello!\n\nBye"
+    assert (system, context) == ("Be brief.", None)
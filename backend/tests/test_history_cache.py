@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import pytest
+from utils import history_cache
+from utils.history_cache import ITEM_OVERHEAD_BYTES, HistoryCache, HistoryItem
+
+V1 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+V2 = V1 + timedelta(seconds=1)
+V3 = V1 + timedelta(seconds=2)
+
+
+def item(id: int, content: str = "x" * 36) -> HistoryItem:
+    return HistoryItem(id, "user", content, 1)
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(history_cache.Config, "enabled", True)
+    monkeypatch.setattr(HistoryCache, "_entries", OrderedDict())
+    monkeypatch.setattr(HistoryCache, "_bytes", 0)
+
+
+def test_entry_is_only_used_at_its_version():
+    HistoryCache.put(1, V1, [item(1)], complete=True)
+    history = HistoryCache.get(1, V1)
+    assert history is not None and history.items == [item(1)]
+    # Another worker saved a turn: the conversation's updated_at moved on
+    assert HistoryCache.get(1, V2) is None
+
+
+def test_append_writes_through_at_the_new_version():
+    HistoryCache.put(1, V1, [item(1)], complete=True)
+    HistoryCache.append(1, V1, [item(2), item(3)], V2)
+    assert HistoryCache.get(1, V1) is None
+    history = HistoryCache.get(1, V2)
+    assert history is not None
+    assert [entry.id for entry in history.items] == [1, 2, 3] and history.complete
+
+
+def test_append_from_a_stale_version_drops_the_entry():
+    HistoryCache.put(1, V1, [item(1)], complete=True)
+    HistoryCache.append(1, V1, [item(2)], V2)
+    # A turn built from V1 finishes after the one above
+    HistoryCache.append(1, V1, [item(3)], V3)
+    assert HistoryCache.get(1, V2) is None and HistoryCache.get(1, V3) is None
+    assert HistoryCache._bytes == 0
+
+
+def test_append_without_an_entry_stores_nothing():
+    HistoryCache.append(1, V1, [item(1)], V2)
+    assert HistoryCache.get(1, V2) is None
+
+
+def test_eviction_is_by_bytes_least_recently_used(monkeypatch: pytest.MonkeyPatch):
+    size = item(1).size
+    assert size == 36 + ITEM_OVERHEAD_BYTES
+    monkeypatch.setattr(history_cache.Config, "max_bytes", 2 * size)
+    HistoryCache.put(1, V1, [item(1)], complete=True)
+    HistoryCache.put(2, V1, [item(2)], complete=True)
+    assert HistoryCache.get(1, V1) is not None  # 1 is now the most recently used
+    HistoryCache.put(3, V1, [item(3)], complete=True)
+    assert list(HistoryCache._entries) == [1, 3]
+    # Growing an entry past the budget evicts the others first
+    HistoryCache.append(3, V1, [item(4)], V2)
+    assert list(HistoryCache._entries) == [3] and HistoryCache._bytes == 2 * size
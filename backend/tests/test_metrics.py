@@ -0,0 +1,41 @@
+from typing import Any, AsyncIterator, Dict
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import routes.base
+from core.metrics import HTTP_IN_FLIGHT
+from utils.ollama import Ollama
+
+
+def test_in_flight_is_labelled_by_route(
+    client: TestClient, auth: Dict[str, str], monkeypatch: pytest.MonkeyPatch
+):
+    seen = []
+
+    async def prepare_chat_turn(*args: Any) -> Any:
+        seen.append(HTTP_IN_FLIGHT.values.get(("POST", "/chat")))
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    monkeypatch.setattr(routes.base, "prepare_chat_turn", prepare_chat_turn)
+    request = {"model": "llama3.2:1b", "message": "Hello", "conversation_id": 1}
+    assert client.post("/chat", json=request, headers=auth).status_code == 404
+    assert seen == [1]
+    assert HTTP_IN_FLIGHT.values[("POST", "/chat")] == 0
+
+
+def test_in_flight_covers_streamed_bodies(
+    client: TestClient, auth: Dict[str, str], monkeypatch: pytest.MonkeyPatch
+):
+    seen = []
+
+    async def generate_stream(*args: Any) -> AsyncIterator[Dict[str, Any]]:
+        seen.append(HTTP_IN_FLIGHT.values.get(("POST", "/generate/stream")))
+        yield {"response": "Hi", "done": True}
+
+    monkeypatch.setattr(Ollama, "generate_stream", staticmethod(generate_stream))
+    request = {"model": "llama3.2:1b", "message": "Hello"}
+    assert client.post("/generate/stream", json=request, headers=auth).status_code == 200
+    # Still counted while the body is generated, after the endpoint has returned
+    assert seen == [1]
+    assert HTTP_IN_FLIGHT.values[("POST", "/generate/stream")] == 0
+    assert 'http_requests_in_flight{method="POST",route="/generate/stream"} 0' in client.get("/metrics").text
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Callable, List
+import httpx
+import pytest
+from core.exception import APIException
+from utils import circuit_breaker, ollama
+from utils.ollama import Ollama
+from utils.ollama_pool import Backend, BackendPool
+
+Handler = Callable[[httpx.Request], httpx.Response]
+
+
+def reply(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"response": "Hi", "done": True})
+
+
+def refuse(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("Connection refused", request=request)
+
+
+def drop(request: httpx.Request) -> httpx.Response:
+    raise httpx.RemoteProtocolError("Server disconnected", request=request)
+
+
+def fail(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(500, json={"error": "model runner has unexpectedly stopped"})
+
+
+class Servers:
+    """Backends answering with the given handlers, counting the requests each receives."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch, *handlers: Handler):
+        self.requests: List[int] = [0] * len(handlers)
+        backends = [self._backend(i, handler) for i, handler in enumerate(handlers)]
+        self.pool = BackendPool(backends)
+        monkeypatch.setattr(Ollama, "_pool", self.pool)
+
+    def _backend(self, index: int, handler: Handler) -> Backend:
+        def counted(request: httpx.Request) -> httpx.Response:
+            self.requests[index] += 1
+            return handler(request)
+
+        url = f"http://node{index}"
+        return Backend(url, httpx.AsyncClient(base_url=url, transport=httpx.MockTransport(counted)))
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ollama.Config, "connect_retries", 2)
+    monkeypatch.setattr(ollama.Config, "retry_backoff_seconds", 0)
+    monkeypatch.setattr(circuit_breaker.Config, "failure_threshold", 5)
+
+
+def generate() -> str:
+    return asyncio.run(Ollama.generate("model", "Hello"))
+
+
+def test_connect_failure_moves_to_the_next_backend(monkeypatch: pytest.MonkeyPatch):
+    servers = Servers(monkeypatch, refuse, reply)
+    # The refusing backend ranks first, as it has the model loaded
+    servers.pool.backends[0].models.add("model")
+    assert generate() == "Hi"
+    assert servers.requests == [1, 1]
+    assert not servers.pool.backends[0].healthy
+    assert servers.pool.breaker(servers.pool.backends[0], "model").failures == 1
+
+
+def test_stream_connect_failure_moves_to_the_next_backend(monkeypatch: pytest.MonkeyPatch):
+    async def stream() -> List[dict]:
+        return [chunk async for chunk in Ollama.generate_stream("model", "Hello")]
+
+    servers = Servers(monkeypatch, refuse, reply)
+    servers.pool.backends[0].models.add("model")
+    assert asyncio.run(stream()) == [{"response": "Hi", "done": True}]
+    assert servers.requests == [1, 1]
+
+
+def test_connect_failures_are_retried_up_to_the_limit(monkeypatch: pytest.MonkeyPatch):
+    servers = Servers(monkeypatch, refuse)
+    with pytest.raises(APIException, match="Could not connect") as raised:
+        generate()
+    assert raised.value.status_code == 502
+    assert servers.requests == [3]
+
+
+@pytest.mark.parametrize("handler", [drop, fail])
+def test_requests_that_reached_ollama_are_not_retried(monkeypatch: pytest.MonkeyPatch, handler: Handler):
+    servers = Servers(monkeypatch, handler, reply)
+    servers.pool.backends[0].models.add("model")
+    with pytest.raises(APIException) as raised:
+        generate()
+    assert raised.value.status_code == 502
+    assert servers.requests == [1, 0]
+
+
+def test_open_breaker_fails_fast(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(circuit_breaker.Config, "failure_threshold", 2)
+    servers = Servers(monkeypatch, fail)
+    for _ in range(2):
+        with pytest.raises(APIException):
+            generate()
+    with pytest.raises(APIException) as raised:
+        generate()
+    assert raised.value.status_code == 503
+    assert int(raised.value.headers["Retry-After"]) > 0
+    assert servers.requests == [2]
+
+
+def test_server_errors_do_not_mark_the_backend_down(monkeypatch: pytest.MonkeyPatch):
+    servers = Servers(monkeypatch, fail)
+    with pytest.raises(APIException):
+        generate()
+    assert servers.pool.backends[0].healthy
@@ -0,0 +1,57 @@
+from typing import Dict
+import pytest
+from fastapi.testclient import TestClient
+from core.query_budget import QueryBudgetExceeded
+from routes.conversation import conversations
+
+MODEL = "llama3.2:1b"
+
+# The client fixture runs with DATABASE_QUERY_BUDGET_STRICT, so each request
+# below fails the test if its route runs more statements than its @query_budget.
+
+
+def test_auth_routes(client: TestClient, auth: Dict[str, str]):
+    assert client.get("/auth/users/me/", headers=auth).status_code == 200
+
+
+def test_assistant_routes(client: TestClient, auth: Dict[str, str]):
+    assert client.get("/assistants", headers=auth).status_code == 200
+    created = client.post("/assistant", json={"name": "Budget", "model": MODEL}, headers=auth)
+    assert created.status_code == 200, created.text
+    assistant_id = created.json()["id"]
+    updated = client.put(
+        f"/assistant/{assistant_id}", json={"name": "Budget 2", "model": MODEL}, headers=auth
+    )
+    assert updated.status_code == 200, updated.text
+    assert client.delete(f"/assistant/{assistant_id}", headers=auth).status_code == 200
+
+
+def test_conversation_routes(client: TestClient, auth: Dict[str, str]):
+    assert client.get("/conversations", headers=auth).status_code == 200
+    created = client.post("/conversation", json={"title": "Budget", "assistant_id": 1}, headers=auth)
+    assert created.status_code == 200, created.text
+    conversation_id = created.json()["id"]
+    assert client.get(f"/conversation/{conversation_id}", headers=auth).status_code == 200
+    assert client.get(f"/conversation/{conversation_id}/messages", headers=auth).status_code == 200
+    assert client.get("/search", params={"q": "hello"}, headers=auth).status_code == 200
+    assert client.delete(f"/conversation/{conversation_id}", headers=auth).status_code == 200
+
+
+def test_generate_routes(client: TestClient, auth: Dict[str, str]):
+    request = {"model": MODEL, "message": "Hello"}
+    assert client.post("/generate", json=request, headers=auth).status_code == 200
+    assert client.post("/generate/stream", json=request, headers=auth).status_code == 200
+
+
+def test_chat_routes(client: TestClient, auth: Dict[str, str]):
+    request = {"model": MODEL, "message": "Hello", "conversation_id": 1}
+    assert client.post("/chat", json=request, headers=auth).status_code == 200
+    assert client.post("/chat/stream", json=request, headers=auth).status_code == 200
+    client.post("/chat/1/cancel", headers=auth)
+
+
+def test_over_budget_raises(client: TestClient, auth: Dict[str, str], monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(conversations, "__query_budget__", 0)
+    with pytest.raises(QueryBudgetExceeded, match="budget is 0"):
+        client.get("/conversations", headers=auth)
+
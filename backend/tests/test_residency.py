@@ -0,0 +1,10 @@
+import pytest
+from utils.residency import ModelResidency
+
+
+def test_requests_do_not_mark_a_model_loaded(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(ModelResidency, "loaded", {})
+    monkeypatch.setattr(ModelResidency, "_requests", {})
+    ModelResidency.keep_alive("llama3.2:1b")
+    # Only a finished load or a poll of /api/ps knows the model is loaded
+    assert "llama3.2:1b" not in ModelResidency.loaded
@@ -0,0 +1,111 @@
+import asyncio
+from collections import OrderedDict
+from typing import List
+import pytest
+from utils import response_cache
+from utils.response_cache import CacheStatus, ResponseCache
+
+OPTIONS = {"temperature": 0}
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(response_cache.Config, "enabled", True)
+    monkeypatch.setattr(ResponseCache, "_entries", OrderedDict())
+    monkeypatch.setattr(ResponseCache, "_inflight", {})
+    monkeypatch.setattr(ResponseCache, "_waiters", {})
+    monkeypatch.setattr(ResponseCache, "_bytes", 0)
+
+
+def test_concurrent_requests_share_one_call():
+    calls = 0
+
+    async def produce() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def run() -> List[tuple]:
+        requests = [ResponseCache.get_or_generate("m", "p", OPTIONS, produce) for _ in range(3)]
+        shared = await asyncio.gather(*requests)
+        return [*shared, await ResponseCache.get_or_generate("m", "p", OPTIONS, produce)]
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert [status for _, status in results] == [
+        CacheStatus.MISS, CacheStatus.SHARED, CacheStatus.SHARED, CacheStatus.HIT
+    ]
+    assert {text for text, _ in results} == {"reply"}
+
+
+def test_cancelled_caller_leaves_the_call_to_the_others():
+    async def run() -> str:
+        release = asyncio.Event()
+
+        async def produce() -> str:
+            await release.wait()
+            return "reply"
+
+        first = asyncio.create_task(ResponseCache.get_or_generate("m", "p", OPTIONS, produce))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(ResponseCache.get_or_generate("m", "p", OPTIONS, produce))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        text, status = await second
+        assert first.cancelled() and status == CacheStatus.SHARED
+        return text
+
+    assert asyncio.run(run()) == "reply"
+
+
+def test_last_caller_leaving_cancels_the_call():
+    async def run() -> bool:
+        async def produce() -> str:
+            await asyncio.Event().wait()
+            return "never"
+
+        caller = asyncio.create_task(ResponseCache.get_or_generate("m", "p", OPTIONS, produce))
+        await asyncio.sleep(0)
+        task = next(iter(ResponseCache._inflight.values()))
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+        return task.cancelled()
+
+    assert asyncio.run(run())
+    assert ResponseCache._inflight == {} and ResponseCache._entries == {}
+
+
+def test_eviction_is_by_bytes_least_recently_used(monkeypatch: pytest.MonkeyPatch):
+    key_size = len(ResponseCache.key("m", "a", OPTIONS))
+    # Room for two 100 byte replies with their keys
+    monkeypatch.setattr(response_cache.Config, "max_bytes", 2 * (100 + key_size))
+    a, b, c = (ResponseCache.key("m", prompt, OPTIONS) for prompt in "abc")
+    ResponseCache._put(a, "x" * 100)
+    ResponseCache._put(b, "y" * 100)
+    assert ResponseCache._get(a) is not None  # a is now the most recently used
+    ResponseCache._put(c, "z" * 100)
+    assert list(ResponseCache._entries) == [a, c]
+    assert ResponseCache._bytes == 2 * (100 + key_size)
+    # Sizes are bytes, not characters
+    ResponseCache._put(b, "é" * 100)
+    assert list(ResponseCache._entries) == [b]
+
+
+def test_reply_larger_than_the_cache_is_not_stored(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(response_cache.Config, "max_bytes", 100)
+    ResponseCache._put(ResponseCache.key("m", "p", OPTIONS), "x" * 100)
+    assert ResponseCache._entries == {} and ResponseCache._bytes == 0
+
+
+def test_nondeterministic_requests_bypass_the_cache():
+    async def produce() -> str:
+        return "reply"
+
+    assert asyncio.run(ResponseCache.get_or_generate("m", "p", {"temperature": 0.7}, produce)) == (
+        "reply", CacheStatus.BYPASS
+    )
+    assert ResponseCache._entries == {}
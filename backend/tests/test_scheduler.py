@@ -0,0 +1,35 @@
+import httpx
+import pytest
+from utils.ollama import Ollama
+from utils.ollama_pool import Backend, BackendPool
+from utils.scheduler import ModelQueue
+
+
+@pytest.fixture
+def pool(monkeypatch: pytest.MonkeyPatch) -> BackendPool:
+    pool = BackendPool([Backend(f"http://node{i}", httpx.AsyncClient()) for i in range(3)])
+    monkeypatch.setattr(Ollama, "_pool", pool)
+    return pool
+
+
+def test_limit_follows_healthy_backends(pool: BackendPool):
+    queue = ModelQueue("model", 2)
+    assert queue.limit == 6
+    pool.backends[0].healthy = False
+    assert queue.limit == 4
+    for backend in pool.backends:
+        backend.healthy = False
+    # Requests still go out, to be failed or retried by the pool
+    assert queue.limit == 2
+
+
+def test_backend_down_queues_instead_of_admitting(pool: BackendPool):
+    queue = ModelQueue("model", 1)
+    pool.backends[0].healthy = pool.backends[1].healthy = False
+    admitted = queue.enqueue(1)
+    queued = queue.enqueue(2)
+    assert admitted.started_at is not None
+    assert queued.started_at is None and queue.depth == 1
+    pool.backends[0].healthy = True
+    queue.finish(admitted)
+    assert queued.started_at is not None
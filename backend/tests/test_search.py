@@ -0,0 +1,25 @@
+from typing import Dict
+import pytest
+from fastapi.testclient import TestClient
+from core.exception import APIException
+from database.utils.search import search_statement
+
+
+def test_search_matches_seeded_messages(client: TestClient, auth: Dict[str, str]):
+    response = client.get("/search", params={"q": "weather tokyo"}, headers=auth)
+    assert response.status_code == 200
+    assert {hit["conversation_id"] for hit in response.json()} == {2}
+
+
+# Whitespace leaves no words; the rest must not reach FTS5 as query syntax
+@pytest.mark.parametrize("q", ["   ", "\t\n", '"', "AND OR NOT", "near("])
+def test_search_without_matches(client: TestClient, auth: Dict[str, str], q: str):
+    response = client.get("/search", params={"q": q}, headers=auth)
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_search_unsupported_dialect():
+    with pytest.raises(APIException) as raised:
+        search_statement("mysql", 1, "weather", 20)
+    assert raised.value.status_code == 501
@@ -0,0 +1,108 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List
+import pytest
+from fastapi.testclient import TestClient
+import routes.ws
+from routes.ws import FAILED_DETAIL
+from utils.context_cache import ContextCache
+
+MODEL = "llama3.2:1b"
+
+
+def socket_url(auth: Dict[str, str]) -> str:
+    return "/ws/chat?token=" + auth["Authorization"].removeprefix("Bearer ")
+
+
+def chat_frame(conversation_id: int) -> Dict[str, Any]:
+    return {"type": "chat", "conversation_id": conversation_id, "model": MODEL, "message": "Hello"}
+
+
+def receive_final(websocket: Any) -> Dict[str, Any]:
+    """Skip delta and queue frames up to the frame that ends the turn."""
+    while True:
+        frame = websocket.receive_json()
+        if frame["type"] not in ("delta", "queue"):
+            return frame
+
+
+def test_failed_turn_frees_the_conversation(
+    client: TestClient, auth: Dict[str, str], monkeypatch: pytest.MonkeyPatch
+):
+    prepare = routes.ws.prepare_chat_turn
+    calls = 0
+
+    async def prepare_once_failing(*args: Any) -> Any:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("connection refused by db-internal:5432")
+        return await prepare(*args)
+
+    monkeypatch.setattr(routes.ws, "prepare_chat_turn", prepare_once_failing)
+    with client.websocket_connect(socket_url(auth)) as websocket:
+        websocket.send_json(chat_frame(1))
+        # The internal error text is logged, not sent
+        assert receive_final(websocket) == {"type": "error", "conversation_id": 1, "detail": FAILED_DETAIL}
+        websocket.send_json(chat_frame(1))
+        assert receive_final(websocket)["type"] == "done"
+
+
+@pytest.fixture
+def conversation_id(client: TestClient, auth: Dict[str, str]) -> int:
+    response = client.post("/conversation", json={"title": "Socket", "assistant_id": 1}, headers=auth)
+    return response.json()["id"]
+
+
+def messages(client: TestClient, auth: Dict[str, str], conversation_id: int) -> List[Dict[str, Any]]:
+    return client.get(f"/conversation/{conversation_id}/messages", headers=auth).json()
+
+
+@pytest.fixture
+def stalled_reply(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Ollama sends part of a reply, then nothing until the turn is stopped."""
+
+    async def chat_stream(*args: Any) -> AsyncIterator[Dict[str, Any]]:
+        yield {"message": {"role": "assistant", "content": "Partial"}, "done": False}
+        await asyncio.Event().wait()
+        yield {}
+
+    monkeypatch.setattr(ContextCache, "chat_stream", staticmethod(chat_stream))
+
+
+@pytest.mark.usefixtures("stalled_reply")
+def test_cancel_saves_partial_reply(client: TestClient, auth: Dict[str, str], conversation_id: int):
+    with client.websocket_connect(socket_url(auth)) as websocket:
+        websocket.send_json(chat_frame(conversation_id))
+        assert websocket.receive_json()["content"] == "Partial"
+        websocket.send_json({"type": "cancel", "conversation_id": conversation_id})
+        assert receive_final(websocket) == {
+            "type": "cancelled", "conversation_id": conversation_id, "response": "Partial"
+        }
+    user, assistant = messages(client, auth, conversation_id)
+    assert (assistant["content"], assistant["truncated"]) == ("Partial", True)
+
+
+@pytest.mark.usefixtures("stalled_reply")
+def test_disconnect_saves_partial_reply(client: TestClient, auth: Dict[str, str], conversation_id: int):
+    with client.websocket_connect(socket_url(auth)) as websocket:
+        websocket.send_json(chat_frame(conversation_id))
+        assert websocket.receive_json()["content"] == "Partial"
+    user, assistant = messages(client, auth, conversation_id)
+    assert (assistant["content"], assistant["truncated"]) == ("Partial", True)
+
+
+def test_ollama_error_chunk_is_an_error(
+    client: TestClient, auth: Dict[str, str], conversation_id: int, monkeypatch: pytest.MonkeyPatch
+):
+    async def chat_stream(*args: Any) -> AsyncIterator[Dict[str, Any]]:
+        yield {"message": {"role": "assistant", "content": "Partial"}, "done": False}
+        yield {"error": "model runner has unexpectedly stopped"}
+
+    monkeypatch.setattr(ContextCache, "chat_stream", staticmethod(chat_stream))
+    with client.websocket_connect(socket_url(auth)) as websocket:
+        websocket.send_json(chat_frame(conversation_id))
+        frame = receive_final(websocket)
+    assert frame["type"] == "error"
+    assert frame["detail"] == "Ollama: model runner has unexpectedly stopped"
+    # Only the user message is kept
+    assert [message["role"] for message in messages(client, auth, conversation_id)] == ["user"]
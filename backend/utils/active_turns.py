@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional
+from fastapi import Request
+from core.disconnect import Disconnect
+
+
+class ActiveTurns:
+    """Chat replies being generated, by conversation id, so they can be stopped.
+
+    A reply is read from Ollama in a task of its own. Stopping it (POST
+    /chat/{id}/cancel, a websocket cancel frame or the client going away)
+    cancels that task, which closes the Ollama stream so the model stops
+    generating. Callers save what was generated so far as truncated.
+    Turns are tracked per process: with several workers, a cancel only
+    reaches turns running on the worker that receives it.
+    """
+
+    _tasks: Dict[int, "asyncio.Task[Any]"] = {}
+    cancelled: int = 0
+
+    @classmethod
+    def track(cls, conversation_id: int, task: "asyncio.Task[Any]") -> None:
+        cls._tasks[conversation_id] = task
+        task.add_done_callback(lambda done: cls._untrack(conversation_id, done))
+
+    @classmethod
+    def _untrack(cls, conversation_id: int, task: "asyncio.Task[Any]") -> None:
+        if cls._tasks.get(conversation_id) is task:
+            del cls._tasks[conversation_id]
+
+    @classmethod
+    def cancel(cls, conversation_id: int) -> bool:
+        """Stop the reply being generated for a conversation. False if there is none."""
+        task = cls._tasks.get(conversation_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        cls.cancelled += 1
+        return True
+
+    @classmethod
+    async def relay(
+        cls,
+        conversation_id: int,
+        chunks: AsyncIterator[Dict[str, Any]],
+        request: Optional[Request] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield `chunks`, read in a tracked task. If the turn is cancelled, this ends
+        early without an error. With `request`, a client disconnect also cancels the turn,
+        for non-streaming requests. Closing this early cancels the turn as well."""
+        queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+
+        async def read() -> None:
+            async for chunk in chunks:
+                queue.put_nowait(chunk)
+
+        task = asyncio.create_task(read())
+        # Also runs if the task is cancelled before it starts
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        cls.track(conversation_id, task)
+        watcher = Disconnect.watch(request, task) if request is not None else None
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+        finally:
+            task.cancel()
+            if watcher is not None:
+                watcher.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            raise error
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {"active": len(cls._tasks), "cancelled": cls.cancelled}
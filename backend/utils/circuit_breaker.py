@@ -0,0 +1,66 @@
+import time
+from dataclasses import dataclass
+from typing import Any, Dict
+from config.secrets import Secrets
+
+
+@dataclass
+class Config:
+    # Consecutive failures that open a breaker
+    failure_threshold: int = int(Secrets.get("OLLAMA_BREAKER_FAILURES", "5"))
+    # How long an open breaker fails fast before letting a probe request through
+    reset_seconds: float = float(Secrets.get("OLLAMA_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitBreaker:
+    """Fails fast for a backend and model that keeps failing.
+
+    Closed: requests pass, and `failure_threshold` failures in a row open it.
+    Open: requests are refused for `reset_seconds`. Half-open: one probe
+    request passes; its success closes the breaker, its failure opens it
+    again. A probe that never reports back is replaced after `reset_seconds`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """Whether a request may go through now. In half-open, the caller becomes the probe."""
+        now = time.monotonic()
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and now - self.opened_at < Config.reset_seconds:
+            return False
+        if self.state == self.HALF_OPEN and now - self.probe_started_at < Config.reset_seconds:
+            return False
+        self.state = self.HALF_OPEN
+        self.probe_started_at = now
+        return True
+
+    def success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= Config.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def retry_after(self) -> float:
+        """Seconds until a probe will be let through."""
+        started = self.opened_at if self.state == self.OPEN else self.probe_started_at
+        return max(started + Config.reset_seconds - time.monotonic(), 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "opened": self.opened}
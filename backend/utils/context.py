@@ -0,0 +1,224 @@
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set
+from app_logging.app_logging import Logger
+from config.secrets import Secrets
+from core.deadline import Deadline
+from database.database import AsyncDatabaseSessionManager
+from database.schema.schema import Assistant, Conversation, Message as ChatMessage
+from utils.history_cache import History, HistoryCache, HistoryItem
+from utils.ollama import Ollama, OllamaMessage
+from utils.scheduler import Scheduler
+
+# Scheduler user id for background work that is not on behalf of a user
+SYSTEM_USER_ID = 0
+
+
+def _parse_model_budgets(value: str) -> Dict[str, int]:
+    """Parse "model=tokens,model=tokens" into a dict."""
+    budgets: Dict[str, int] = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        model, _, tokens = entry.rpartition("=")
+        budgets[model] = int(tokens)
+    return budgets
+
+
+@dataclass
+class Config:
+    default_budget: int = int(Secrets.get("CONTEXT_TOKEN_BUDGET", "4096"))
+    # e.g. "llama3.2:1b=8192,mistral:7b=16384"
+    model_budgets: str = Secrets.get("CONTEXT_MODEL_BUDGETS", "")
+    response_reserve: int = int(Secrets.get("CONTEXT_RESPONSE_RESERVE", "512"))
+    page_size: int = int(Secrets.get("CONTEXT_PAGE_SIZE", "64"))
+    summary_enabled: bool = Secrets.get("CONTEXT_SUMMARY_ENABLED", "false").lower() == "true"
+    summary_model: str = Secrets.get("CONTEXT_SUMMARY_MODEL", "")
+
+
+SUMMARY_PROMPT = """Summarize the conversation below so it can replace the original messages as context.
+Keep names, facts, decisions and open questions. Answer with the summary only.
+
+Summary so far:
+{summary}
+
+New messages:
+{transcript}"""
+
+
+@dataclass
+class ContextWindow:
+    messages: List[OllamaMessage]
+    token_count: int
+    # Newest message that fell out of the window and is not yet in the summary
+    unsummarized_until_id: Optional[int] = None
+
+
+class ContextBuilder:
+    """Builds the prompt for a chat turn from the newest messages that fit the token budget."""
+
+    _model_budgets: Dict[str, int] = _parse_model_budgets(Config.model_budgets)
+    _summarizing: Set[int] = set()
+    _tasks: Set["asyncio.Task[None]"] = set()
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        """Cheap token estimate (~4 characters per token), stored on each message when written."""
+        return max(1, (len(text) + 3) // 4)
+
+    @staticmethod
+    def message_tokens(message: ChatMessage) -> int:
+        return message.token_count or ContextBuilder.count_tokens(message.content)
+
+    @classmethod
+    def history_item(cls, message: ChatMessage) -> HistoryItem:
+        return HistoryItem(message.id, message.role, message.content, cls.message_tokens(message))
+
+    @staticmethod
+    def budget_for(assistant: Optional[Assistant], model: str) -> int:
+        """Prompt budget for a turn: the assistant's override, else the model's, else the default."""
+        if assistant is not None and assistant.context_tokens:
+            return assistant.context_tokens
+        return ContextBuilder._model_budgets.get(model, Config.default_budget)
+
+    @classmethod
+    async def build(
+        cls,
+        dsm: AsyncDatabaseSessionManager,
+        conversation: Conversation,
+        model: str,
+        message: str,
+    ) -> ContextWindow:
+        """Select the newest history that fits alongside `message`.
+
+        History is read newest first, from the history cache and then a page at
+        a time from the database, and reading stops at the budget or at messages
+        already covered by the summary. Stored token counts are used, so history
+        is never re-tokenized. What was read is cached for the next turn. When
+        summaries are enabled and messages were dropped, a summary refresh is
+        scheduled in the background.
+        """
+        budget = cls.budget_for(conversation.assistant, model) - Config.response_reserve
+        used = cls.count_tokens(message)
+
+        summary = conversation.summary if Config.summary_enabled else None
+        summary_until_id = (conversation.summary_until_id or 0) if summary else 0
+        if summary:
+            used += cls.count_tokens(summary)
+
+        cached = HistoryCache.get(conversation.id, conversation.updated_at)
+        # Every message looked at, newest first, including the one the walk stopped on
+        walked: List[HistoryItem] = []
+        kept: List[HistoryItem] = []
+        dropped_id: Optional[int] = None
+        reached_start = True
+        async for page in cls._history_pages(dsm, conversation.id, cached):
+            for item in page:
+                walked.append(item)
+                if item.id <= summary_until_id:
+                    break
+                if used + item.tokens > budget:
+                    dropped_id = item.id
+                    break
+                used += item.tokens
+                kept.append(item)
+            else:
+                continue
+            reached_start = False
+            break
+        HistoryCache.put(conversation.id, conversation.updated_at, walked[::-1], reached_start)
+
+        messages: List[OllamaMessage] = []
+        if summary:
+            messages.append(
+                OllamaMessage(role="system", content=f"Summary of the earlier conversation: {summary}")
+            )
+        messages.extend(
+            OllamaMessage(role="assistant" if msg.role == "assistant" else "user", content=msg.content)
+            for msg in reversed(kept)
+        )
+        messages.append(OllamaMessage(role="user", content=message))
+
+        window = ContextWindow(messages=messages, token_count=used, unsummarized_until_id=dropped_id)
+        if Config.summary_enabled and dropped_id is not None:
+            cls.schedule_summary(conversation.id, Config.summary_model or model, dropped_id, budget)
+        return window
+
+    @classmethod
+    async def _history_pages(
+        cls, dsm: AsyncDatabaseSessionManager, conversation_id: int, cached: Optional[History]
+    ) -> AsyncIterator[List[HistoryItem]]:
+        """Yield the conversation's history newest first: the cached part, then older pages."""
+        before_id: Optional[int] = None
+        if cached is not None:
+            yield cached.items[::-1]
+            if cached.complete:
+                return
+            before_id = cached.items[0].id if cached.items else None
+
+        while True:
+            page = await dsm.utils.message.get_recent(conversation_id, Config.page_size, before_id)
+            yield [cls.history_item(msg) for msg in page]
+            if len(page) < Config.page_size:
+                return
+            before_id = page[-1].id
+
+    @classmethod
+    def schedule_summary(cls, conversation_id: int, model: str, until_id: int, budget: int) -> None:
+        """Fold dropped messages into the conversation summary without delaying the turn."""
+        if conversation_id in cls._summarizing:
+            return
+        cls._summarizing.add(conversation_id)
+        task = asyncio.create_task(cls._update_summary(conversation_id, model, until_id, budget))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
+    @classmethod
+    async def _update_summary(
+        cls, conversation_id: int, model: str, until_id: int, budget: int
+    ) -> None:
+        # Not bound by the deadline of the turn that scheduled it
+        Deadline.set(None)
+        try:
+            async with AsyncDatabaseSessionManager() as dsm:
+                conversation = await dsm.utils.conversation.get_by_id(conversation_id)
+                if conversation is None:
+                    return
+
+                summary = conversation.summary or ""
+                summary_until_id = conversation.summary_until_id
+                used = cls.count_tokens(SUMMARY_PROMPT) + cls.count_tokens(summary)
+                batch: List[ChatMessage] = []
+                # Oldest first, capped by the budget; later turns pick up the rest
+                for msg in await dsm.utils.message.get_range(
+                    conversation_id, summary_until_id or 0, until_id, Config.page_size
+                ):
+                    used += cls.message_tokens(msg)
+                    if batch and used > budget:
+                        break
+                    batch.append(msg)
+            if not batch:
+                return
+
+            # No session is open while queueing and generating, which can take tens of seconds
+            transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in batch)
+            async with Scheduler.enqueue(model, SYSTEM_USER_ID):
+                new_summary = await Ollama.generate(
+                    model,
+                    SUMMARY_PROMPT.format(summary=summary or "(none)", transcript=transcript),
+                    affinity=conversation_id,
+                )
+
+            async with AsyncDatabaseSessionManager() as dsm:
+                stored = await dsm.utils.conversation.set_summary(
+                    conversation_id, new_summary, batch[-1].id, summary_until_id
+                )
+            Logger.debug(
+                ContextBuilder,
+                "Summarized conversation %s up to message %s%s",
+                conversation_id,
+                batch[-1].id,
+                "" if stored else ", discarded: the summary changed meanwhile",
+            )
+        except Exception as e:
+            Logger.error(ContextBuilder, "Summary update failed for conversation %s: %s", conversation_id, e)
+        finally:
+            cls._summarizing.discard(conversation_id)
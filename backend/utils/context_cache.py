@@ -0,0 +1,139 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app_logging.app_logging import Logger
+from config.secrets import Secrets
+from utils.ollama import Ollama, OllamaMessage
+
+
+@dataclass
+class Config:
+    enabled: bool = Secrets.get("OLLAMA_CONTEXT_REUSE", "false").lower() == "true"
+    max_entries: int = int(Secrets.get("OLLAMA_CONTEXT_CACHE_SIZE", "256"))
+
+
+class ContextCache:
+    """Reuses Ollama's KV `context` across turns of the same conversation.
+
+    /api/chat re-prefills the whole history every turn. In reuse mode, turns go
+    through /api/generate instead: the `context` it returns is cached per
+    (conversation id, model) together with a hash of the history it encodes.
+    The next turn sends only the new user message plus that context. If the
+    history sent no longer matches the hash (the context window slid, a
+    message was edited, or the entry was evicted), the turn falls back to a
+    full replay of the history as one prompt and re-seeds the cache.
+
+    Prompts go through the model's template, with system messages in
+    /api/generate's `system` field, so a first turn reads exactly as it
+    would over /api/chat. A replayed history is flattened into that one user
+    prompt, though, which the model sees differently from separate turns.
+
+    When disabled, chat_stream just delegates to /api/chat.
+    """
+
+    _entries: "OrderedDict[Tuple[int, str], Tuple[str, List[int]]]" = OrderedDict()
+    hits: int = 0
+    misses: int = 0
+
+    @staticmethod
+    def history_hash(messages: List[OllamaMessage]) -> str:
+        digest = hashlib.sha256()
+        for message in messages:
+            digest.update(message.role.encode())
+            digest.update(b"\0")
+            digest.update(message.content.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @classmethod
+    def get(cls, conversation_id: int, model: str, history_hash: str) -> Optional[List[int]]:
+        key = (conversation_id, model)
+        entry = cls._entries.get(key)
+        if entry is None or entry[0] != history_hash:
+            cls.misses += 1
+            return None
+        cls._entries.move_to_end(key)
+        cls.hits += 1
+        return entry[1]
+
+    @classmethod
+    def put(cls, conversation_id: int, model: str, history_hash: str, context: List[int]) -> None:
+        key = (conversation_id, model)
+        cls._entries[key] = (history_hash, context)
+        cls._entries.move_to_end(key)
+        while len(cls._entries) > Config.max_entries:
+            cls._entries.popitem(last=False)
+
+    @classmethod
+    def invalidate(cls, conversation_id: int) -> None:
+        for key in [key for key in cls._entries if key[0] == conversation_id]:
+            del cls._entries[key]
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "enabled": Config.enabled,
+            "entries": len(cls._entries),
+            "max_entries": Config.max_entries,
+            "hits": cls.hits,
+            "misses": cls.misses,
+        }
+
+    @staticmethod
+    def _render(messages: List[OllamaMessage]) -> Tuple[str, Optional[str]]:
+        """Split a history into the prompt and system prompt for a full replay through /api/generate.
+
+        Earlier turns are flattened into the prompt, ahead of the new user message.
+        """
+        system = "\n\n".join(message.content for message in messages if message.role == "system")
+        turns = [message for message in messages if message.role != "system"]
+        earlier = [f"{message.role}: {message.content}" for message in turns[:-1]]
+        return "\n\n".join([*earlier, turns[-1].content]), system or None
+
+    @classmethod
+    def _prepare(
+        cls, conversation_id: int, model: str, messages: List[OllamaMessage]
+    ) -> Tuple[str, Optional[str], Optional[List[int]]]:
+        """Pick the prompt, system prompt and cached context for a turn whose last message is
+        the new user message. A cached context already holds the system prompt."""
+        context = cls.get(conversation_id, model, cls.history_hash(messages[:-1]))
+        if context is not None:
+            return messages[-1].content, None, context
+        Logger.debug(ContextCache, "Replaying full history for conversation %s", conversation_id)
+        prompt, system = cls._render(messages)
+        return prompt, system, None
+
+    @classmethod
+    def _store(
+        cls,
+        conversation_id: int,
+        model: str,
+        messages: List[OllamaMessage],
+        response: str,
+        context: Optional[List[int]],
+    ) -> None:
+        if context:
+            history = [*messages, OllamaMessage(role="assistant", content=response)]
+            cls.put(conversation_id, model, cls.history_hash(history), context)
+
+    @classmethod
+    async def chat_stream(
+        cls, conversation_id: int, model: str, messages: List[OllamaMessage]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a turn. Chunks always have the /api/chat shape, whichever endpoint served them."""
+        if not Config.enabled:
+            async for chunk in Ollama.chat_stream(model, messages, affinity=conversation_id):
+                yield chunk
+            return
+
+        prompt, system, context = cls._prepare(conversation_id, model, messages)
+        parts: List[str] = []
+        async for chunk in Ollama.generate_stream_with_context(
+            model, prompt, context, system, affinity=conversation_id
+        ):
+            text = chunk.pop("response", "")
+            parts.append(text)
+            if chunk.get("done"):
+                cls._store(conversation_id, model, messages, "".join(parts), chunk.pop("context", None))
+            yield {**chunk, "message": {"role": "assistant", "content": text}}
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+from config.secrets import Secrets
+
+
+@dataclass
+class Config:
+    enabled: bool = Secrets.get("HISTORY_CACHE_ENABLED", "true").lower() == "true"
+    max_bytes: int = int(Secrets.get("HISTORY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+# Rough per-message cost of the tuple and its fields on top of the content
+ITEM_OVERHEAD_BYTES = 64
+
+
+class HistoryItem(NamedTuple):
+    id: int
+    role: str
+    content: str
+    tokens: int
+
+    @property
+    def size(self) -> int:
+        return len(self.content.encode()) + ITEM_OVERHEAD_BYTES
+
+
+class History:
+    """The newest messages of a conversation, oldest first.
+
+    `complete` means nothing older exists; otherwise older messages are read
+    from the database when a turn needs them.
+    """
+
+    def __init__(self, version: datetime, items: List[HistoryItem], complete: bool):
+        self.version = version
+        self.items = items
+        self.complete = complete
+        self.size = sum(item.size for item in items)
+
+
+class HistoryCache:
+    """Per-process LRU of recent conversation histories, bounded by total bytes.
+
+    An entry is only used while its version matches the conversation's
+    updated_at, which every chat turn bumps, so turns saved by another worker
+    turn the entry into a miss instead of a stale read. Turns saved by this
+    process are appended write-through, so a hot conversation needs no history
+    read at all.
+    """
+
+    _entries: "OrderedDict[int, History]" = OrderedDict()
+    _bytes: int = 0
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def get(cls, conversation_id: int, version: datetime) -> Optional[History]:
+        if not Config.enabled:
+            return None
+        history = cls._entries.get(conversation_id)
+        if history is None or history.version != version:
+            cls.misses += 1
+            return None
+        cls._entries.move_to_end(conversation_id)
+        cls.hits += 1
+        return history
+
+    @classmethod
+    def put(
+        cls, conversation_id: int, version: datetime, items: List[HistoryItem], complete: bool
+    ) -> None:
+        """Store the messages a turn read, oldest first."""
+        if not Config.enabled:
+            return
+        cls._store(conversation_id, History(version, items, complete))
+
+    @classmethod
+    def append(
+        cls,
+        conversation_id: int,
+        base_version: datetime,
+        items: List[HistoryItem],
+        version: datetime,
+    ) -> None:
+        """Write through the messages of a saved turn.
+
+        Only applied if the entry is still at the version the turn was built
+        from; otherwise another turn got in between and the entry is dropped.
+        """
+        history = cls._entries.get(conversation_id)
+        if history is None:
+            return
+        if history.version != base_version:
+            cls.invalidate(conversation_id)
+            return
+        cls._store(conversation_id, History(version, [*history.items, *items], history.complete))
+
+    @classmethod
+    def invalidate(cls, conversation_id: int) -> None:
+        history = cls._entries.pop(conversation_id, None)
+        if history is not None:
+            cls._bytes -= history.size
+
+    @classmethod
+    def _store(cls, conversation_id: int, history: History) -> None:
+        cls.invalidate(conversation_id)
+        if history.size > Config.max_bytes:
+            return
+        cls._entries[conversation_id] = history
+        cls._bytes += history.size
+        while cls._bytes > Config.max_bytes:
+            _, evicted = cls._entries.popitem(last=False)
+            cls._bytes -= evicted.size
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "enabled": Config.enabled,
+            "entries": len(cls._entries),
+            "bytes": cls._bytes,
+            "max_bytes": Config.max_bytes,
+            "hits": cls.hits,
+            "misses": cls.misses,
+        }
@@ -1,7 +1,33 @@
-import requests
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional, Set, Tuple, Union
+import httpx
 from pydantic import BaseModel
 from app_logging.app_logging import Logger
 from config.secrets import Secrets
+from core.deadline import Deadline
+from core.exception import APIException
+from core.metrics import record_ollama
+from utils.circuit_breaker import CircuitBreaker
+from utils.ollama_pool import Backend, BackendPool
+
+
+@dataclass
+class Config:
+    connect_timeout: float = float(Secrets.get("OLLAMA_CONNECT_TIMEOUT", "5"))
+    read_timeout: float = float(Secrets.get("OLLAMA_READ_TIMEOUT", "300"))
+    write_timeout: float = float(Secrets.get("OLLAMA_WRITE_TIMEOUT", "10"))
+    pool_timeout: float = float(Secrets.get("OLLAMA_POOL_TIMEOUT", "30"))
+    max_connections: int = int(Secrets.get("OLLAMA_MAX_CONNECTIONS", "32"))
+    max_keepalive_connections: int = int(Secrets.get("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "16"))
+    keepalive_expiry: float = float(Secrets.get("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+    # Extra attempts for a request whose backend could not be connected to
+    connect_retries: int = int(Secrets.get("OLLAMA_CONNECT_RETRIES", "2"))
+    retry_backoff_seconds: float = float(Secrets.get("OLLAMA_RETRY_BACKOFF_SECONDS", "0.2"))
 
 
 class OllamaMessage(BaseModel):
@@ -9,28 +35,349 @@ class OllamaMessage(BaseModel):
     content: str
 
 
+KeepAlive = Union[int, str]
+# Failures where the request never reached Ollama, so it is safe to send again
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
 class Ollama:
+    # One server, or several separated by commas to spread the load
     url = Secrets.get("OLLAMA_URL")
-    
-    @staticmethod
-    def generate(model: str, prompt: str) -> str:
-        Logger.debug(Ollama, f"Generating response: {prompt}")
-        response = requests.post(
-            f"{Ollama.url}/api/generate",
-            json={"model": model, "prompt": prompt, "stream": False}
+    urls = [url.strip() for url in url.split(",") if url.strip()]
+    _pool: Optional[BackendPool] = None
+    # Set by ModelResidency: the keep_alive to send with a request for a model, or None for Ollama's default
+    keep_alive_policy: Optional[Callable[[str], Optional[KeepAlive]]] = None
+
+    @classmethod
+    async def startup(cls) -> None:
+        """Create the backend pool and start its health checks. Called once from the app lifespan."""
+        cls.get_pool().start()
+        Logger.info(Ollama, "HTTP clients ready for %s", ", ".join(cls.urls))
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        """Stop the health checks and close the HTTP clients and their pooled connections."""
+        if cls._pool is not None:
+            pool, cls._pool = cls._pool, None
+            await pool.stop()
+
+    @classmethod
+    def _create_client(cls, url: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=url,
+            timeout=httpx.Timeout(
+                connect=Config.connect_timeout,
+                read=Config.read_timeout,
+                write=Config.write_timeout,
+                pool=Config.pool_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=Config.max_connections,
+                max_keepalive_connections=Config.max_keepalive_connections,
+                keepalive_expiry=Config.keepalive_expiry,
+            ),
         )
-        return response.json()["response"]
-    
-    @staticmethod
-    def chat(model: str, messages: list[OllamaMessage]) -> str:
-        Logger.debug(Ollama, f"Sending chat request, amount of messages: {len(messages)}")
+
+    @classmethod
+    def get_pool(cls) -> BackendPool:
+        """Return the backend pool, creating it if the lifespan has not run (e.g. in scripts)."""
+        if cls._pool is None:
+            cls._pool = BackendPool([Backend(url, cls._create_client(url)) for url in cls.urls])
+        return cls._pool
+
+    @classmethod
+    async def generate(
+        cls,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        affinity: Optional[Hashable] = None,
+    ) -> str:
+        Logger.debug(Ollama, "Generating response: %s", prompt)
+        payload: Dict[str, Any] = {"model": model, "prompt": prompt, "stream": False}
+        if options:
+            payload["options"] = options
+        body = await cls._post("/api/generate", payload, affinity)
+        return body["response"]
+
+    @classmethod
+    async def chat(
+        cls, model: str, messages: list[OllamaMessage], affinity: Optional[Hashable] = None
+    ) -> str:
+        Logger.debug(Ollama, "Sending chat request, amount of messages: %d", len(messages))
         messages_dict = [message.model_dump() for message in messages]
-        response = requests.post(
-            f"{Ollama.url}/api/chat",
-            json={
+        body = await cls._post(
+            "/api/chat",
+            {
                 "model": model,
                 "messages": messages_dict,
                 "stream": False
-            }
+            },
+            affinity,
+        )
+        return body["message"]["content"]
+
+    @classmethod
+    async def ps(cls) -> List[Dict[str, Any]]:
+        """The models loaded on any backend, from /api/ps. Also serves as a health check of each."""
+        return await cls.get_pool().check_all()
+
+    @classmethod
+    async def load(cls, model: str, keep_alive: Optional[KeepAlive] = None) -> None:
+        """Load a model into memory on the backend that would serve it, without generating anything."""
+        payload: Dict[str, Any] = {"model": model}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        response = await cls._send("/api/generate", payload)
+        if response.is_error:
+            raise cls._error(response.status_code, cls._json(response))
+
+    @classmethod
+    def _with_keep_alive(cls, payload: Dict[str, Any]) -> Dict[str, Any]:
+        keep_alive = cls.keep_alive_policy(payload["model"]) if cls.keep_alive_policy else None
+        return payload if keep_alive is None else {**payload, "keep_alive": keep_alive}
+
+    @classmethod
+    def _timeout(cls) -> httpx.Timeout:
+        """The client timeouts, cut short by the current request's deadline."""
+        return httpx.Timeout(
+            connect=Deadline.timeout(Config.connect_timeout),
+            read=Deadline.timeout(Config.read_timeout),
+            write=Deadline.timeout(Config.write_timeout),
+            pool=Deadline.timeout(Config.pool_timeout),
+        )
+
+    @classmethod
+    def _pick(cls, model: str, affinity: Optional[Hashable], tried: Set[int]) -> Tuple[Backend, CircuitBreaker]:
+        """The best backend whose breaker lets a request through, preferring ones not tried yet."""
+        pool = cls.get_pool()
+        candidates = sorted(pool.candidates(model, affinity), key=lambda backend: id(backend) in tried)
+        refused: List[CircuitBreaker] = []
+        for backend in candidates:
+            breaker = pool.breaker(backend, model)
+            if breaker.allow():
+                return backend, breaker
+            refused.append(breaker)
+        retry_after = min(breaker.retry_after() for breaker in refused)
+        raise APIException(
+            status_code=APIException.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Ollama is failing for {model}, retry later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
         )
-        return response.json()["message"]["content"]
+
+    @classmethod
+    async def _backoff(cls, attempt: int) -> None:
+        """Sleep before the next connect attempt: full jitter, within the deadline."""
+        delay = random.uniform(0, Config.retry_backoff_seconds * 2**attempt)
+        await asyncio.sleep(Deadline.timeout(delay))
+
+    @staticmethod
+    def _failed(breaker: CircuitBreaker, error: httpx.TransportError) -> APIException:
+        """The error for a request that reached a backend and then failed. Nothing is replayed,
+        since Ollama may have done the work. Running out of time is not the backend's fault."""
+        if isinstance(error, httpx.TimeoutException):
+            if not Deadline.expired() and not isinstance(error, httpx.PoolTimeout):
+                breaker.failure()
+            return Deadline.exceeded()
+        breaker.failure()
+        return APIException(status_code=APIException.HTTP_502_BAD_GATEWAY, detail=f"Ollama: {error!r}")
+
+    @staticmethod
+    def _error(status_code: int, body: Dict[str, Any]) -> APIException:
+        """The error for a reply Ollama sent as an error. Missing models stay 404s."""
+        if status_code == APIException.HTTP_404_NOT_FOUND:
+            code = APIException.HTTP_404_NOT_FOUND
+        elif 400 <= status_code < 500:
+            code = APIException.HTTP_400_BAD_REQUEST
+        else:
+            code = APIException.HTTP_502_BAD_GATEWAY
+        return APIException(status_code=code, detail=f"Ollama: {body.get('error', status_code)}")
+
+    @staticmethod
+    def _json(response: httpx.Response) -> Dict[str, Any]:
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return body if isinstance(body, dict) else {"error": response.text or response.reason_phrase}
+
+    @classmethod
+    async def _send(
+        cls, path: str, payload: Dict[str, Any], affinity: Optional[Hashable] = None
+    ) -> httpx.Response:
+        """POST to the best backend.
+
+        A backend that cannot be connected to is marked down, and the request
+        moves on to the next (or the same one, if there is only one) after a
+        backoff, up to OLLAMA_CONNECT_RETRIES times. Once connected nothing is
+        retried. Server errors count towards the backend's circuit breaker.
+        """
+        pool = cls.get_pool()
+        model = payload["model"]
+        tried: Set[int] = set()
+        error: Optional[Exception] = None
+        for attempt in range(Config.connect_retries + 1):
+            Deadline.check()
+            backend, breaker = cls._pick(model, affinity, tried)
+            tried.add(id(backend))
+            backend.outstanding += 1
+            try:
+                response = await backend.client.post(path, json=payload, timeout=cls._timeout())
+            except CONNECT_ERRORS as e:
+                pool.failed(backend, e)
+                breaker.failure()
+                error = e
+                if attempt < Config.connect_retries:
+                    await cls._backoff(attempt)
+                continue
+            except httpx.TransportError as e:
+                raise cls._failed(breaker, e) from e
+            finally:
+                backend.outstanding -= 1
+            if response.status_code >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+            if response.is_success:
+                pool.served(backend, model, affinity)
+            return response
+        Deadline.check()
+        raise APIException(
+            status_code=APIException.HTTP_502_BAD_GATEWAY, detail=f"Could not connect to Ollama: {error!r}"
+        )
+
+    @classmethod
+    async def _post(
+        cls, path: str, payload: Dict[str, Any], affinity: Optional[Hashable] = None
+    ) -> Dict[str, Any]:
+        """POST a non-streaming request and return the JSON body, recording its metrics."""
+        started = time.perf_counter()
+        body: Optional[Dict[str, Any]] = None
+        cancelled = False
+        try:
+            response = await cls._send(path, cls._with_keep_alive(payload), affinity)
+            body = cls._json(response)
+            if response.is_error or "error" in body:
+                raise cls._error(response.status_code, body)
+            return body
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            record_ollama(payload["model"], path, started, body, cancelled=cancelled)
+
+    @classmethod
+    async def _stream(
+        cls, path: str, payload: Dict[str, Any], affinity: Optional[Hashable] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """POST a streaming request and yield each NDJSON chunk as it arrives.
+
+        Connect failures are retried like `_send`. Each chunk must arrive
+        within the request's deadline as it stood when the stream started.
+        """
+        started = time.perf_counter()
+        first_token_at: Optional[float] = None
+        final: Optional[Dict[str, Any]] = None
+        cancelled = False
+        pool = cls.get_pool()
+        model = payload["model"]
+        tried: Set[int] = set()
+        error: Optional[Exception] = None
+        try:
+            body = cls._with_keep_alive({**payload, "stream": True})
+            for attempt in range(Config.connect_retries + 1):
+                Deadline.check()
+                backend, breaker = cls._pick(model, affinity, tried)
+                tried.add(id(backend))
+                backend.outstanding += 1
+                try:
+                    async with backend.client.stream("POST", path, json=body, timeout=cls._timeout()) as response:
+                        if response.is_error:
+                            await response.aread()
+                            final = cls._json(response)
+                            if response.status_code >= 500:
+                                breaker.failure()
+                            raise cls._error(response.status_code, final)
+                        async for line in response.aiter_lines():
+                            if line:
+                                chunk = json.loads(line)
+                                if first_token_at is None:
+                                    first_token_at = time.perf_counter()
+                                if chunk.get("done") or "error" in chunk:
+                                    final = chunk
+                                yield chunk
+                except CONNECT_ERRORS as e:
+                    pool.failed(backend, e)
+                    breaker.failure()
+                    error = e
+                    if attempt < Config.connect_retries:
+                        await cls._backoff(attempt)
+                    continue
+                except httpx.TransportError as e:
+                    raise cls._failed(breaker, e) from e
+                finally:
+                    backend.outstanding -= 1
+                if final is not None and "error" in final:
+                    breaker.failure()
+                else:
+                    breaker.success()
+                    pool.served(backend, model, affinity)
+                return
+            Deadline.check()
+            raise APIException(
+                status_code=APIException.HTTP_502_BAD_GATEWAY, detail=f"Could not connect to Ollama: {error!r}"
+            )
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped reading, e.g. the client went away
+            cancelled = True
+            raise
+        finally:
+            record_ollama(model, path, started, final, first_token_at, cancelled)
+
+    @classmethod
+    async def generate_stream(
+        cls,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        affinity: Optional[Hashable] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream /api/generate chunks. Text deltas are in chunk["response"]."""
+        Logger.debug(Ollama, "Streaming generated response: %s", prompt)
+        payload: Dict[str, Any] = {"model": model, "prompt": prompt}
+        if options:
+            payload["options"] = options
+        async for chunk in cls._stream("/api/generate", payload, affinity):
+            yield chunk
+
+    @classmethod
+    async def generate_stream_with_context(
+        cls,
+        model: str,
+        prompt: str,
+        context: Optional[List[int]] = None,
+        system: Optional[str] = None,
+        affinity: Optional[Hashable] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream /api/generate from a KV `context`. The final chunk carries the new context.
+
+        The prompt is wrapped in the model's template, with `system` as its system prompt.
+        """
+        Logger.debug(Ollama, "Streaming response with context of %d tokens", len(context or []))
+        payload: Dict[str, Any] = {"model": model, "prompt": prompt}
+        if context:
+            payload["context"] = context
+        if system:
+            payload["system"] = system
+        async for chunk in cls._stream("/api/generate", payload, affinity):
+            yield chunk
+
+    @classmethod
+    async def chat_stream(
+        cls, model: str, messages: list[OllamaMessage], affinity: Optional[Hashable] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream /api/chat chunks. Text deltas are in chunk["message"]["content"]."""
+        Logger.debug(Ollama, "Streaming chat request, amount of messages: %d", len(messages))
+        messages_dict = [message.model_dump() for message in messages]
+        async for chunk in cls._stream("/api/chat", {"model": model, "messages": messages_dict}, affinity):
+            yield chunk
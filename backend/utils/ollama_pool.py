@@ -0,0 +1,150 @@
+import asyncio
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+import httpx
+from app_logging.app_logging import Logger
+from config.secrets import Secrets
+from utils.circuit_breaker import CircuitBreaker
+
+
+@dataclass
+class Config:
+    health_interval_seconds: float = float(Secrets.get("OLLAMA_HEALTH_INTERVAL_SECONDS", "10"))
+    health_timeout_seconds: float = float(Secrets.get("OLLAMA_HEALTH_TIMEOUT_SECONDS", "2"))
+    # A conversation stays on its backend unless that has this many more requests than the least busy one
+    sticky_slack: int = int(Secrets.get("OLLAMA_STICKY_SLACK", "2"))
+    max_affinities: int = int(Secrets.get("OLLAMA_MAX_AFFINITIES", "10000"))
+    # A backend without the model loaded counts as this many requests busier, for the load time
+    cold_penalty: int = int(Secrets.get("OLLAMA_COLD_PENALTY", "2"))
+
+
+class Backend:
+    """One Ollama server: its HTTP client, outstanding requests and the models it has loaded."""
+
+    def __init__(self, url: str, client: httpx.AsyncClient):
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.models: Set[str] = set()
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "models": sorted(self.models),
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class BackendPool:
+    """Routes Ollama requests across one or more servers.
+
+    Each request goes to the backend with the fewest outstanding requests,
+    where not having the model loaded counts as OLLAMA_COLD_PENALTY more, so
+    a model spreads to other backends only once its own are busy. Requests
+    with an affinity key (a conversation id) stick to the backend that served
+    the key last, so Ollama's prompt cache there stays useful, unless it is
+    down or much busier than the rest.
+    A backend that fails a request is marked down and skipped until a health
+    check (a GET /api/ps, which also refreshes its loaded models) passes.
+    """
+
+    def __init__(self, backends: List[Backend]):
+        self.backends = backends
+        self._affinity: "OrderedDict[Hashable, Backend]" = OrderedDict()
+        self.breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._turn = itertools.count()
+        self._checker: Optional["asyncio.Task[None]"] = None
+
+    @staticmethod
+    def load(backend: Backend, model: str) -> int:
+        return backend.outstanding + (0 if model in backend.models else Config.cold_penalty)
+
+    def candidates(self, model: str, affinity: Optional[Hashable] = None) -> List[Backend]:
+        """Backends to try for a request, best first. Down backends come last, in case all are down."""
+        healthy = [backend for backend in self.backends if backend.healthy]
+        down = [backend for backend in self.backends if not backend.healthy]
+        # Rotate ties, so idle backends share the load
+        turn = next(self._turn)
+        order = {id(backend): (i + turn) % len(self.backends) for i, backend in enumerate(self.backends)}
+        ranked = sorted(healthy, key=lambda backend: (self.load(backend, model), order[id(backend)]))
+
+        sticky = self._affinity.get(affinity) if affinity is not None else None
+        if sticky is not None and sticky.healthy and ranked:
+            if self.load(sticky, model) <= self.load(ranked[0], model) + Config.sticky_slack:
+                ranked.remove(sticky)
+                ranked.insert(0, sticky)
+        return ranked + down
+
+    def breaker(self, backend: Backend, model: str) -> CircuitBreaker:
+        key = (backend.url, model)
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = self.breakers[key] = CircuitBreaker()
+        return breaker
+
+    def served(self, backend: Backend, model: str, affinity: Optional[Hashable] = None) -> None:
+        """Record a successful request: the model is now loaded there, and the key sticks to it."""
+        backend.models.add(model)
+        if affinity is None:
+            return
+        self._affinity[affinity] = backend
+        self._affinity.move_to_end(affinity)
+        while len(self._affinity) > Config.max_affinities:
+            self._affinity.popitem(last=False)
+
+    def failed(self, backend: Backend, error: Exception) -> None:
+        backend.failures += 1
+        backend.last_error = repr(error)
+        if backend.healthy:
+            backend.healthy = False
+            Logger.warning(BackendPool, "Ollama backend %s is down: %r", backend.url, error)
+
+    async def check(self, backend: Backend) -> List[Dict[str, Any]]:
+        """Health check one backend, returning its /api/ps models ([] if it is down)."""
+        try:
+            response = await backend.client.get("/api/ps", timeout=Config.health_timeout_seconds)
+            response.raise_for_status()
+            models = response.json().get("models", [])
+        except (httpx.HTTPError, ValueError) as e:
+            self.failed(backend, e)
+            return []
+        if not backend.healthy:
+            Logger.info(BackendPool, "Ollama backend %s is back up", backend.url)
+        backend.healthy = True
+        backend.models = {entry["name"] for entry in models if "name" in entry}
+        return models
+
+    async def check_all(self) -> List[Dict[str, Any]]:
+        """Health check every backend and return all their loaded models."""
+        results = await asyncio.gather(*(self.check(backend) for backend in self.backends))
+        return [entry for models in results for entry in models]
+
+    def start(self) -> None:
+        if self._checker is None:
+            self._checker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._checker is not None:
+            self._checker.cancel()
+            await asyncio.gather(self._checker, return_exceptions=True)
+            self._checker = None
+        await asyncio.gather(*(backend.client.aclose() for backend in self.backends))
+
+    async def _run(self) -> None:
+        while True:
+            await self.check_all()
+            await asyncio.sleep(Config.health_interval_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backends": {backend.url: backend.stats() for backend in self.backends},
+            "affinities": len(self._affinity),
+            "breakers": {f"{url} {model}": breaker.stats() for (url, model), breaker in self.breakers.items()},
+        }
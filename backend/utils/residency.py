@@ -0,0 +1,177 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Deque, Dict, FrozenSet, List, Optional, Set
+from app_logging.app_logging import Logger
+from config.secrets import Secrets
+from core.deadline import Deadline
+from database.database import AsyncDatabaseSessionManager
+from database.schema.schema import utcnow
+from utils.ollama import KeepAlive, Ollama
+
+
+def _keep_alive(value: str) -> Optional[KeepAlive]:
+    """"" for Ollama's default, seconds as a number (-1 keeps the model loaded), or a duration like "30m"."""
+    if not value:
+        return None
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+@dataclass
+class Config:
+    enabled: bool = Secrets.get("OLLAMA_RESIDENCY_ENABLED", "true").lower() == "true"
+    # The most used assistant models over the last `warmup_days` are loaded at startup
+    warmup_models: int = int(Secrets.get("OLLAMA_WARMUP_MODELS", "3"))
+    warmup_days: int = int(Secrets.get("OLLAMA_WARMUP_DAYS", "7"))
+    poll_seconds: float = float(Secrets.get("OLLAMA_RESIDENCY_POLL_SECONDS", "30"))
+    # Always loaded: sent with keep_alive=-1 and reloaded if Ollama evicts them, e.g. "llama3.2:1b,mistral:7b"
+    pinned_models: FrozenSet[str] = frozenset(filter(None, Secrets.get("OLLAMA_PINNED_MODELS", "").split(",")))
+    # Hot models are the warmed ones, and those with `hot_requests` requests in the last `hot_window_seconds`
+    hot_requests: int = int(Secrets.get("OLLAMA_HOT_REQUESTS", "3"))
+    hot_window_seconds: float = float(Secrets.get("OLLAMA_HOT_WINDOW_SECONDS", "3600"))
+    keep_alive_hot: Optional[KeepAlive] = _keep_alive(Secrets.get("OLLAMA_KEEP_ALIVE_HOT", "30m"))
+    keep_alive_default: Optional[KeepAlive] = _keep_alive(Secrets.get("OLLAMA_KEEP_ALIVE_DEFAULT", ""))
+
+
+class ModelResidency:
+    """Decides which models Ollama keeps loaded, so active assistants don't pay the load time.
+
+    At startup the most used assistant models are loaded in the background.
+    Every request then carries a keep_alive from `keep_alive()`: pinned
+    models never unload, hot ones stay loaded for OLLAMA_KEEP_ALIVE_HOT and
+    the rest get Ollama's default. The loaded set is polled from /api/ps,
+    and opening a conversation preloads its assistant's model.
+    """
+
+    # model -> expires_at reported by /api/ps
+    loaded: Dict[str, Optional[str]] = {}
+    warmed: Set[str] = set()
+    _requests: Dict[str, Deque[float]] = {}
+    _loading: Dict[str, "asyncio.Task[None]"] = {}
+    _poller: Optional["asyncio.Task[None]"] = None
+    loads: int = 0
+    load_failures: int = 0
+
+    @classmethod
+    async def startup(cls) -> None:
+        """Install the keep_alive policy and start warming up and polling. Called once from the app lifespan."""
+        if not Config.enabled or cls._poller is not None:
+            return
+        Ollama.keep_alive_policy = cls.keep_alive
+        cls._poller = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        tasks = [task for task in (cls._poller, *cls._loading.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cls._poller = None
+        cls._loading.clear()
+
+    @classmethod
+    def is_hot(cls, model: str) -> bool:
+        if model in cls.warmed:
+            return True
+        requests = cls._requests.get(model)
+        return requests is not None and len(requests) >= Config.hot_requests
+
+    @classmethod
+    def keep_alive(cls, model: str) -> Optional[KeepAlive]:
+        """The keep_alive to send with a request for `model`. Counts the request towards its heat."""
+        now = time.monotonic()
+        requests = cls._requests.setdefault(model, deque(maxlen=max(Config.hot_requests, 1)))
+        requests.append(now)
+        while requests and requests[0] < now - Config.hot_window_seconds:
+            requests.popleft()
+        return cls.policy(model)
+
+    @classmethod
+    def policy(cls, model: str) -> Optional[KeepAlive]:
+        if model in Config.pinned_models:
+            return -1
+        if cls.is_hot(model):
+            return Config.keep_alive_hot
+        return Config.keep_alive_default
+
+    @classmethod
+    def preload(cls, model: str) -> None:
+        """Start loading `model` in the background unless it is loaded or loading already."""
+        if not Config.enabled or model in cls.loaded or model in cls._loading:
+            return
+        cls._loading[model] = asyncio.create_task(cls._load(model))
+
+    @classmethod
+    async def _load(cls, model: str) -> None:
+        # Preloads started by a request outlive it
+        Deadline.set(None)
+        started = time.perf_counter()
+        try:
+            await Ollama.load(model, cls.policy(model))
+            cls.loaded.setdefault(model, None)
+            cls.loads += 1
+            Logger.info(ModelResidency, "Loaded %s in %.1f s", model, time.perf_counter() - started)
+        except Exception as e:
+            cls.load_failures += 1
+            Logger.warning(ModelResidency, "Could not load %s: %s", model, e)
+        finally:
+            cls._loading.pop(model, None)
+
+    @classmethod
+    async def refresh(cls) -> None:
+        """Replace the loaded set with what /api/ps reports."""
+        models = await Ollama.ps()
+        cls.loaded = {entry["name"]: entry.get("expires_at") for entry in models if "name" in entry}
+
+    @classmethod
+    async def ranked_models(cls) -> List[str]:
+        """Assistant models, most used recently first."""
+        since = utcnow() - timedelta(days=Config.warmup_days)
+        async with AsyncDatabaseSessionManager() as dsm:
+            usage = await dsm.utils.assistant.get_model_usage(since)
+        return [model for model, _ in usage]
+
+    @classmethod
+    async def warm_up(cls) -> None:
+        """Load the pinned models and the most used assistant models, one at a time."""
+        ranked = await cls.ranked_models()
+        cls.warmed = set(ranked[: Config.warmup_models])
+        models = [*Config.pinned_models, *(model for model in ranked[: Config.warmup_models])]
+        for model in dict.fromkeys(models):
+            if model not in cls.loaded:
+                # One at a time, so they don't fight over memory
+                cls.preload(model)
+                task = cls._loading.get(model)
+                if task is not None:
+                    await task
+
+    @classmethod
+    async def _run(cls) -> None:
+        try:
+            await cls.refresh()
+            await cls.warm_up()
+        except Exception as e:
+            Logger.warning(ModelResidency, "Warm-up failed: %s", e)
+        while True:
+            await asyncio.sleep(Config.poll_seconds)
+            try:
+                await cls.refresh()
+            except Exception as e:
+                Logger.warning(ModelResidency, "Could not poll loaded models: %s", e)
+                continue
+            for model in Config.pinned_models - cls.loaded.keys():
+                cls.preload(model)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "loaded": sorted(cls.loaded),
+            "loading": sorted(cls._loading),
+            "warmed": sorted(cls.warmed),
+            "pinned": sorted(Config.pinned_models),
+            "hot": sorted(cls.warmed | {model for model in cls._requests if cls.is_hot(model)}),
+            "loads": cls.loads,
+            "load_failures": cls.load_failures,
+        }
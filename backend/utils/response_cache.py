@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from config.secrets import Secrets
+
+
+@dataclass
+class Config:
+    enabled: bool = Secrets.get("GENERATE_CACHE_ENABLED", "false").lower() == "true"
+    max_bytes: int = int(Secrets.get("GENERATE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    ttl_seconds: float = float(Secrets.get("GENERATE_CACHE_TTL_SECONDS", "3600"))
+
+
+class CacheStatus:
+    HIT = "HIT"
+    # Joined an identical request that was already running
+    SHARED = "SHARED"
+    MISS = "MISS"
+    BYPASS = "BYPASS"
+
+
+class ResponseCache:
+    """In-process cache for deterministic /generate calls, with single-flight deduplication.
+
+    Entries are evicted least recently used once their total size passes
+    GENERATE_CACHE_MAX_BYTES, and expire after GENERATE_CACHE_TTL_SECONDS.
+    Concurrent identical requests share one upstream call, which is
+    cancelled once every request waiting on it has gone away.
+    """
+
+    # key -> (expires_at, response, size in bytes)
+    _entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+    _inflight: Dict[str, "asyncio.Task[str]"] = {}
+    # key -> requests waiting on the in-flight task
+    _waiters: Dict[str, int] = {}
+    _bytes: int = 0
+    counters: Dict[str, int] = {
+        CacheStatus.HIT: 0,
+        CacheStatus.SHARED: 0,
+        CacheStatus.MISS: 0,
+        CacheStatus.BYPASS: 0,
+    }
+
+    @staticmethod
+    def is_deterministic(options: Optional[Dict[str, Any]]) -> bool:
+        """Only temperature 0 or a fixed seed gives the same output for the same input."""
+        if not options:
+            return False
+        return options.get("temperature") == 0 or options.get("seed") is not None
+
+    @staticmethod
+    def key(model: str, prompt: str, options: Optional[Dict[str, Any]]) -> str:
+        payload = json.dumps([model, prompt, options or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @classmethod
+    async def get_or_generate(
+        cls,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        produce: Callable[[], Awaitable[str]],
+    ) -> Tuple[str, str]:
+        """Return (response, cache status), calling `produce` only when nothing can be reused."""
+        if not Config.enabled or not cls.is_deterministic(options):
+            cls.counters[CacheStatus.BYPASS] += 1
+            return await produce(), CacheStatus.BYPASS
+
+        key = cls.key(model, prompt, options)
+        cached = cls._get(key)
+        if cached is not None:
+            cls.counters[CacheStatus.HIT] += 1
+            return cached, CacheStatus.HIT
+
+        task = cls._inflight.get(key)
+        if task is not None:
+            cls.counters[CacheStatus.SHARED] += 1
+            return await cls._wait(key, task), CacheStatus.SHARED
+
+        cls.counters[CacheStatus.MISS] += 1
+        # Run in its own task, so a caller that goes away does not fail the others waiting on it
+        task = asyncio.create_task(produce())
+        cls._inflight[key] = task
+        task.add_done_callback(lambda done: cls._finish(key, done))
+        return await cls._wait(key, task), CacheStatus.MISS
+
+    @classmethod
+    async def _wait(cls, key: str, task: "asyncio.Task[str]") -> str:
+        """Wait for a shared task. A waiter that is cancelled leaves the task to the
+        others, or cancels it if it was the last one."""
+        cls._waiters[key] = cls._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if cls._waiters[key] == 1:
+                task.cancel()
+            raise
+        finally:
+            cls._waiters[key] -= 1
+            if not cls._waiters[key]:
+                del cls._waiters[key]
+
+    @classmethod
+    def _finish(cls, key: str, task: "asyncio.Task[str]") -> None:
+        cls._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            cls._put(key, task.result())
+
+    @classmethod
+    def _get(cls, key: str) -> Optional[str]:
+        entry = cls._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response, size = entry
+        if expires_at < time.monotonic():
+            del cls._entries[key]
+            cls._bytes -= size
+            return None
+        cls._entries.move_to_end(key)
+        return response
+
+    @classmethod
+    def _put(cls, key: str, response: str) -> None:
+        size = len(response.encode()) + len(key)
+        if size > Config.max_bytes:
+            return
+        if key in cls._entries:
+            cls._bytes -= cls._entries.pop(key)[2]
+        cls._entries[key] = (time.monotonic() + Config.ttl_seconds, response, size)
+        cls._bytes += size
+        while cls._bytes > Config.max_bytes:
+            _, (_, _, evicted) = cls._entries.popitem(last=False)
+            cls._bytes -= evicted
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "enabled": Config.enabled,
+            "entries": len(cls._entries),
+            "bytes": cls._bytes,
+            "max_bytes": Config.max_bytes,
+            "inflight": len(cls._inflight),
+            **{status.lower(): count for status, count in cls.counters.items()},
+        }
@@ -0,0 +1,196 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional
+from core.deadline import Deadline
+from core.exception import APIException
+from config.secrets import Secrets
+from utils.ollama import Ollama
+
+
+def _parse_model_limits(value: str) -> Dict[str, int]:
+    """Parse "model=limit,model=limit" into a dict."""
+    limits: Dict[str, int] = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        model, _, limit = entry.rpartition("=")
+        limits[model] = int(limit)
+    return limits
+
+
+def _healthy_backends() -> int:
+    """Ollama backends passing their health check, at least 1 so requests still reach one."""
+    return max(1, sum(backend.healthy for backend in Ollama.get_pool().backends))
+
+
+@dataclass
+class Config:
+    model_concurrency: int = int(Secrets.get("OLLAMA_MODEL_CONCURRENCY", "2"))
+    # e.g. "llama3.2:1b=4,mistral:7b=1"
+    model_limits: str = Secrets.get("OLLAMA_MODEL_LIMITS", "")
+    max_queue_depth: int = int(Secrets.get("OLLAMA_MAX_QUEUE_DEPTH", "32"))
+    # Service time assumed for a model before any request has finished
+    initial_service_seconds: float = float(Secrets.get("OLLAMA_INITIAL_SERVICE_SECONDS", "10"))
+
+
+class Ticket:
+    """A request's place in a model queue. Use as an async context manager around the Ollama call."""
+
+    def __init__(self, queue: "ModelQueue", user_id: int):
+        self.queue = queue
+        self.user_id = user_id
+        self.position = 0
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self._admitted = asyncio.Event()
+        self._released = False
+
+    @property
+    def wait_ms(self) -> int:
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return int((end - self.enqueued_at) * 1000)
+
+    def info(self) -> Dict[str, int]:
+        return {"position": self.position, "wait_ms": self.wait_ms}
+
+    def headers(self) -> Dict[str, str]:
+        """Queue position at arrival, plus the wait once the request has been admitted."""
+        headers = {"X-Queue-Position": str(self.position)}
+        if self.started_at is not None:
+            headers["X-Queue-Wait-Ms"] = str(self.wait_ms)
+        return headers
+
+    def admit(self) -> None:
+        self.started_at = time.monotonic()
+        self._admitted.set()
+
+    async def wait(self) -> None:
+        """Wait for a slot, at most until the request's deadline. A cancelled or
+        timed out wait gives up its place in the queue."""
+        try:
+            await asyncio.wait_for(self._admitted.wait(), Deadline.remaining())
+        except asyncio.TimeoutError:
+            self.release()
+            raise Deadline.exceeded("Deadline exceeded waiting in the queue")
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def release(self) -> None:
+        """Free the slot, or leave the queue if never admitted. Safe to call more than once."""
+        if self._released:
+            return
+        self._released = True
+        if self.started_at is None:
+            self.queue.withdraw(self)
+        else:
+            self.queue.finish(self)
+
+    async def __aenter__(self) -> "Ticket":
+        await self.wait()
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any):
+        self.release()
+
+
+class ModelQueue:
+    """Concurrency limit for one model, with round-robin admission across users."""
+
+    def __init__(self, model: str, backend_limit: int):
+        self.model = model
+        self.backend_limit = backend_limit
+        self.active = 0
+        self.depth = 0
+        # user id -> that user's waiting tickets; the first user is served next
+        self.waiting: "OrderedDict[int, Deque[Ticket]]" = OrderedDict()
+        self.service_seconds = Config.initial_service_seconds
+
+    @property
+    def limit(self) -> int:
+        # Follows the health checks, so a backend going down lowers the limit
+        return self.backend_limit * _healthy_backends()
+
+    def enqueue(self, user_id: int) -> Ticket:
+        ticket = Ticket(self, user_id)
+        if self.active < self.limit and self.depth == 0:
+            self.active += 1
+            ticket.admit()
+            return ticket
+
+        if self.depth >= Config.max_queue_depth:
+            raise APIException(
+                status_code=APIException.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Too many requests queued for model {self.model}",
+                headers={"Retry-After": str(self.retry_after())},
+            )
+        self.waiting.setdefault(user_id, deque()).append(ticket)
+        self.depth += 1
+        ticket.position = self.depth
+        return ticket
+
+    def retry_after(self) -> int:
+        """Seconds until the queue is expected to have room, from the average service time."""
+        return max(1, math.ceil(self.service_seconds * (self.depth + 1) / self.limit))
+
+    def finish(self, ticket: Ticket) -> None:
+        self.active -= 1
+        if ticket.started_at is not None:
+            # Exponentially weighted average, so Retry-After follows recent load
+            elapsed = time.monotonic() - ticket.started_at
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * elapsed
+        self._dispatch()
+
+    def withdraw(self, ticket: Ticket) -> None:
+        tickets = self.waiting.get(ticket.user_id)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            self.depth -= 1
+            if not tickets:
+                del self.waiting[ticket.user_id]
+
+    def _dispatch(self) -> None:
+        limit = self.limit
+        while self.active < limit and self.waiting:
+            user_id, tickets = self.waiting.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                # Back of the rotation, so other users go first
+                self.waiting[user_id] = tickets
+            self.depth -= 1
+            self.active += 1
+            ticket.admit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.depth,
+            "waiting_users": len(self.waiting),
+            "avg_service_seconds": round(self.service_seconds, 3),
+        }
+
+
+class Scheduler:
+    """Admission control in front of Ollama: per-model concurrency limits and fair per-user queues."""
+
+    _model_limits: Dict[str, int] = _parse_model_limits(Config.model_limits)
+    _queues: Dict[str, ModelQueue] = {}
+
+    @classmethod
+    def enqueue(cls, model: str, user_id: int) -> Ticket:
+        """Take a place in the model's queue, or raise 429 with Retry-After if it is full."""
+        queue = cls._queues.get(model)
+        if queue is None:
+            # Limits are per healthy Ollama backend
+            limit = cls._model_limits.get(model, Config.model_concurrency)
+            queue = cls._queues[model] = ModelQueue(model, limit)
+        else:
+            # Admit waiting tickets if a backend has come back up since the last dispatch
+            queue._dispatch()
+        return queue.enqueue(user_id)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {model: queue.stats() for model, queue in cls._queues.items()}